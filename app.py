@@ -1,9 +1,20 @@
+import functools
+import os
+import tempfile
+
 import streamlit as st
-import joblib
-import numpy as np
-from PIL import Image
-import torch
-from torchvision import models, transforms
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from rakuten_classifier import CATEGORIES, CATEGORY_ICONS, get_engine, metrics, warmup
+from rakuten_classifier.batch import classify_file, detect_format
+from rakuten_classifier.blobs import get_blob_store, release_upload, restore_upload, store_upload
+from rakuten_classifier.catalog import similar_listings
+from rakuten_classifier.config import env_flag
+from rakuten_classifier.core import analyze_image, classify_listing
+from rakuten_classifier.feedback import Correction, get_feedback_store
+from rakuten_classifier.image_pool import POOL_WORKERS as IMAGE_POOL_WORKERS, start_in_background as start_image_pool
+from rakuten_classifier.lazy import preload_in_background
+from rakuten_classifier.learner import start_if_enabled as start_learner_if_enabled
 
 # Configuration de la page avec thème Rakuten
 st.set_page_config(
@@ -13,8 +24,8 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# CSS personnalisé pour reproduire le style Rakuten
-st.markdown("""
+# CSS personnalisé pour reproduire le style Rakuten (envoyé avec l'en-tête, voir ``main``)
+PAGE_STYLE = """
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&display=swap');
     
@@ -213,46 +224,19 @@ st.markdown("""
         color: var(--rakuten-dark-gray) !important;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# Catégories Rakuten avec icônes
-CATEGORIES = {
-    0: "Livre",
-    1: "Musique, CD/DVD, Blu-Ray", 
-    2: "Jeux vidéo, Console",
-    3: "Téléphonie, Tablette",
-    4: "Informatique, Logiciel",
-    5: "TV, Image et Son",
-    6: "Maison",
-    7: "Électroménager", 
-    8: "Alimentation, Boisson",
-    9: "Brico, Jardin, Animalerie",
-    10: "Sport, Loisirs",
-    11: "Mode",
-    12: "Beauté",
-    13: "Jouet, Enfant, Puériculture"
-}
-
-# Icônes correspondantes pour chaque catégorie
-CATEGORY_ICONS = {
-    0: "📚",  # Livre
-    1: "🎵",  # Musique, CD/DVD, Blu-Ray
-    2: "🎮",  # Jeux vidéo, Console
-    3: "📱",  # Téléphonie, Tablette
-    4: "💻",  # Informatique, Logiciel
-    5: "📺",  # TV, Image et Son
-    6: "🏠",  # Maison
-    7: "🔌",  # Électroménager
-    8: "🍕",  # Alimentation, Boisson
-    9: "🔨",  # Brico, Jardin, Animalerie
-    10: "⚽", # Sport, Loisirs
-    11: "👕", # Mode
-    12: "💄", # Beauté
-    13: "🧸"  # Jouet, Enfant, Puériculture
-}
-
-def generate_product_description(image, category_name):
-    """Générer une description automatique basée sur l'image et la catégorie"""
+"""
+
+def generate_product_description(image, category_name, features=None, designation="", description=""):
+    """Générer une description automatique basée sur l'image et la catégorie.
+
+    Avec un index de catalogue (RAKUTEN_CATALOG_PATH), reprend l'annonce réelle
+    la plus proche du plongement de l'image (ou, à défaut, du texte déjà saisi) ;
+    sinon, texte générique de la catégorie.
+    """
+    matches = similar_listings(features, designation, description, k=1)
+    if matches:
+        return {"name": matches[0].designation, "description": matches[0].description}
+
     suggestions = {
         "Livre": {
             "name": "Livre de fiction moderne",
@@ -317,21 +301,135 @@ def generate_product_description(image, category_name):
         "description": "Article en très bon état général, conforme à la description."
     })
 
-def main():
-    # Header Rakuten avec logo officiel
-    logo_html = '''
-    <div class="rakuten-header">
-        <div class="logo-container">
-            <svg width="200" height="60" viewBox="0 0 1200 400" xmlns="http://www.w3.org/2000/svg">
-                <text x="50" y="300" font-family="Arial, sans-serif" font-size="180" font-weight="bold" fill="#BF0000">Rakuten</text>
-                <path d="M50 320 L950 320 L980 360 L50 360 Z" fill="#BF0000"/>
-            </svg>
-        </div>
+def fragment(name):
+    """``st.fragment`` chronométré : une interaction ne réexécute que ce morceau de page"""
+    def decorate(function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with metrics.stage(f"fragment_{name}"):
+                return function(*args, **kwargs)
+        return st.fragment(timed)
+    return decorate
+
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else ""
+
+
+def ingest_upload(uploaded_image):
+    """Décoder le téléversement une seule fois et confier l'original au cache partagé.
+
+    La session ne garde que l'empreinte, la vignette et (une fois calculé) le
+    plongement de l'image ; la copie conservée par Streamlit est libérée et le
+    widget vidé (nouvelle clé).
+    """
+    with metrics.stage("upload"):
+        prepared = store_upload(uploaded_image.getvalue(), owner=session_id())
+    forget_image()
+    st.session_state.image_digest = prepared.digest
+    st.session_state.image_thumbnail = prepared.thumbnail
+    st.session_state.image_features = None
+
+    release_uploaded_file(uploaded_image)
+    # Nouvelle clé : le widget est vidé et Streamlit oublie le fichier à la prochaine exécution
+    st.session_state.upload_generation = st.session_state.get('upload_generation', 0) + 1
+    return prepared
+
+
+def release_uploaded_file(uploaded_image):
+    """Libérer tout de suite la copie gardée par Streamlit, si sa version le permet.
+
+    ``uploaded_file_mgr`` est interne à Streamlit : en son absence, ou si
+    l'appel échoue, la copie part avec le changement de clé du widget.
+    """
+    ctx = get_script_run_ctx()
+    remove_file = getattr(getattr(ctx, 'uploaded_file_mgr', None), 'remove_file', None)
+    if remove_file is None:
+        return
+    try:
+        remove_file(ctx.session_id, uploaded_image.file_id)
+    except Exception:
+        pass
+
+
+def forget_image():
+    digest = st.session_state.pop('image_digest', None)
+    if digest is not None:
+        release_upload(digest, session_id())
+    for key in ('image_thumbnail', 'image_features'):
+        st.session_state.pop(key, None)
+
+
+def session_image():
+    """``PreparedImage`` de la session depuis le cache partagé (None si aucune image ou si elle a été évincée)"""
+    digest = st.session_state.get('image_digest')
+    if digest is None:
+        return None
+    prepared = restore_upload(digest, st.session_state.image_thumbnail, owner=session_id())
+    if prepared is None:
+        forget_image()
+        st.warning("L'image n'est plus disponible, veuillez la téléverser à nouveau.")
+    return prepared
+
+
+@fragment("batch")
+def batch_classification():
+    """Classer un fichier d'annonces (colonnes designation / description) par morceaux"""
+    st.markdown("Classez des milliers d'annonces d'un coup : le fichier doit contenir "
+                "une colonne `designation` et/ou `description`.")
+    batch_file = st.file_uploader("Fichier d'annonces", type=["csv", "parquet"], key="batch_file")
+    top_k = st.number_input("Nombre de catégories proposées par annonce", min_value=1,
+                            max_value=len(CATEGORIES), value=3, key="batch_top_k")
+
+    if batch_file and st.button("📊 Classifier le fichier", use_container_width=True):
+        fmt = detect_format(batch_file.name)
+        output = tempfile.NamedTemporaryFile(prefix="rakuten-", suffix=f".{fmt}", delete=False)
+        output.close()
+        progress_bar = st.progress(0.0, text="Classification en cours...")
+
+        def report(fraction, rows):
+            progress_bar.progress(fraction, text=f"{rows} annonces classées")
+
+        try:
+            rows = classify_file(get_engine(), batch_file, output.name, fmt,
+                                 top_k=int(top_k), progress=report)
+        except Exception as e:
+            os.unlink(output.name)
+            st.error(f"Erreur lors de la classification du fichier : {str(e)}")
+            return
+
+        previous = st.session_state.get('batch_result')
+        if previous and os.path.exists(previous['path']):
+            os.unlink(previous['path'])
+        st.session_state.batch_result = {
+            'path': output.name,
+            'rows': rows,
+            'name': f"{os.path.splitext(batch_file.name)[0]}_classifie.{fmt}",
+            'mime': "text/csv" if fmt == "csv" else "application/octet-stream",
+        }
+
+    result = st.session_state.get('batch_result')
+    if result and os.path.exists(result['path']):
+        st.success(f"{result['rows']} annonces classées.")
+        with open(result['path'], "rb") as handle:
+            st.download_button("⬇️ Télécharger le résultat", handle, file_name=result['name'],
+                               mime=result['mime'], use_container_width=True)
+
+# En-tête Rakuten avec logo officiel (statique, hors fragments)
+HEADER_HTML = '''
+<div class="rakuten-header">
+    <div class="logo-container">
+        <svg width="200" height="60" viewBox="0 0 1200 400" xmlns="http://www.w3.org/2000/svg">
+            <text x="50" y="300" font-family="Arial, sans-serif" font-size="180" font-weight="bold" fill="#BF0000">Rakuten</text>
+            <path d="M50 320 L950 320 L980 360 L50 360 Z" fill="#BF0000"/>
+        </svg>
     </div>
-    '''
-    st.markdown(logo_html, unsafe_allow_html=True)
+</div>
+'''
 
-    # Progress steps
+
+def progress_steps():
     col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown("""
@@ -342,7 +440,7 @@ def main():
         """, unsafe_allow_html=True)
 
     with col2:
-        step2_class = "step-active" if 'uploaded_image' in st.session_state else "step"
+        step2_class = "step-active" if 'image_digest' in st.session_state else "step"
         st.markdown(f"""
         <div class="{step2_class}">
             <div class="step-icon">2</div>
@@ -359,141 +457,139 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
-    st.markdown("<br>", unsafe_allow_html=True)
 
-    # Container principal
-    st.markdown('<div class="rakuten-container">', unsafe_allow_html=True)
+@fragment("upload")
+def upload_section():
+    st.markdown('<div class="column-left">', unsafe_allow_html=True)
+    st.markdown("**Ajoutez une image de votre produit**")
+    uploaded_image = st.file_uploader(
+        "Téléversez une image",
+        type=["jpg", "png", "jpeg"],
+        help="Formats acceptés: JPG, PNG, JPEG",
+        key=f"product_image_{st.session_state.get('upload_generation', 0)}"
+    )
 
-    # Section 1: Upload d'image
-    st.markdown('<h2 class="section-title">📸 Dites-nous en plus</h2>', unsafe_allow_html=True)
+    # Nouvelle image : étapes et bouton de classification à mettre à jour
+    if uploaded_image is not None:
+        ingest_upload(uploaded_image)
+        st.rerun(scope="app")
 
-    col_left, col_right = st.columns([1, 1])
+    if 'image_digest' in st.session_state:
+        st.image(st.session_state.image_thumbnail, caption="Image téléversée", use_column_width=True)
+        if st.button("🗑️ Retirer l'image", use_container_width=True):
+            forget_image()
+            st.rerun(scope="app")
 
-    with col_left:
-        st.markdown('<div class="column-left">', unsafe_allow_html=True)
-        st.markdown("**Ajoutez une image de votre produit**")
-        uploaded_image = st.file_uploader(
-            "Téléversez une image",
-            type=["jpg", "png", "jpeg"],
-            help="Formats acceptés: JPG, PNG, JPEG"
-        )
-        
-        if uploaded_image:
-            st.image(uploaded_image, caption="Image téléversée", use_column_width=True)
-            st.session_state.uploaded_image = uploaded_image
-            
-            # Générer des suggestions automatiques basées sur l'analyse de l'image
-            if st.button("✨ Générer des suggestions automatiques", use_container_width=True):
+        # Générer des suggestions automatiques basées sur l'analyse de l'image
+        if st.button("✨ Générer des suggestions automatiques", use_container_width=True):
+            prepared = session_image()
+            if prepared is not None:
                 with st.spinner("Analyse de l'image en cours..."):
                     try:
-                        # Utiliser une approche simplifiée basée sur l'analyse basique de l'image
-                        image = Image.open(uploaded_image)
-                        
-                        # Analyse simple basée sur les dimensions et couleurs de l'image
-                        width, height = image.size
-                        aspect_ratio = width / height
-                        
-                        # Suggestions basées sur l'analyse simple de l'image
-                        if aspect_ratio > 1.5:  # Image horizontale
-                            suggested_cat = "TV, Image et Son"
-                        elif aspect_ratio < 0.7:  # Image verticale
-                            suggested_cat = "Livre"
-                        else:  # Image carrée/rectangulaire
-                            suggested_cat = "Mode"  # Par défaut
-                        
-                        suggestions = generate_product_description(image, suggested_cat)
-                        
+                        # Classifieur image CPU (torch chargé au premier usage), sauf si la photo est déjà connue
+                        prediction, st.session_state.image_features = analyze_image(prepared)
+                        suggested_cat = prediction.label
+
+                        suggestions = generate_product_description(
+                            prepared, suggested_cat, st.session_state.image_features,
+                            st.session_state.get('designation', ""), st.session_state.get('description', ""))
+
                         st.session_state.suggested_name = suggestions["name"]
                         st.session_state.suggested_description = suggestions["description"]
+                        # Les champs du formulaire (autre fragment) reprennent les suggestions
+                        st.session_state.designation = suggestions["name"]
+                        st.session_state.description = suggestions["description"]
                         st.success("Suggestions générées ! Vous pouvez les modifier si besoin.")
-                        st.rerun()
-                        
+                        st.rerun(scope="app")
+
                     except Exception as e:
                         st.error(f"Erreur lors de la génération des suggestions : {str(e)}")
                         # Suggestions par défaut en cas d'erreur
                         st.session_state.suggested_name = "Produit de qualité"
                         st.session_state.suggested_description = "Article en bon état, prêt à être utilisé."
                         st.warning("Suggestions par défaut générées.")
-        st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with col_right:
-        st.markdown('<div class="column-right">', unsafe_allow_html=True)
-        st.markdown("**Informations produit (optionnel)**")
-        
-        # Suggestions en italique si disponibles
-        name_placeholder = "ex: iPhone 15 Pro Max"
-        description_placeholder = "Décrivez les caractéristiques, l'état, etc."
-        
-        if 'suggested_name' in st.session_state:
-            name_placeholder = f"Suggestion: {st.session_state.suggested_name}"
-        if 'suggested_description' in st.session_state:
-            description_placeholder = f"Suggestion: {st.session_state.suggested_description}"
-        
-        designation = st.text_input(
-            "Nom du produit",
-            value=st.session_state.get('suggested_name', ''),
-            placeholder=name_placeholder,
-            help="Le nom ou titre de votre produit (suggestions générées automatiquement)"
-        )
-        
-        description = st.text_area(
-            "Description détaillée",
-            value=st.session_state.get('suggested_description', ''),
-            placeholder=description_placeholder,
-            height=100,
-            help="Plus d'informations pour une meilleure classification (suggestions générées automatiquement)"
-        )
-        
-        # Afficher les suggestions en italique sous les champs
-        if 'suggested_name' in st.session_state and not designation:
-            st.markdown(f"*💡 Suggestion de nom: {st.session_state.suggested_name}*")
-        if 'suggested_description' in st.session_state and not description:
-            st.markdown(f"*💡 Suggestion de description: {st.session_state.suggested_description}*")
-        st.markdown('</div>', unsafe_allow_html=True)
+
+@fragment("form")
+def listing_form():
+    st.markdown('<div class="column-right">', unsafe_allow_html=True)
+    st.markdown("**Informations produit (optionnel)**")
+
+    # Suggestions en italique si disponibles
+    name_placeholder = "ex: iPhone 15 Pro Max"
+    description_placeholder = "Décrivez les caractéristiques, l'état, etc."
+
+    if 'suggested_name' in st.session_state:
+        name_placeholder = f"Suggestion: {st.session_state.suggested_name}"
+    if 'suggested_description' in st.session_state:
+        description_placeholder = f"Suggestion: {st.session_state.suggested_description}"
+
+    # Valeurs dans st.session_state (clés designation / description) : lues par la correction
+    designation = st.text_input(
+        "Nom du produit",
+        key="designation",
+        placeholder=name_placeholder,
+        help="Le nom ou titre de votre produit (suggestions générées automatiquement)"
+    )
+
+    description = st.text_area(
+        "Description détaillée",
+        key="description",
+        placeholder=description_placeholder,
+        height=100,
+        help="Plus d'informations pour une meilleure classification (suggestions générées automatiquement)"
+    )
+
+    # Afficher les suggestions en italique sous les champs
+    if 'suggested_name' in st.session_state and not designation:
+        st.markdown(f"*💡 Suggestion de nom: {st.session_state.suggested_name}*")
+    if 'suggested_description' in st.session_state and not description:
+        st.markdown(f"*💡 Suggestion de description: {st.session_state.suggested_description}*")
+    st.markdown('</div>', unsafe_allow_html=True)
 
     # Bouton de classification
     st.markdown("<br>", unsafe_allow_html=True)
 
-    if uploaded_image:
+    if 'image_digest' in st.session_state:
         if st.button("🔍 Classifier automatiquement ce produit", type="primary"):
-            with st.spinner("Classification en cours avec l'IA..."):
-                try:
-                    # Simulation temporaire pour éviter les erreurs
-                    import random
-                    
-                    # Simuler une prédiction (remplacer par le vrai modèle plus tard)
-                    category_names = list(CATEGORIES.values())
-                    predicted_category_name = random.choice(category_names)
-                    
-                    # Trouver l'index correspondant
-                    pred_index = None
-                    for idx, cat_name in CATEGORIES.items():
-                        if cat_name == predicted_category_name:
-                            pred_index = idx
-                            break
-                    
-                    if pred_index is not None:
+            prepared = session_image()
+            if prepared is not None:
+                with st.spinner("Classification en cours avec l'IA..."):
+                    try:
+                        # Texte d'abord ; l'image n'est analysée (puis fusionnée) que si
+                        # le texte est vide ou ambigu
+                        result = classify_listing(designation, description, prepared)
+                        prediction = result.prediction
+                        if result.used_image:
+                            # Plongement déjà calculé par la cascade : lu dans le cache image
+                            st.session_state.image_features = analyze_image(prepared)[1]
+
                         st.session_state.prediction_result = {
-                            'category': pred_index,
-                            'category_name': predicted_category_name,
-                            'confidence': random.uniform(0.6, 0.9)
+                            'category': prediction.category,
+                            'category_name': prediction.label,
+                            'confidence': prediction.confidence,
+                            'used_image': result.used_image,
+                            'used_text': result.text is not None,
+                            'model_version': prediction.version
                         }
                         st.success("Classification terminée !")
-                        st.rerun()
-                    else:
-                        st.error("Erreur lors de la classification.")
-                except Exception as e:
-                    st.error(f"Erreur: {str(e)}")
+                        # Résultat et étapes sont hors de ce fragment
+                        st.rerun(scope="app")
+                    except Exception as e:
+                        st.error(f"Erreur: {str(e)}")
     else:
         st.info("📋 Veuillez uploader une image pour commencer la classification")
 
-    # Section 2: Résultats
-    if 'prediction_result' in st.session_state:
+
+@fragment("result")
+def result_section():
+    with metrics.stage("render"):
         st.markdown("<br><br>", unsafe_allow_html=True)
         st.markdown('<h2 class="section-title">🎯 Catégorie suggérée</h2>', unsafe_allow_html=True)
-        
+
         result = st.session_state.prediction_result
-        
+
         # Affichage style Rakuten (sans score de confiance)
         st.markdown(f"""
         <div class="category-result">
@@ -501,90 +597,139 @@ def main():
             <div class="category-subtitle">Catégorie suggérée par l'IA</div>
         </div>
         """, unsafe_allow_html=True)
-        
+
         # Bouton pour corriger la catégorie si besoin
         st.markdown("<br>", unsafe_allow_html=True)
         if st.button("🔄 Modifier la catégorie", use_container_width=True):
             st.session_state.show_category_selector = True
-            st.rerun()
-        
-        # Afficher le sélecteur de catégorie si demandé
-        if st.session_state.get('show_category_selector', False):
-            st.markdown("<br>", unsafe_allow_html=True)
-            
-            # Container avec style Rakuten et styles inline pour forcer
-            st.markdown("""
-            <div style="
-                background: white !important;
-                border: 2px solid #e0e0e0 !important;
-                border-radius: 8px !important;
-                padding: 1.5rem !important;
-                margin-top: 1rem !important;
-            ">
-                <h4 style="color: #bf0000 !important; margin-bottom: 1rem !important;">
-                    🏷️ Sélectionnez la bonne catégorie
-                </h4>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Alternative : utiliser des boutons radio au lieu du selectbox
-            st.markdown("**Choisissez la catégorie correcte :**")
-            
-            # Organiser en colonnes pour un meilleur affichage
-            cols = st.columns(2)
-            selected_category = None
-            
-            # Créer des boutons radio pour chaque catégorie
-            category_list = list(CATEGORIES.values())
-            
-            for i, category in enumerate(category_list):
-                col_idx = i % 2
-                icon = CATEGORY_ICONS.get(i, "📦")  # Icône spécifique ou générique
-                with cols[col_idx]:
-                    if st.button(f"{icon} {category}", key=f"cat_btn_{i}", use_container_width=True):
-                        selected_category = category
-                        st.session_state.selected_correction = category
-            
-            # Vérifier s'il y a une sélection
-            if 'selected_correction' in st.session_state:
-                selected_category = st.session_state.selected_correction
-                
-            if selected_category:
-                # Trouver l'index de la catégorie sélectionnée
-                correct_index = None
-                for idx, cat_name in CATEGORIES.items():
-                    if cat_name == selected_category:
-                        correct_index = idx
-                        break
-                
-                if correct_index is not None:
-                    st.success(f"Merci ! Catégorie corrigée : **{selected_category}**")
-                    
-                    # Optionnel : sauvegarder la correction pour l'amélioration du modèle
-                    if st.button("✅ Confirmer cette correction", type="primary"):
-                        st.success("Correction enregistrée ! Cela aidera à améliorer notre IA.")
-                        # Ici vous pourriez sauvegarder la correction dans une base de données
-                        if 'selected_correction' in st.session_state:
-                            del st.session_state.selected_correction
-                        st.session_state.show_category_selector = False
-                        st.rerun()
+
+        # Sélecteur de catégorie : fragment à part, les 14 boutons ne réexécutent que lui
+        correction_selector(result)
 
         # Informations additionnelles
         st.markdown("<br>", unsafe_allow_html=True)
         with st.expander("ℹ️ Comment ça marche ?"):
+            image_line = ("- 🖼️ L'analyse visuelle de votre image" if result.get('used_image', True)
+                          else "- 🖼️ Votre image (le texte suffisait : analyse visuelle non nécessaire)")
+            text_line = ("- 📝 L'analyse du texte de votre description" if result.get('used_text', True)
+                         else "- 📝 Aucun texte : classification sur l'image seule")
             st.write(f"""
             Notre intelligence artificielle a analysé votre image et votre description 
             pour suggérer la catégorie **{result['category_name']}**.
             
             Cette classification est basée sur :
-            - 🖼️ L'analyse visuelle de votre image
-            - 📝 L'analyse du texte de votre description  
+            {image_line}
+            {text_line}
             - 🤖 Un modèle entraîné sur des milliers de produits Rakuten
             """)
 
+
+@fragment("correction")
+def correction_selector(result):
+    if not st.session_state.get('show_category_selector', False):
+        return
+    st.markdown("<br>", unsafe_allow_html=True)
+    # Container avec style Rakuten et styles inline pour forcer
+    st.markdown("""
+    <div style="
+        background: white !important;
+        border: 2px solid #e0e0e0 !important;
+        border-radius: 8px !important;
+        padding: 1.5rem !important;
+        margin-top: 1rem !important;
+    ">
+        <h4 style="color: #bf0000 !important; margin-bottom: 1rem !important;">
+            🏷️ Sélectionnez la bonne catégorie
+        </h4>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Alternative : utiliser des boutons radio au lieu du selectbox
+    st.markdown("**Choisissez la catégorie correcte :**")
+    
+    # Organiser en colonnes pour un meilleur affichage
+    cols = st.columns(2)
+    selected_category = None
+    
+    # Créer des boutons radio pour chaque catégorie
+    category_list = list(CATEGORIES.values())
+    
+    for i, category in enumerate(category_list):
+        col_idx = i % 2
+        icon = CATEGORY_ICONS.get(i, "📦")  # Icône spécifique ou générique
+        with cols[col_idx]:
+            if st.button(f"{icon} {category}", key=f"cat_btn_{i}", use_container_width=True):
+                selected_category = category
+                st.session_state.selected_correction = category
+    
+    # Vérifier s'il y a une sélection
+    if 'selected_correction' in st.session_state:
+        selected_category = st.session_state.selected_correction
+        
+    if selected_category:
+        # Trouver l'index de la catégorie sélectionnée
+        correct_index = None
+        for idx, cat_name in CATEGORIES.items():
+            if cat_name == selected_category:
+                correct_index = idx
+                break
+        
+        if correct_index is not None:
+            st.success(f"Merci ! Catégorie corrigée : **{selected_category}**")
+            
+            # Optionnel : sauvegarder la correction pour l'amélioration du modèle
+            if st.button("✅ Confirmer cette correction", type="primary"):
+                # Écriture en arrière-plan (SQLite WAL) : aucun accès disque ici
+                get_feedback_store().record(Correction(
+                    designation=st.session_state.get('designation', ''),
+                    description=st.session_state.get('description', ''),
+                    image_digest=st.session_state.get('image_digest', ""),
+                    predicted_index=result['category'],
+                    predicted_label=result['category_name'],
+                    corrected_index=correct_index,
+                    corrected_label=selected_category,
+                    model_version=result.get('model_version', "")
+                ))
+                st.success("Correction enregistrée ! Cela aidera à améliorer notre IA.")
+                if 'selected_correction' in st.session_state:
+                    del st.session_state.selected_correction
+                st.session_state.show_category_selector = False
+                st.rerun(scope="fragment")
+
+
+def main():
+    # Style et en-tête en un seul élément identique d'une exécution à l'autre : au-delà de
+    # ``global.minCachedMessageSize`` (.streamlit/config.toml), le navigateur le garde en cache et
+    # les réexécutions complètes n'envoient plus que son empreinte
+    st.markdown(PAGE_STYLE + HEADER_HTML, unsafe_allow_html=True)
+
+    # Progress steps
+    progress_steps()
+    # Session active : ses images restent en mémoire dans le cache partagé
+    get_blob_store().touch(session_id())
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # Container principal
+    st.markdown('<div class="rakuten-container">', unsafe_allow_html=True)
+
+    # Section 1: Upload d'image et informations produit (fragments indépendants)
+    st.markdown('<h2 class="section-title">📸 Dites-nous en plus</h2>', unsafe_allow_html=True)
+
+    col_left, col_right = st.columns([1, 1])
+
+    with col_left:
+        upload_section()
+
+    with col_right:
+        listing_form()
+
+    # Section 2: Résultats
+    if 'prediction_result' in st.session_state:
+        result_section()
     else:
         # Message d'encouragement
-        if not uploaded_image:
+        if 'image_digest' not in st.session_state:
             st.markdown("""
             <div style="
                 background: #f8f8f8;
@@ -601,8 +746,55 @@ def main():
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # Section 3: Classification par lot
+    st.markdown("<br>", unsafe_allow_html=True)
+    with st.expander("📦 Classification par lot (CSV / Parquet)"):
+        batch_classification()
+
     # Footer simple
     st.markdown("<br><br>", unsafe_allow_html=True)
 
+    # Apprentissage incrémental depuis les corrections (RAKUTEN_LEARNER=1), un thread par processus
+    start_learner_if_enabled()
+
+    # Export des latences par étape (RAKUTEN_METRICS=1), un fichier / port par processus
+    metrics.start_exporter()
+
+    # Chauffe et sonde /ready (RAKUTEN_READY_PORT), une fois par processus ; déjà
+    # faites au démarrage avec ``python -m rakuten_classifier app``
+    warmup.start_in_background()
+
+    # La page est affichée : torch (ou le pool de processus image) peut se
+    # charger en arrière-plan pour la première analyse d'image
+    if env_flag("RAKUTEN_PRELOAD_VISION", default=True):
+        if IMAGE_POOL_WORKERS:
+            start_image_pool()
+        else:
+            preload_in_background("torch", "torchvision")
+
+def metrics_sidebar():
+    """Panneau de débogage : latences par étape, caches et appels aux modèles"""
+    from rakuten_classifier import cache_stats
+    from rakuten_classifier.duplicates import duplicate_stats
+
+    with st.sidebar.expander("⏱️ Latences par étape", expanded=True):
+        rows = metrics.summary()
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("Aucune mesure pour l'instant.")
+        calls = {dict(labels).get("model"): value
+                 for (name, labels), value in metrics.get_metrics().counters().items() if name == "model_calls"}
+        st.caption("Appels aux modèles : " + (", ".join(f"{k} {v}" for k, v in sorted(calls.items())) or "aucun"))
+        st.caption("Caches : " + ", ".join(f"{kind} {stats['hits']}/{stats['hits'] + stats['misses']}"
+                                           for kind, stats in cache_stats().items()))
+        duplicates = duplicate_stats()
+        if duplicates:
+            st.caption(f"Quasi-doublons : {duplicates['hits']}/{duplicates['hits'] + duplicates['misses']} "
+                       f"({duplicates['size']} empreintes)")
+
 if __name__ == "__main__":
-    main()
+    with metrics.stage("rerun"):
+        main()
+    if metrics.ENABLED and metrics.SIDEBAR:
+        metrics_sidebar()
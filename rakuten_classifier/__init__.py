@@ -0,0 +1,23 @@
+"""Cœur de classification des produits Rakuten, utilisable sans Streamlit"""
+from .cache import PredictionCache, cache_stats, get_prediction_cache, prediction_key
+from .categories import CATEGORIES, CATEGORY_ICONS, category_index, display_label
+from .engine import Prediction, TextEngine, build_text, get_engine
+from .registry import ModelBundle, ModelRegistry, get_registry
+
+__all__ = [
+    "CATEGORIES",
+    "CATEGORY_ICONS",
+    "ModelBundle",
+    "ModelRegistry",
+    "Prediction",
+    "PredictionCache",
+    "TextEngine",
+    "build_text",
+    "cache_stats",
+    "category_index",
+    "display_label",
+    "get_engine",
+    "get_prediction_cache",
+    "get_registry",
+    "prediction_key",
+]
@@ -0,0 +1,193 @@
+"""Classification par lot de fichiers CSV ou Parquet.
+
+Le fichier est lu par morceaux (``RAKUTEN_BATCH_CHUNK_SIZE`` lignes) : chaque
+morceau passe par un seul ``transform`` TF-IDF et un seul ``predict_proba``
+vectorisés, puis est écrit immédiatement dans le fichier de sortie. La mémoire
+utilisée dépend de la taille d'un morceau, pas de celle du fichier.
+
+Le fichier de sortie reprend les colonnes d'origine et ajoute la catégorie
+prédite, son index dans ``CATEGORIES`` et les ``top_k`` classes les plus
+probables avec leur confiance.
+
+``map_chunks`` répartit des morceaux sur un pool de processus (classification
+et évaluation en ligne de commande) en gardant l'ordre d'entrée.
+"""
+import collections
+import io
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .config import env_int
+from .engine import build_text
+
+CHUNK_SIZE = env_int("RAKUTEN_BATCH_CHUNK_SIZE", 5000)
+TEXT_COLUMNS = ("designation", "description")
+FORMATS = ("csv", "parquet")
+
+
+def init_worker():
+    """Initialisation d'un processus du pool : un thread BLAS/OpenMP, moteur chargé.
+
+    Réservé aux processus du pool : la limite vaut pour tout le processus et
+    n'est jamais levée.
+    """
+    # Le parallélisme vient du pool
+    from threadpoolctl import threadpool_limits
+
+    from .engine import get_engine
+
+    threadpool_limits(1)
+    get_engine()
+
+
+def map_chunks(fn, tasks, workers=1):
+    """Résultats de ``fn(tâche)`` dans l'ordre des tâches ; au plus 2 × workers tâches en mémoire"""
+    if workers <= 1:
+        from .engine import get_engine
+
+        # Dans le processus appelant : moteur chargé, réglages BLAS/OpenMP laissés tels quels
+        get_engine()
+        for task in tasks:
+            yield fn(task)
+        return
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(fn, (task,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def detect_format(name):
+    """Format d'après l'extension du fichier"""
+    suffix = Path(name).suffix.lower().lstrip(".")
+    if suffix in ("parquet", "pq"):
+        return "parquet"
+    if suffix in ("csv", "txt"):
+        return "csv"
+    raise ValueError(f"Format de fichier non pris en charge : {name} (CSV ou Parquet attendu)")
+
+
+def _check_columns(columns):
+    if not any(column in columns for column in TEXT_COLUMNS):
+        raise ValueError("Le fichier doit contenir une colonne 'designation' et/ou 'description'")
+
+
+def read_chunks(source, fmt, chunksize=CHUNK_SIZE):
+    """Itérer sur les morceaux d'un fichier, avec la fraction déjà lue (0 à 1)"""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(source)
+        _check_columns(parquet.schema_arrow.names)
+        total = max(parquet.metadata.num_rows, 1)
+        done = 0
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            frame = batch.to_pandas()
+            done += len(frame)
+            yield frame, done / total
+        return
+
+    size = _stream_size(source)
+    reader = pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False)
+    for frame in reader:
+        _check_columns(frame.columns)
+        yield frame, min(source.tell() / size, 1.0) if size else 0.0
+
+
+def _stream_size(source):
+    try:
+        position = source.tell()
+        source.seek(0, io.SEEK_END)
+        size = source.tell()
+        source.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return 0
+
+
+def texts_of(frame):
+    """Textes à classer (désignation puis description) d'un morceau"""
+    columns = [frame[column].fillna("").astype(str) if column in frame else None for column in TEXT_COLUMNS]
+    designations = columns[0] if columns[0] is not None else [""] * len(frame)
+    descriptions = columns[1] if columns[1] is not None else [""] * len(frame)
+    return [build_text(d, s) for d, s in zip(designations, descriptions)]
+
+
+def top_k_columns(engine, proba, top_k):
+    """Colonnes de résultat à partir d'une matrice de probabilités (n × classes)"""
+    labels = np.asarray(engine.labels, dtype=object)
+    categories = np.asarray([-1 if c is None else c for c in engine.categories])
+    order = np.argsort(-proba, axis=1, kind="stable")[:, :top_k]
+    rows = np.arange(len(proba))[:, np.newaxis]
+    confidences = proba[rows, order]
+
+    columns = {
+        "predicted_category": labels[order[:, 0]],
+        "predicted_category_index": categories[order[:, 0]],
+        "confidence": confidences[:, 0],
+    }
+    for rank in range(top_k):
+        columns[f"top{rank + 1}_category"] = labels[order[:, rank]]
+        columns[f"top{rank + 1}_confidence"] = confidences[:, rank]
+    return columns
+
+
+def classify_frame(engine, frame, top_k=3):
+    """Classer un morceau : un transform et un predict_proba pour toutes les lignes"""
+    top_k = max(1, min(top_k, len(engine.labels)))
+    proba = engine.predict_proba(texts_of(frame))
+    result = frame.reset_index(drop=True).copy()
+    for name, values in top_k_columns(engine, proba, top_k).items():
+        result[name] = values
+    return result
+
+
+def classify_file(engine, source, destination, fmt, chunksize=CHUNK_SIZE, top_k=3, progress=None):
+    """Classer un fichier morceau par morceau et écrire le résultat au même format.
+
+    ``source`` est un chemin ou un fichier binaire, ``destination`` un chemin.
+    ``progress(fraction, rows)`` est appelé après chaque morceau. Renvoie le
+    nombre de lignes classées.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as handle:
+            return classify_file(engine, handle, destination, fmt, chunksize, top_k, progress)
+
+    rows = 0
+    writer = None
+    output = None
+    try:
+        for frame, fraction in read_chunks(source, fmt, chunksize):
+            result = classify_frame(engine, frame, top_k)
+            if fmt == "parquet":
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(result, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(destination, table.schema)
+                else:
+                    # Un morceau entièrement vide peut inférer un type différent
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+            else:
+                if output is None:
+                    output = open(destination, "w", encoding="utf-8", newline="")
+                result.to_csv(output, header=rows == 0, index=False)
+            rows += len(result)
+            if progress is not None:
+                progress(fraction, rows)
+    finally:
+        if writer is not None:
+            writer.close()
+        if output is not None:
+            output.close()
+    return rows
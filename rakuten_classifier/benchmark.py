@@ -0,0 +1,290 @@
+"""Banc de performance reproductible de chaque étape de la classification.
+
+Les entrées sont synthétiques et tirées d'une graine fixe : titres et
+descriptions de produits en français, photos JPEG/PNG de tailles réalistes.
+Étapes mesurées (médiane, p95, min, en millisecondes) :
+
+- ``model_load`` : chargement des artefacts texte ;
+- ``tfidf_transform_*`` / ``featurize_row`` : vectoriseur scikit-learn sur une
+  ligne et un lot, chemin rapide d'une ligne ;
+- ``predict_proba_*`` / ``engine_predict_row`` : modèle sur une ligne et un
+  lot, chemin rapide complet ;
+- ``image_prepare_*`` : décodage, redimensionnement et vignette par taille ;
+- ``image_forward_*`` : passage du classifieur image (une image, un lot) ;
+- ``app_*`` : exécution complète de ``app.py`` avec ``AppTest`` (premier
+  passage, réexécution, saisie d'un titre, affichage d'un résultat).
+
+Les résultats sont écrits en JSON avec l'environnement (versions, CPU,
+commit) et comparés à une référence enregistrée : une médiane plus lente que
+la référence de plus de ``--tolerance`` est une régression (code de sortie 1).
+
+    python -m rakuten_classifier benchmark -o bench.json --baseline benchmark_baseline.json
+"""
+import io
+import itertools
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+DEFAULT_TOLERANCE = 0.25
+IMAGE_SIZES = ((500, 500, "JPEG"), (1000, 1000, "JPEG"), (3000, 2000, "JPEG"), (800, 800, "PNG"))
+PACKAGES = ("numpy", "scipy", "sklearn", "pandas", "PIL", "torch", "torchvision", "streamlit")
+
+PRODUCTS = ("Livre", "Coffret DVD", "Jeu vidéo", "Console portable", "Coque", "Smartphone", "Clé USB",
+            "Casque audio", "Canapé", "Lampe de chevet", "Cafetière", "Aspirateur", "Chocolat noir", "Thé vert",
+            "Perceuse", "Croquettes", "Raquette", "Vélo", "Robe", "Baskets", "Parfum", "Crème hydratante",
+            "Peluche", "Poussette", "Puzzle", "Figurine")
+BRANDS = ("Samsung", "Apple", "Sony", "Nintendo", "Ikea", "Moulinex", "Dyson", "Lindt", "Bosch", "Decathlon",
+          "Zara", "L'Oréal", "Lego", "Playmobil", "Gallimard", "Hachette", "Philips", "Tefal")
+QUALIFIERS = ("neuf", "occasion", "très bon état", "édition collector", "lot de 3", "taille M", "noir",
+              "blanc", "rouge", "bleu marine", "en bois", "inox", "bio", "sans fil", "compatible iPhone",
+              "pour enfant", "2 places", "32 Go", "reconditionné", "grand format")
+SENTENCES = ("Livraison rapide et soignée.", "Article jamais utilisé, encore sous blister.",
+             "Quelques traces d'usure sans gravité.", "Vendu avec sa boîte et sa notice d'origine.",
+             "Idéal pour offrir.", "Dimensions et photos non contractuelles.", "Garantie constructeur 2 ans.",
+             "Envoi suivi depuis la France.", "Fonctionne parfaitement, testé avant envoi.")
+
+
+def synthetic_listings(n, seed=0):
+    """(désignation, description) de produits français plausibles"""
+    rng = np.random.default_rng(seed)
+    listings = []
+    for _ in range(n):
+        title = " ".join([rng.choice(PRODUCTS), rng.choice(BRANDS),
+                          *rng.choice(QUALIFIERS, size=rng.integers(1, 4), replace=False)])
+        description = " ".join(rng.choice(SENTENCES, size=rng.integers(0, 5), replace=False))
+        listings.append((title, description))
+    return listings
+
+
+def synthetic_image(width, height, fmt="JPEG", seed=0):
+    """Photo synthétique (dégradés, formes, grain) encodée comme un téléversement"""
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width, y / height, 0.5 + 0.5 * np.sin((x + y) / 97.0)], axis=-1) * 200.0
+    base += rng.normal(0.0, 12.0, size=base.shape)
+    image = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        box = (x0, y0, x0 + rng.integers(20, width // 3 + 21), y0 + rng.integers(20, height // 3 + 21))
+        draw.ellipse(box, fill=tuple(int(c) for c in rng.integers(0, 256, size=3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def measure(fn, repeat=30, warmup=3):
+    """Durées (ms) de ``repeat`` appels après ``warmup`` appels de chauffe"""
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings[i] = (time.perf_counter() - start) * 1e3
+    return {
+        "runs": repeat,
+        "median_ms": float(np.median(timings)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "min_ms": float(timings.min()),
+        "mean_ms": float(timings.mean()),
+    }
+
+
+def _package_version(name):
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+    return getattr(module, "__version__", None)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=APP_PATH.parent, capture_output=True, text=True,
+                              timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """Métadonnées de la machine et des dépendances, pour interpréter les écarts"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "packages": {name: _package_version(name) for name in PACKAGES},
+        "git_commit": _git_commit(),
+        "settings": {key: value for key, value in sorted(os.environ.items()) if key.startswith("RAKUTEN_")},
+    }
+
+
+def text_benchmarks(repeat, batch_size=1000):
+    from .engine import TextEngine, build_text, pad_features
+    from .registry import ModelRegistry
+
+    registry = ModelRegistry()
+    results = {"model_load": measure(registry.reload, repeat=max(3, repeat // 10), warmup=1)}
+    bundle = registry.get()
+    vectorizer, model = bundle.vectorizer, bundle.model
+    engine = TextEngine(bundle, cache_dir=None)
+
+    texts = [build_text(*listing) for listing in synthetic_listings(batch_size)]
+    text = texts[0]
+    X_row = pad_features(vectorizer.transform([text]), model.n_features_in_)
+    X_batch = pad_features(vectorizer.transform(texts), model.n_features_in_)
+    results.update({
+        "tfidf_transform_row": measure(lambda: vectorizer.transform([text]), repeat),
+        f"tfidf_transform_batch{batch_size}": measure(lambda: vectorizer.transform(texts), max(3, repeat // 5)),
+        "featurize_row": measure(lambda: engine.featurizer.row(text), repeat),
+        "predict_proba_row": measure(lambda: model.predict_proba(X_row), repeat),
+        f"predict_proba_batch{batch_size}": measure(lambda: model.predict_proba(X_batch), max(3, repeat // 5)),
+        "engine_predict_row": measure(lambda: engine.predict_proba_one(text), repeat),
+    })
+    return results, bundle.version
+
+
+def image_benchmarks(repeat, random_weights=False, batch_size=8):
+    from .imaging import prepare_image
+    from .vision import ImageClassifier
+
+    results = {}
+    arrays = []
+    for width, height, fmt in IMAGE_SIZES:
+        data = synthetic_image(width, height, fmt)
+        results[f"image_prepare_{width}x{height}_{fmt.lower()}"] = measure(lambda: prepare_image(data), repeat)
+        arrays.append(prepare_image(data).array)
+
+    # Poids aléatoires : même latence, sans téléchargement des poids pré-entraînés
+    classifier = ImageClassifier(weights=None) if random_weights else ImageClassifier()
+    batch = np.stack([arrays[i % len(arrays)] for i in range(batch_size)])
+    results["image_forward_1"] = measure(lambda: classifier.forward(batch[:1]), repeat)
+    results[f"image_forward_batch{batch_size}"] = measure(lambda: classifier.forward(batch), max(3, repeat // 5))
+    return results
+
+
+# Ni chauffe ni préchargement de torch en arrière-plan pendant les mesures de l'app
+APP_ENVIRONMENT = {"RAKUTEN_WARMUP": "0", "RAKUTEN_PRELOAD_VISION": "0"}
+
+
+def app_benchmarks(repeat, timeout=120):
+    """Exécutions complètes de ``main()`` avec le testeur sans navigateur de Streamlit"""
+    saved = {name: os.environ.get(name) for name in APP_ENVIRONMENT}
+    os.environ.update(APP_ENVIRONMENT)
+    try:
+        return _app_benchmarks(repeat, timeout)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _app_benchmarks(repeat, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    from . import warmup
+
+    def fresh():
+        return AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+
+    def cold():
+        fresh().run()
+
+    app = fresh().run()
+    if app.exception:
+        raise RuntimeError(f"Exception dans app.py : {app.exception[0].value}")
+    # Chauffe déjà lancée dans ce processus (module importé plus tôt) : attendre sa fin
+    warmup.wait_ready(timeout)
+
+    titles = itertools.cycle(title for title, _ in synthetic_listings(50, seed=1))
+
+    def typed():
+        # Un titre différent à chaque passage : le widget change vraiment de valeur
+        app.text_input[0].set_value(next(titles)).run()
+
+    result_app = fresh()
+    result_app.session_state["prediction_result"] = {
+        "category": 0, "category_name": "Livre", "confidence": 0.9, "used_image": False, "used_text": True,
+        "model_version": "benchmark",
+    }
+    result_app.run()
+
+    runs = max(3, repeat // 5)
+    return {
+        # Nouvelle session : script, imports déjà en cache du processus, mise en page complète
+        "app_cold_run": measure(cold, runs, warmup=1),
+        "app_rerun": measure(app.run, runs, warmup=1),
+        "app_rerun_text_input": measure(typed, runs, warmup=1),
+        "app_rerun_with_result": measure(result_app.run, runs, warmup=1),
+    }
+
+
+STAGES = ("text", "image", "app")
+
+
+def run_benchmarks(stages=STAGES, repeat=30, random_weights=False):
+    """Résultats de toutes les étapes demandées, avec l'environnement"""
+    report = {"environment": environment(), "results": {}, "skipped": {}}
+    if "text" in stages:
+        results, version = text_benchmarks(repeat)
+        report["results"].update(results)
+        report["environment"]["model_version"] = version
+    if "image" in stages:
+        report["results"].update(image_benchmarks(repeat, random_weights))
+    if "app" in stages:
+        try:
+            report["results"].update(app_benchmarks(repeat))
+        except ImportError as e:
+            report["skipped"]["app"] = str(e)
+    return report
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE, metric="median_ms"):
+    """Écarts à la référence : ``regression`` si plus lent de plus de ``tolerance``"""
+    rows = []
+    current, reference = report["results"], baseline.get("results", {})
+    for name in sorted(set(current) | set(reference)):
+        if name not in reference:
+            rows.append({"name": name, "status": "new", "current": current[name][metric]})
+            continue
+        if name not in current:
+            rows.append({"name": name, "status": "missing", "baseline": reference[name][metric]})
+            continue
+        ratio = current[name][metric] / reference[name][metric] if reference[name][metric] else float("inf")
+        status = "regression" if ratio > 1.0 + tolerance else "improvement" if ratio < 1.0 - tolerance else "ok"
+        rows.append({"name": name, "status": status, "baseline": reference[name][metric],
+                     "current": current[name][metric], "ratio": ratio})
+    return rows
+
+
+def environment_differences(report, baseline):
+    """Champs d'environnement qui rendent la comparaison moins fiable"""
+    current, reference = report["environment"], baseline.get("environment", {})
+    keys = ("machine", "cpu_count", "python", "packages", "settings")
+    return {key: {"baseline": reference.get(key), "current": current.get(key)}
+            for key in keys if reference.get(key) != current.get(key)}
+
+
+def format_comparison(rows):
+    lines = [f"{'étape':<34} {'référence':>11} {'actuel':>11} {'ratio':>7}  statut"]
+    for row in rows:
+        baseline = f"{row['baseline']:.3f}" if "baseline" in row else "-"
+        current = f"{row['current']:.3f}" if "current" in row else "-"
+        ratio = f"{row['ratio']:.2f}" if "ratio" in row else "-"
+        lines.append(f"{row['name']:<34} {baseline:>11} {current:>11} {ratio:>7}  {row['status']}")
+    return "\n".join(lines)
@@ -0,0 +1,271 @@
+"""Cache partagé des téléversements, borné en mémoire et débordant sur disque.
+
+La session Streamlit ne garde que l'empreinte du contenu, la vignette
+d'affichage et le plongement de l'image (une fois calculé). L'original et
+l'entrée du modèle (3, 224, 224) sont confiés à un ``BlobStore`` unique par
+processus, adressé par l'empreinte :
+
+- en mémoire jusqu'à ``RAKUTEN_BLOB_MEMORY_MB`` (256 Mio) ;
+- au-delà, les entrées les moins utiles sont écrites dans un sous-dossier
+  ``<pid>`` de ``RAKUTEN_BLOB_DIR`` (sous-dossier du répertoire temporaire par
+  défaut, vide : pas de disque), propre au processus et supprimé à sa sortie,
+  borné à ``RAKUTEN_BLOB_DISK_MB`` (2 Gio, plus anciennes d'abord).
+
+Les deux budgets s'entendent par processus : avec ``n`` workers Streamlit ou
+répliques sur la même machine, prévoir ``n`` fois ces volumes.
+
+Chaque entrée est rattachée aux sessions qui l'utilisent. L'ordre d'éviction
+suit la dernière activité de l'entrée et de ses sessions : les artefacts des
+sessions inactives (ou abandonnées) partent d'abord, ceux d'une session
+active restent en mémoire. Une entrée débordée revient en mémoire à sa
+prochaine lecture.
+"""
+import atexit
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .config import env_int
+from .imaging import PreparedImage, perceptual_hash, prepare_image
+
+MEMORY_BUDGET = env_int("RAKUTEN_BLOB_MEMORY_MB", 256) * 2 ** 20
+DISK_BUDGET = env_int("RAKUTEN_BLOB_DISK_MB", 2048) * 2 ** 20
+BLOB_DIR = os.environ.get("RAKUTEN_BLOB_DIR", str(Path(tempfile.gettempdir()) / "rakuten-blobs"))
+
+_SAFE_KEY = re.compile(r"^[0-9A-Za-z._-]+$")
+
+
+class BlobStore:
+    """Octets adressés par clé, rattachés à des sessions, bornés en mémoire et sur disque"""
+
+    def __init__(self, memory_budget=MEMORY_BUDGET, disk_budget=DISK_BUDGET, directory=BLOB_DIR,
+                 clock=time.monotonic):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.directory = Path(directory) if directory and disk_budget > 0 else None
+        self._clock = clock
+        self._memory = {}
+        self._used = {}
+        self._owners = {}
+        self._activity = {}
+        self._disk = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.spills = 0
+        self.evictions = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Fichiers laissés par un processus précédent : comptés dans le budget disque
+            for path in sorted(self.directory.iterdir(), key=lambda p: p.stat().st_mtime):
+                if path.is_file() and _SAFE_KEY.match(path.name):
+                    self._disk[path.name] = path.stat().st_size
+                    self.disk_bytes += self._disk[path.name]
+
+    def touch(self, owner):
+        """Signaler l'activité d'une session (ses entrées passent après celles des sessions inactives)"""
+        with self._lock:
+            if owner in self._activity:
+                self._activity[owner] = self._clock()
+
+    def put(self, key, data, owner=None):
+        if not _SAFE_KEY.match(key):
+            raise ValueError(f"Clé invalide : {key}")
+        data = bytes(data)
+        with self._lock:
+            self._store(key, data, owner)
+            self._evict()
+
+    def get(self, key, owner=None):
+        """Octets de l'entrée (relus du disque si elle a débordé), None si évincée"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self.hits += 1
+                self._attach(key, owner)
+                return data
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            try:
+                data = (self.directory / key).read_bytes()
+            except OSError:
+                self._forget_file(key)
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, data, owner)
+            self._evict()
+            return data
+
+    def release(self, key, owner):
+        """La session n'utilise plus l'entrée (image remplacée ou retirée)"""
+        with self._lock:
+            owners = self._owners.get(key)
+            if owners is not None:
+                owners.discard(owner)
+            self._prune_owner(owner)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "memory_budget": self.memory_budget,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+                "disk_budget": self.disk_budget if self.directory is not None else 0,
+                "sessions": len(self._activity),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "spills": self.spills,
+                "evictions": self.evictions,
+            }
+
+    def _store(self, key, data, owner):
+        previous = self._memory.get(key)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+        self._memory[key] = data
+        self.memory_bytes += len(data)
+        self._owners.setdefault(key, set())
+        self._attach(key, owner)
+
+    def _attach(self, key, owner):
+        now = self._clock()
+        self._used[key] = now
+        if owner is not None:
+            self._owners[key].add(owner)
+            self._activity[owner] = now
+
+    def _recency(self, key):
+        return max([self._used[key]] + [self._activity[owner] for owner in self._owners[key]])
+
+    def _evict(self):
+        if self.memory_bytes <= self.memory_budget:
+            return
+        for key in sorted(self._memory, key=self._recency):
+            if self.memory_bytes <= self.memory_budget:
+                break
+            data = self._memory.pop(key)
+            self.memory_bytes -= len(data)
+            del self._used[key]
+            for owner in self._owners.pop(key):
+                self._prune_owner(owner)
+            # Écriture sous le verrou : les téléversements sont rares devant les lectures
+            if self._spill(key, data):
+                self.spills += 1
+            else:
+                self.evictions += 1
+
+    def _prune_owner(self, owner):
+        if owner in self._activity and not any(owner in owners for owners in self._owners.values()):
+            del self._activity[owner]
+
+    def _spill(self, key, data):
+        if self.directory is None or len(data) > self.disk_budget:
+            return False
+        if key not in self._disk:
+            path = self.directory / key
+            tmp = path.with_name(f".{key}.{os.getpid()}.tmp")
+            try:
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError:
+                return False
+            self._disk[key] = len(data)
+            self.disk_bytes += len(data)
+        self._disk.move_to_end(key)
+        while self.disk_bytes > self.disk_budget:
+            oldest = next(iter(self._disk))
+            try:
+                (self.directory / oldest).unlink()
+            except OSError:
+                pass
+            self._forget_file(oldest)
+            self.evictions += 1
+        return True
+
+    def _forget_file(self, key):
+        self.disk_bytes -= self._disk.pop(key, 0)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _remove_directory(directory, pid):
+    # Un processus enfant (fork) hérite du gestionnaire : seul le créateur supprime le dossier
+    if os.getpid() == pid:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def process_directory(base=BLOB_DIR):
+    """Dossier de débordement propre au processus (``<base>/<pid>``), supprimé à sa sortie"""
+    if not base:
+        return None
+    directory = Path(base) / str(os.getpid())
+    atexit.register(_remove_directory, directory, os.getpid())
+    return directory
+
+
+def get_blob_store():
+    """Cache de téléversements du processus, partagé par toutes les sessions"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore(directory=process_directory())
+    return _store
+
+
+def blob_stats():
+    """Compteurs du cache de téléversements ({} s'il n'a pas encore servi)"""
+    return _store.stats() if _store is not None else {}
+
+
+def _input_key(digest):
+    return f"{digest}.input"
+
+
+def store_upload(data, owner=None, store=None):
+    """Préparer un téléversement et confier l'original et l'entrée du modèle au cache partagé"""
+    store = store or get_blob_store()
+    prepared = prepare_image(data)
+    buffer = io.BytesIO()
+    np.save(buffer, prepared.array, allow_pickle=False)
+    store.put(prepared.digest, data, owner)
+    store.put(_input_key(prepared.digest), buffer.getvalue(), owner)
+    return prepared
+
+
+def restore_upload(digest, thumbnail=b"", owner=None, store=None):
+    """``PreparedImage`` d'un téléversement, depuis le cache ; None si l'original a été évincé"""
+    store = store or get_blob_store()
+    data = store.get(_input_key(digest), owner)
+    if data is not None:
+        array = np.load(io.BytesIO(data), allow_pickle=False)
+        return PreparedImage(digest=digest, array=array, thumbnail=thumbnail, phash=perceptual_hash(array))
+    data = store.get(digest, owner)
+    if data is None:
+        return None
+    # Entrée du modèle évincée mais original encore là : décodé à nouveau
+    return store_upload(data, owner, store)
+
+
+def release_upload(digest, owner, store=None):
+    store = store or get_blob_store()
+    store.release(digest, owner)
+    store.release(_input_key(digest), owner)
@@ -0,0 +1,122 @@
+"""Cache de prédictions adressé par le contenu, partagé entre les sessions.
+
+La clé est une empreinte de (type de prédiction, version du modèle, empreinte
+des octets de l'image, désignation et description normalisées). Une annonce
+resoumise avec la même photo et le même titre est donc servie sans toucher au
+modèle, quelle que soit la session qui l'envoie. La version du modèle fait
+partie de la clé : un rechargement des artefacts invalide naturellement les
+anciennes entrées, qui sortent ensuite par LRU ou expiration.
+
+Chaque type de prédiction (``text``, ``image``, ``fusion``) a son propre cache
+borné et ses propres compteurs.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .config import env_float, env_int
+
+KINDS = ("text", "image", "fusion")
+MAX_ENTRIES = env_int("RAKUTEN_CACHE_MAX_ENTRIES", 4096)
+TTL_SECONDS = env_float("RAKUTEN_CACHE_TTL", 3600.0)
+
+
+def normalize_text(text):
+    """Normalisation sans effet sur la prédiction : casse et espaces"""
+    return " ".join((text or "").split()).lower()
+
+
+def prediction_key(kind, version, image_digest="", designation="", description=""):
+    """Clé de cache d'une prédiction"""
+    parts = (kind, version, image_digest or "", normalize_text(designation), normalize_text(description))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """Cache LRU borné avec durée de vie, sûr entre threads"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Valeur en cache, sinon calculée (hors verrou) puis mémorisée"""
+        sentinel = _MISSING
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_MISSING = object()
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_prediction_cache(kind):
+    """Cache du processus pour un type de prédiction (text, image ou fusion)"""
+    if kind not in KINDS:
+        raise ValueError(f"Type de prédiction inconnu : {kind}")
+    cache = _caches.get(kind)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(kind, PredictionCache())
+    return cache
+
+
+def cache_stats():
+    """Compteurs de tous les caches de prédiction"""
+    return {kind: get_prediction_cache(kind).stats() for kind in KINDS}
@@ -0,0 +1,362 @@
+"""Cascade texte → image et fusion tardive des deux modèles.
+
+Le modèle texte (quelques centaines de microsecondes) passe toujours en
+premier. Si l'écart entre ses deux classes les plus probables dépasse le seuil
+calibré, sa prédiction est renvoyée telle quelle et le modèle image (dizaines
+de millisecondes) n'est pas appelé. Sinon, ou si le texte est vide, l'image
+est analysée et les deux distributions sont fusionnées :
+
+    log p ∝ w_texte · log(p_texte + ε) + w_image · log(p_image + ε)
+
+Les poids et le seuil sont lus dans ``RAKUTEN_FUSION_PATH`` (``fusion.json``
+à côté des artefacts), produit par ``python -m rakuten_classifier
+cascade-report --save`` sur un jeu annoté ; à défaut, des valeurs prudentes
+sont utilisées.
+
+Si le modèle image échoue sur une annonce qui a du texte, la prédiction
+texte est renvoyée (issue ``image_failed``) ; seules les annonces sans texte
+propagent l'erreur.
+
+Les deux modèles n'ont pas tout à fait les mêmes classes : la fusion se fait
+dans un espace commun formé des 14 catégories et des classes propres au
+modèle texte (« Le coin des collectionneurs »).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .cache import get_prediction_cache, normalize_text, prediction_key
+from .categories import CATEGORIES, display_label
+from .config import ARTIFACT_DIR
+from .engine import Prediction
+
+logger = logging.getLogger(__name__)
+
+FUSION_PATH = Path(os.environ.get("RAKUTEN_FUSION_PATH", ARTIFACT_DIR / "fusion.json"))
+EPSILON = 1e-4
+DEFAULT_THRESHOLDS = tuple(np.round(np.arange(0.0, 1.0001, 0.05), 2))
+
+
+@dataclass(frozen=True)
+class FusionParameters:
+    """Seuil de la cascade et poids de la fusion"""
+
+    threshold: float = 0.2
+    text_weight: float = 1.0
+    image_weight: float = 0.5
+
+    @classmethod
+    def load(cls, path=FUSION_PATH):
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(**{f.name: float(data[f.name]) for f in fields(cls) if f.name in data})
+
+    def save(self, path=FUSION_PATH):
+        Path(path).write_text(json.dumps(asdict(self), indent=2) + "\n", encoding="utf-8")
+
+    @property
+    def version(self):
+        return f"{self.threshold:g}/{self.text_weight:.4g}/{self.image_weight:.4g}"
+
+
+def margin(proba):
+    """Écart entre les deux probabilités les plus fortes (dernier axe)"""
+    proba = np.asarray(proba)
+    if proba.shape[-1] < 2:
+        return proba[..., 0]
+    top = np.partition(proba, -2, axis=-1)
+    return top[..., -1] - top[..., -2]
+
+
+class LabelSpace:
+    """Espace commun : les 14 catégories puis les classes propres au texte"""
+
+    def __init__(self, text_labels, text_categories):
+        image_labels = tuple(CATEGORIES.values())
+        extra = tuple(label for label, category in zip(text_labels, text_categories) if category is None)
+        self.labels = image_labels + extra
+        self.categories = tuple(range(len(image_labels))) + (None,) * len(extra)
+        index = {label: i for i, label in enumerate(self.labels)}
+        self.text_index = np.array([index[label] if category is None else category
+                                    for label, category in zip(text_labels, text_categories)])
+        self.n_image = len(image_labels)
+
+    def from_text(self, proba):
+        proba = np.asarray(proba)
+        out = np.zeros(proba.shape[:-1] + (len(self.labels),))
+        out[..., self.text_index] = proba
+        return out
+
+    def from_image(self, proba):
+        proba = np.asarray(proba)
+        out = np.zeros(proba.shape[:-1] + (len(self.labels),))
+        out[..., :self.n_image] = proba
+        return out
+
+    def prediction(self, proba, version):
+        best = int(np.argmax(proba))
+        return Prediction(
+            label=self.labels[best],
+            category=self.categories[best],
+            confidence=float(proba[best]),
+            labels=self.labels,
+            probabilities=proba,
+            version=version,
+        )
+
+
+def fuse(text_proba, image_proba, text_weight, image_weight):
+    """Fusion log-linéaire (lignes de l'espace commun)"""
+    logits = text_weight * np.log(text_proba + EPSILON) + image_weight * np.log(image_proba + EPSILON)
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    fused = np.exp(logits)
+    return fused / fused.sum(axis=-1, keepdims=True)
+
+
+def fit_weights(text_proba, image_proba, targets, threshold=None, min_rows=50):
+    """Poids (texte, image) minimisant la log-vraisemblance négative.
+
+    Seules les lignes où la fusion sert réellement (marge texte sous le seuil)
+    sont utilisées, s'il y en a au moins ``min_rows`` ; sinon toutes.
+    """
+    from scipy.optimize import minimize
+
+    text_proba, image_proba, targets = np.asarray(text_proba), np.asarray(image_proba), np.asarray(targets)
+    if threshold is not None:
+        ambiguous = margin(text_proba) < threshold
+        if ambiguous.sum() >= min_rows:
+            text_proba, image_proba, targets = text_proba[ambiguous], image_proba[ambiguous], targets[ambiguous]
+    rows = np.arange(len(targets))
+
+    def loss(weights):
+        fused = fuse(text_proba, image_proba, *weights)
+        return -np.log(fused[rows, targets] + 1e-12).mean()
+
+    result = minimize(loss, x0=[1.0, 0.5], bounds=[(0.0, 10.0), (0.0, 10.0)], method="L-BFGS-B")
+    return tuple(float(w) for w in result.x)
+
+
+def calibrate_threshold(text_proba, targets, precision=0.9, thresholds=DEFAULT_THRESHOLDS):
+    """Plus petit seuil pour lequel le texte seul atteint ``precision`` sur les lignes acceptées"""
+    text_proba, targets = np.asarray(text_proba), np.asarray(targets)
+    margins = margin(text_proba)
+    correct = text_proba.argmax(axis=1) == targets
+    for threshold in sorted(thresholds):
+        accepted = margins >= threshold
+        if accepted.any() and correct[accepted].mean() >= precision:
+            return float(threshold)
+    return float(max(thresholds))
+
+
+def threshold_report(text_proba, image_proba, targets, text_seconds, image_seconds, has_image,
+                     text_weight, image_weight, thresholds=DEFAULT_THRESHOLDS):
+    """Précision et latence moyenne de la cascade pour chaque seuil.
+
+    ``text_seconds`` / ``image_seconds`` : latence mesurée de chaque modèle,
+    par ligne. Les lignes sans image restent toujours au texte seul.
+    """
+    text_proba, image_proba = np.asarray(text_proba), np.asarray(image_proba)
+    targets, has_image = np.asarray(targets), np.asarray(has_image, dtype=bool)
+    text_seconds, image_seconds = np.asarray(text_seconds), np.asarray(image_seconds)
+    margins = margin(text_proba)
+    text_pred = text_proba.argmax(axis=1)
+    fused_pred = fuse(text_proba, image_proba, text_weight, image_weight).argmax(axis=1)
+
+    report = []
+    for threshold in thresholds:
+        use_image = has_image & (margins < threshold)
+        predicted = np.where(use_image, fused_pred, text_pred)
+        eligible = has_image.sum()
+        report.append({
+            "threshold": float(threshold),
+            "image_skip_rate": float(1.0 - use_image.sum() / eligible) if eligible else 1.0,
+            "accuracy": float((predicted == targets).mean()),
+            "mean_latency_ms": float((text_seconds + np.where(use_image, image_seconds, 0.0)).mean() * 1e3),
+        })
+    return report
+
+
+def measure_listings(frames, image_root=".", label_column="category", image_column="image"):
+    """Sorties et latences des deux modèles sur un jeu annoté, ligne par ligne.
+
+    Renvoie (espace, probas texte, probas image, cibles, secondes texte,
+    secondes image, présence d'image) ; les lignes dont l'étiquette est
+    inconnue sont ignorées.
+    """
+    from .engine import build_text, get_engine
+    from .imaging import prepare_image
+    from .vision import get_image_classifier
+
+    engine = get_engine()
+    space = LabelSpace(engine.labels, engine.categories)
+    index = {label: i for i, label in enumerate(space.labels)}
+    classifier = None
+    text_rows, image_rows, targets, text_seconds, image_seconds, has_image = [], [], [], [], [], []
+
+    for frame in frames:
+        for row in frame.to_dict("records"):
+            target = index.get(display_label(row.get(label_column, "")))
+            if target is None:
+                continue
+            start = time.perf_counter()
+            text_proba = engine.predict_proba_one(build_text(row.get("designation") or "",
+                                                             row.get("description") or ""))
+            text_seconds.append(time.perf_counter() - start)
+            text_rows.append(space.from_text(text_proba))
+
+            image_path = row.get(image_column)
+            if isinstance(image_path, str) and image_path:
+                classifier = classifier or get_image_classifier()
+                start = time.perf_counter()
+                prepared = prepare_image((Path(image_root) / image_path).read_bytes())
+                _, image_proba = classifier.forward(prepared.array[np.newaxis])
+                image_seconds.append(time.perf_counter() - start)
+                image_rows.append(space.from_image(image_proba[0]))
+                has_image.append(True)
+            else:
+                image_seconds.append(0.0)
+                image_rows.append(np.zeros(len(space.labels)))
+                has_image.append(False)
+            targets.append(target)
+
+    return (space, np.array(text_rows), np.array(image_rows), np.array(targets),
+            np.array(text_seconds), np.array(image_seconds), np.array(has_image, dtype=bool))
+
+
+def cascade_report(frames, precision=0.9, **columns):
+    """Poids appris, seuil calibré et compromis précision / latence par seuil"""
+    _, text_proba, image_proba, targets, text_seconds, image_seconds, has_image = measure_listings(frames, **columns)
+    if not len(targets):
+        raise ValueError("Aucune ligne annotée avec une catégorie connue")
+    threshold = calibrate_threshold(text_proba, targets, precision)
+    with_image = has_image.nonzero()[0]
+    if len(with_image):
+        text_weight, image_weight = fit_weights(text_proba[with_image], image_proba[with_image],
+                                                targets[with_image], threshold)
+    else:
+        text_weight, image_weight = FusionParameters.text_weight, FusionParameters.image_weight
+    parameters = FusionParameters(threshold, text_weight, image_weight)
+    return parameters, {
+        "rows": int(len(targets)),
+        "rows_with_image": int(has_image.sum()),
+        "parameters": asdict(parameters),
+        "text_latency_ms": float(text_seconds.mean() * 1e3),
+        "image_latency_ms": float(image_seconds[has_image].mean() * 1e3) if has_image.any() else None,
+        "thresholds": threshold_report(text_proba, image_proba, targets, text_seconds, image_seconds,
+                                       has_image, text_weight, image_weight),
+    }
+
+
+@dataclass
+class CascadeResult:
+    prediction: Prediction
+    used_image: bool
+    text: Optional[Prediction]
+    image: Optional[Prediction]
+    seconds: float
+
+
+class CascadePredictor:
+    """Texte d'abord ; image seulement si le texte est vide ou ambigu"""
+
+    def __init__(self, parameters=None):
+        self.parameters = parameters or FusionParameters.load()
+        self._lock = threading.Lock()
+        self._space = None
+        self.counts = {"requests": 0, "text_confident": 0, "fused": 0, "text_only": 0, "image_only": 0,
+                       "image_failed": 0}
+
+    def label_space(self):
+        """Espace commun pour le moteur texte courant (reconstruit après rechargement)"""
+        from .engine import get_engine
+
+        engine = get_engine()
+        space = self._space
+        if space is None or space[0] != engine.version:
+            space = self._space = (engine.version, LabelSpace(engine.labels, engine.categories))
+        return space[1]
+
+    def predict(self, designation="", description="", prepared=None):
+        """Classer une annonce ; ``prepared`` est une ``PreparedImage`` facultative"""
+        from .core import classify_image, classify_text
+
+        start = time.perf_counter()
+        has_text = bool(normalize_text(designation) or normalize_text(description))
+        if not has_text and prepared is None:
+            raise ValueError("Annonce vide : ni texte ni image")
+
+        text = classify_text(designation, description) if has_text else None
+        space = self.label_space()
+
+        if text is not None and (prepared is None or margin(text.probabilities) >= self.parameters.threshold):
+            outcome = "text_only" if prepared is None else "text_confident"
+            result = CascadeResult(space.prediction(space.from_text(text.probabilities), text.version),
+                                   False, text, None, 0.0)
+        elif text is None:
+            outcome = "image_only"
+            image = classify_image(prepared)
+            result = CascadeResult(space.prediction(space.from_image(image.probabilities), image.version),
+                                   True, None, image, 0.0)
+        else:
+            try:
+                image = classify_image(prepared)
+            except Exception:
+                # Le texte, même ambigu, vaut mieux qu'une erreur pour le vendeur
+                logger.warning("Modèle image indisponible, prédiction texte seule", exc_info=True)
+                image = None
+            if image is None:
+                outcome = "image_failed"
+                prediction = space.prediction(space.from_text(text.probabilities), text.version)
+            else:
+                outcome = "fused"
+                prediction = self._fused(space, text, image, prepared.digest, designation, description)
+            result = CascadeResult(prediction, image is not None, text, image, 0.0)
+
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts[outcome] += 1
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _fused(self, space, text, image, digest, designation, description):
+        version = f"cascade:{text.version}+{image.version}:{self.parameters.version}"
+        key = prediction_key("fusion", version, image_digest=digest,
+                             designation=designation, description=description)
+
+        def compute():
+            fused = fuse(space.from_text(text.probabilities), space.from_image(image.probabilities),
+                         self.parameters.text_weight, self.parameters.image_weight)
+            return space.prediction(fused, version)
+
+        return get_prediction_cache("fusion").get_or_compute(key, compute)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        eligible = counts["text_confident"] + counts["fused"]
+        counts["image_skip_rate"] = counts["text_confident"] / eligible if eligible else 0.0
+        counts["threshold"] = self.parameters.threshold
+        return counts
+
+
+_cascade = None
+_cascade_lock = threading.Lock()
+
+
+def get_cascade():
+    """Cascade du processus (paramètres lus dans ``RAKUTEN_FUSION_PATH``)"""
+    global _cascade
+    if _cascade is None:
+        with _cascade_lock:
+            if _cascade is None:
+                _cascade = CascadePredictor()
+    return _cascade
@@ -0,0 +1,515 @@
+"""Index de plus proches voisins sur le catalogue, pour suggérer une annonce.
+
+Chaque annonce du catalogue est représentée par un vecteur : plongement de sa
+photo (``image``) ou ligne TF-IDF de son texte (``text``). Les vecteurs sont
+réduits par projection aléatoire (``dim``, 128 par défaut), normalisés, puis
+rangés dans un index IVF (« inverted file ») :
+
+- un k-means sphérique sur un échantillon donne ``n_lists`` centroïdes ;
+- chaque vecteur est affecté à son centroïde le plus proche, et les vecteurs
+  d'une même liste sont contigus sur disque ;
+- une requête ne parcourt que les ``nprobe`` listes les plus proches
+  (``RAKUTEN_CATALOG_NPROBE``, 16), soit quelques milliers de vecteurs même
+  pour des millions d'annonces.
+
+Tout est au format ``.npy`` projeté en mémoire (``mmap``), comme le format
+compact du modèle texte. Les ajouts incrémentaux (``append_index``) écrivent un
+nouveau segment affecté aux centroïdes existants ; au-delà de
+``MAX_SEGMENTS`` segments, ils sont fusionnés en un seul. Reconstruire l'index
+(``build_index``) réentraîne les centroïdes.
+
+Un dossier ``RAKUTEN_CATALOG_PATH`` contient un sous-dossier par type
+(``image/``, ``text/``) ; l'index texte est lié au vectoriseur avec lequel il
+a été construit et doit être reconstruit quand celui-ci change.
+
+    python -m rakuten_classifier catalog-build X_train.csv -o catalog/image --kind image --image-root images/
+    python -m rakuten_classifier catalog-append nouveautes.csv --index catalog/image --image-root images/
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .categories import CATEGORIES
+from .config import env_int
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+KINDS = ("image", "text")
+DTYPES = ("float32", "float16")
+DEFAULT_DIM = 128
+NPROBE = env_int("RAKUTEN_CATALOG_NPROBE", 16)
+MAX_SEGMENTS = 8
+TRAIN_SAMPLE = 100_000
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK = 65_536
+CATALOG_PATH = os.environ.get("RAKUTEN_CATALOG_PATH")
+
+# Séparateur désignation / description dans texts.bin
+_SEPARATOR = "\x1f"
+
+
+@dataclass(frozen=True)
+class CatalogMatch:
+    """Annonce du catalogue proche de la requête (score : similarité cosinus)"""
+    score: float
+    designation: str
+    description: str
+    category: Optional[int]
+
+    @property
+    def label(self):
+        return CATEGORIES.get(self.category)
+
+
+def default_lists(n_items):
+    """Nombre de listes usuel pour un IVF : environ 4 √n"""
+    return int(np.clip(round(4 * np.sqrt(max(n_items, 1))), 1, 65_536))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return vectors / norms
+
+
+def random_projection(input_dim, dim, seed=0):
+    """Matrice (input_dim, dim) gaussienne : les produits scalaires sont préservés en moyenne"""
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((input_dim, dim), dtype=np.float32) / np.sqrt(dim)).astype(np.float32)
+
+
+def assign(vectors, centroids, chunk=ASSIGN_CHUNK):
+    """Liste (centroïde le plus proche) de chaque vecteur normalisé"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        block = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+        lists[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def train_centroids(vectors, n_lists, iterations=KMEANS_ITERATIONS, sample=TRAIN_SAMPLE, seed=0):
+    """k-means sphérique sur un échantillon des vecteurs normalisés"""
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(vectors))
+    rows = np.sort(rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False))
+    data = np.asarray(vectors[rows], dtype=np.float32)
+    centroids = data[rng.choice(len(data), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        lists = assign(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, data)
+        empty = ~np.any(sums, axis=1)
+        # Liste vide : réamorcée sur un point tiré au hasard
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class _Spool:
+    """Vecteurs et textes accumulés sur disque avant d'être rangés par liste"""
+
+    def __init__(self, directory, dim):
+        self.directory = Path(directory)
+        self.dim = dim
+        self._vectors = open(self.directory / "vectors.f32", "wb")
+        self._texts = open(self.directory / "texts.bin", "wb")
+        self.offsets = [0]
+        self.categories = []
+
+    def add(self, vectors, texts, categories):
+        self._vectors.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        for designation, description in texts:
+            self._texts.write(f"{designation}{_SEPARATOR}{description}".encode("utf-8"))
+            self.offsets.append(self._texts.tell())
+        self.categories.extend(categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def finish(self):
+        """(vecteurs, octets des textes, décalages, catégories), projetés en mémoire"""
+        self._vectors.close()
+        self._texts.close()
+        n = len(self)
+        vectors = np.memmap(self.directory / "vectors.f32", dtype=np.float32, mode="r", shape=(n, self.dim)) \
+            if n else np.zeros((0, self.dim), dtype=np.float32)
+        size = self.offsets[-1]
+        texts = np.memmap(self.directory / "texts.bin", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+        return vectors, texts, np.asarray(self.offsets, dtype=np.int64), np.asarray(self.categories, dtype=np.int8)
+
+
+def _write_segment(directory, vectors, texts, text_offsets, categories, centroids, dtype):
+    """Segment : vecteurs rangés par liste, décalages des listes, catégories et textes dans le même ordre"""
+    directory.mkdir(parents=True)
+    lists = assign(vectors, centroids)
+    order = np.argsort(lists, kind="stable")
+    np.save(directory / "list_offsets.npy", np.searchsorted(lists[order], np.arange(len(centroids) + 1)))
+    np.save(directory / "categories.npy", categories[order])
+
+    out = np.lib.format.open_memmap(directory / "vectors.npy", mode="w+", dtype=dtype, shape=vectors.shape)
+    for start in range(0, len(order), ASSIGN_CHUNK):
+        out[start:start + ASSIGN_CHUNK] = vectors[order[start:start + ASSIGN_CHUNK]]
+    out.flush()
+    del out
+
+    offsets = np.empty(len(order) + 1, dtype=np.int64)
+    offsets[0] = 0
+    with open(directory / "texts.bin", "wb") as handle:
+        for i, row in enumerate(order):
+            handle.write(texts[text_offsets[row]:text_offsets[row + 1]].tobytes())
+            offsets[i + 1] = handle.tell()
+    np.save(directory / "text_offsets.npy", offsets)
+
+
+class Segment:
+    """Segment projeté en mémoire"""
+
+    def __init__(self, directory, mmap_mode="r"):
+        self.directory = Path(directory)
+        # Vues ndarray des tableaux projetés : découpage sans le surcoût de np.memmap
+        self.vectors = np.asarray(np.load(self.directory / "vectors.npy", mmap_mode=mmap_mode))
+        self.list_offsets = np.load(self.directory / "list_offsets.npy")
+        self.categories = np.asarray(np.load(self.directory / "categories.npy", mmap_mode=mmap_mode))
+        self.text_offsets = np.asarray(np.load(self.directory / "text_offsets.npy", mmap_mode=mmap_mode))
+        size = self.text_offsets[-1] if len(self.text_offsets) else 0
+        self.texts = np.memmap(self.directory / "texts.bin", dtype=np.uint8, mode="r") if size else b""
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def scan(self, lists, query, category=None):
+        """(scores, positions) des vecteurs des listes demandées"""
+        scores, positions = [], []
+        for lst in lists:
+            start, stop = self.list_offsets[lst], self.list_offsets[lst + 1]
+            if start == stop:
+                continue
+            block = self.vectors[start:stop]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            found = block @ query
+            position = np.arange(start, stop)
+            if category is not None:
+                keep = self.categories[start:stop] == category
+                found, position = found[keep], position[keep]
+            scores.append(found)
+            positions.append(position)
+        if not scores:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.intp)
+        return np.concatenate(scores), np.concatenate(positions)
+
+    def item(self, position):
+        """(désignation, description, catégorie) d'une position du segment"""
+        raw = bytes(self.texts[self.text_offsets[position]:self.text_offsets[position + 1]]).decode("utf-8")
+        designation, _, description = raw.partition(_SEPARATOR)
+        category = int(self.categories[position])
+        return designation, description, category if category >= 0 else None
+
+    def items(self):
+        """Tous les éléments dans l'ordre du segment (fusion)"""
+        for position in range(len(self)):
+            yield self.item(position)
+
+
+class CatalogIndex:
+    """Index IVF d'un type de vecteurs (``image`` ou ``text``)"""
+
+    def __init__(self, directory, mmap_mode="r"):
+        self.directory = Path(directory)
+        self.manifest = json.loads((self.directory / MANIFEST).read_text(encoding="utf-8"))
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Version d'index de catalogue non prise en charge : {self.manifest.get('format')}")
+        self.kind = self.manifest["kind"]
+        self.input_dim = self.manifest["input_dim"]
+        self.centroids = np.load(self.directory / "centroids.npy")
+        self.projection = np.load(self.directory / "projection.npy", mmap_mode=mmap_mode) \
+            if self.manifest["projected"] else None
+        self.segments = [Segment(self.directory / name, mmap_mode) for name in self.manifest["segments"]]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def embed(self, vectors):
+        """Vecteurs d'entrée (denses ou creux, ``input_dim`` colonnes) → vecteurs normalisés de l'index"""
+        if self.projection is not None:
+            vectors = vectors @ self.projection
+        if hasattr(vectors, "toarray"):
+            vectors = vectors.toarray()
+        return _normalize(vectors)
+
+    def embed_row(self, indices, data):
+        """Ligne creuse (indices, valeurs) → vecteur de l'index, sans matrice intermédiaire"""
+        indices = np.asarray(indices, dtype=np.intp)
+        data = np.asarray(data, dtype=np.float32)
+        if self.projection is not None:
+            vector = data @ np.asarray(self.projection[indices], dtype=np.float32)
+        else:
+            vector = np.zeros(self.input_dim, dtype=np.float32)
+            vector[indices] = data
+        return _normalize(vector)
+
+    def search(self, query, k=5, nprobe=NPROBE, category=None):
+        """Les k annonces les plus proches d'un vecteur déjà normalisé (``embed``)"""
+        lists = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        scores, owners, positions = [], [], []
+        for i, segment in enumerate(self.segments):
+            found, position = segment.scan(lists, query, category)
+            scores.append(found)
+            positions.append(position)
+            owners.append(np.full(len(found), i))
+        scores = np.concatenate(scores)
+        if not len(scores):
+            return []
+        owners, positions = np.concatenate(owners), np.concatenate(positions)
+        best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [CatalogMatch(float(scores[i]), *self.segments[owners[i]].item(positions[i])) for i in best]
+
+
+def _write_manifest(directory, manifest):
+    tmp = directory / f".{MANIFEST}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, directory / MANIFEST)
+
+
+def _spool_batches(batches, spool, projection):
+    for vectors, texts, categories in batches:
+        if projection is not None:
+            vectors = vectors @ projection
+        if hasattr(vectors, "toarray"):
+            vectors = vectors.toarray()
+        spool.add(_normalize(vectors), texts, categories)
+
+
+def build_index(directory, kind, batches, input_dim, dim=DEFAULT_DIM, n_lists=None, dtype="float32", seed=0):
+    """Construire un index à partir de lots (vecteurs, [(désignation, description)], catégories).
+
+    ``dim`` = 0 : pas de projection. Écriture dans un dossier temporaire puis
+    renommage : un index existant reste lisible jusqu'au remplacement.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Type d'index inconnu : {kind}")
+    if dtype not in DTYPES:
+        raise ValueError(f"Type de vecteurs non pris en charge : {dtype}")
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{directory.name}.", dir=directory.parent))
+    try:
+        projected = bool(dim) and dim < input_dim
+        projection = random_projection(input_dim, dim, seed) if projected else None
+        spool = _Spool(tmp, dim if projected else input_dim)
+        _spool_batches(batches, spool, projection)
+        vectors, texts, offsets, categories = spool.finish()
+        if not len(vectors):
+            raise ValueError("Catalogue vide")
+        centroids = train_centroids(vectors, n_lists or default_lists(len(vectors)), seed=seed)
+        _write_segment(tmp / "seg-00000", vectors, texts, offsets, categories, centroids, dtype)
+        del vectors, texts
+        for name in ("vectors.f32", "texts.bin"):
+            (tmp / name).unlink()
+        np.save(tmp / "centroids.npy", centroids)
+        if projected:
+            np.save(tmp / "projection.npy", projection)
+        _write_manifest(tmp, {
+            "format": FORMAT_VERSION,
+            "kind": kind,
+            "input_dim": int(input_dim),
+            "dim": int(centroids.shape[1]),
+            "projected": projected,
+            "n_lists": int(len(centroids)),
+            "dtype": dtype,
+            "seed": seed,
+            "segments": ["seg-00000"],
+            "next_segment": 1,
+            "items": int(len(categories)),
+        })
+        if directory.exists():
+            old = directory.with_name(f".{directory.name}.old")
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(directory, old)
+            os.replace(tmp, directory)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return directory
+
+
+def append_index(directory, batches, max_segments=MAX_SEGMENTS):
+    """Ajouter des annonces dans un nouveau segment (centroïdes inchangés), puis fusionner si besoin"""
+    directory = Path(directory)
+    index = CatalogIndex(directory)
+    manifest = dict(index.manifest)
+    name = f"seg-{manifest['next_segment']:05d}"
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        spool = _Spool(tmp, index.centroids.shape[1])
+        _spool_batches(batches, spool, None if index.projection is None else np.asarray(index.projection))
+        vectors, texts, offsets, categories = spool.finish()
+        if not len(vectors):
+            return 0
+        _write_segment(directory / name, vectors, texts, offsets, categories, index.centroids, manifest["dtype"])
+        del vectors, texts
+    manifest.update(segments=manifest["segments"] + [name], next_segment=manifest["next_segment"] + 1,
+                    items=manifest["items"] + len(categories))
+    _write_manifest(directory, manifest)
+    if len(manifest["segments"]) > max_segments:
+        merge_segments(directory)
+    return len(categories)
+
+
+def merge_segments(directory):
+    """Fusionner tous les segments en un seul (les anciens sont supprimés après bascule du manifeste)"""
+    directory = Path(directory)
+    index = CatalogIndex(directory)
+    manifest = dict(index.manifest)
+    name = f"seg-{manifest['next_segment']:05d}"
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        spool = _Spool(tmp, index.centroids.shape[1])
+        for segment in index.segments:
+            for start in range(0, len(segment), ASSIGN_CHUNK):
+                stop = min(start + ASSIGN_CHUNK, len(segment))
+                items = [segment.item(position) for position in range(start, stop)]
+                spool.add(np.asarray(segment.vectors[start:stop], dtype=np.float32),
+                          [(designation, description) for designation, description, _ in items],
+                          [-1 if category is None else category for _, _, category in items])
+        vectors, texts, offsets, categories = spool.finish()
+        _write_segment(directory / name, vectors, texts, offsets, categories, index.centroids, manifest["dtype"])
+        del vectors, texts
+    old = manifest["segments"]
+    manifest.update(segments=[name], next_segment=manifest["next_segment"] + 1)
+    _write_manifest(directory, manifest)
+    del index
+    for segment in old:
+        shutil.rmtree(directory / segment, ignore_errors=True)
+
+
+def query_latency(index, queries=200, k=5, nprobe=NPROBE, seed=0):
+    """Latence de recherche (ms, médiane et p95) sur des vecteurs tirés de l'index"""
+    rng = np.random.default_rng(seed)
+    segments = [segment for segment in index.segments if len(segment)]
+    timings = []
+    for _ in range(queries):
+        segment = segments[rng.integers(len(segments))]
+        query = np.asarray(segment.vectors[rng.integers(len(segment))], dtype=np.float32)
+        start = time.perf_counter()
+        index.search(query, k, nprobe)
+        timings.append(time.perf_counter() - start)
+    return {"query_p50_ms": float(np.percentile(timings, 50) * 1e3),
+            "query_p95_ms": float(np.percentile(timings, 95) * 1e3)}
+
+
+def listing_batches(frames, kind, label_column="category", image_column="image", image_root=".",
+                    batch_size=64):
+    """Lots (vecteurs, textes, catégories) d'annonces : lignes TF-IDF ou plongements d'images.
+
+    Les annonces sans image (type ``image``) ou dont la photo est illisible
+    sont ignorées.
+    """
+    from .engine import build_text, get_engine
+    from .evaluation import label_categories
+
+    featurizer = get_engine().featurizer if kind == "text" else None
+    classifier = None
+    for frame in frames:
+        frame = frame.fillna("")
+        labels = frame[label_column].tolist() if label_column in frame else [""] * len(frame)
+        categories = label_categories(labels)
+        texts = list(zip(frame.get("designation", [""] * len(frame)), frame.get("description", [""] * len(frame))))
+        texts = [(str(designation), str(description)) for designation, description in texts]
+        if kind == "text":
+            yield featurizer.transform([build_text(*text) for text in texts]), texts, categories
+            continue
+
+        from .imaging import prepare_image
+        from .vision import get_image_classifier
+
+        classifier = classifier or get_image_classifier()
+        paths = frame[image_column].tolist() if image_column in frame else []
+        for start in range(0, len(paths), batch_size):
+            arrays, kept = [], []
+            for i in range(start, min(start + batch_size, len(paths))):
+                if not paths[i]:
+                    continue
+                try:
+                    arrays.append(prepare_image((Path(image_root) / paths[i]).read_bytes()).array)
+                except (OSError, ValueError) as error:
+                    logger.warning("Image ignorée (%s) : %s", paths[i], error)
+                    continue
+                kept.append(i)
+            if kept:
+                embeddings, _ = classifier.forward(np.stack(arrays))
+                yield embeddings, [texts[i] for i in kept], categories[kept]
+
+
+def input_dim(kind):
+    """Dimension des vecteurs d'entrée du type d'index, pour le modèle servi"""
+    if kind == "text":
+        from .engine import get_engine
+
+        return get_engine().featurizer.transform([""]).shape[1]
+    from .vision import get_image_classifier
+
+    return get_image_classifier().forward(np.zeros((1, 3, 224, 224), dtype=np.float32))[0].shape[1]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_catalog(kind, root=None):
+    """Index du processus pour un type (None si absent) ; rechargé quand le manifeste change"""
+    root = root or CATALOG_PATH
+    if not root:
+        return None
+    path = Path(root) / kind / MANIFEST
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    cached = _indexes.get(kind)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _indexes_lock:
+        cached = _indexes.get(kind)
+        if cached is None or cached[0] != mtime:
+            start = time.perf_counter()
+            cached = (mtime, CatalogIndex(path.parent))
+            _indexes[kind] = cached
+            logger.info("Index de catalogue %s chargé : %d annonces en %.1f ms", kind, len(cached[1]),
+                        (time.perf_counter() - start) * 1e3)
+    return cached[1]
+
+
+def similar_listings(features=None, designation="", description="", k=5, category=None):
+    """Annonces du catalogue proches d'un plongement d'image, sinon du texte saisi"""
+    from . import metrics
+
+    with metrics.stage("catalog_search"):
+        index = get_catalog("image")
+        if features is not None and index is not None and len(features) == index.input_dim:
+            return index.search(index.embed(np.asarray(features, dtype=np.float32)), k, category=category)
+
+        index = get_catalog("text")
+        if index is None or not (designation or description):
+            return []
+        from .engine import build_text, get_engine
+
+        featurizer = get_engine().featurizer
+        indices, data = featurizer.row(build_text(designation, description))
+        if not len(indices) or indices.max() >= index.input_dim:
+            return []
+        return index.search(index.embed_row(indices, data), k, category=category)
@@ -0,0 +1,57 @@
+"""Catégories Rakuten et correspondance avec les libellés du modèle entraîné"""
+import unicodedata
+
+# Catégories Rakuten avec icônes
+CATEGORIES = {
+    0: "Livre",
+    1: "Musique, CD/DVD, Blu-Ray",
+    2: "Jeux vidéo, Console",
+    3: "Téléphonie, Tablette",
+    4: "Informatique, Logiciel",
+    5: "TV, Image et Son",
+    6: "Maison",
+    7: "Électroménager",
+    8: "Alimentation, Boisson",
+    9: "Brico, Jardin, Animalerie",
+    10: "Sport, Loisirs",
+    11: "Mode",
+    12: "Beauté",
+    13: "Jouet, Enfant, Puériculture"
+}
+
+# Icônes correspondantes pour chaque catégorie
+CATEGORY_ICONS = {
+    0: "📚",  # Livre
+    1: "🎵",  # Musique, CD/DVD, Blu-Ray
+    2: "🎮",  # Jeux vidéo, Console
+    3: "📱",  # Téléphonie, Tablette
+    4: "💻",  # Informatique, Logiciel
+    5: "📺",  # TV, Image et Son
+    6: "🏠",  # Maison
+    7: "🔌",  # Électroménager
+    8: "🍕",  # Alimentation, Boisson
+    9: "🔨",  # Brico, Jardin, Animalerie
+    10: "⚽", # Sport, Loisirs
+    11: "👕", # Mode
+    12: "💄", # Beauté
+    13: "🧸"  # Jouet, Enfant, Puériculture
+}
+
+CATEGORY_INDEX = {name: idx for idx, name in CATEGORIES.items()}
+
+# Libellés du modèle entraîné qui diffèrent de CATEGORIES (fautes de frappe, libellés tronqués)
+MODEL_LABEL_ALIASES = {
+    "Brico, Jardin, Aimalerie": "Brico, Jardin, Animalerie",
+    "Musique, CD": "Musique, CD/DVD, Blu-Ray",
+}
+
+
+def display_label(model_label):
+    """Libellé affichable pour une classe du modèle (espaces insécables, alias)"""
+    label = unicodedata.normalize("NFKC", str(model_label)).strip()
+    return MODEL_LABEL_ALIASES.get(label, label)
+
+
+def category_index(model_label):
+    """Index dans CATEGORIES d'une classe du modèle, ou None si elle n'y figure pas"""
+    return CATEGORY_INDEX.get(display_label(model_label))
@@ -0,0 +1,431 @@
+"""Ligne de commande : ``python -m rakuten_classifier <commande>``.
+
+- ``classify`` : classer un fichier JSONL, CSV ou Parquet avec un pool de
+  processus (un morceau de lignes par tâche, écriture dans l'ordre d'entrée) ;
+- ``cascade-report`` : calibrer la cascade texte → image sur un jeu annoté ;
+- ``feedback`` : statistiques, export ou compaction des corrections ;
+- ``export-compact`` : écrire les artefacts au format compact et vérifier la
+  parité des prédictions avec les pickles ;
+- ``evaluate`` : F1, matrice de confusion et débit sur un CSV annoté au
+  format du challenge Rakuten ;
+- ``benchmark`` : banc de performance de chaque étape, comparé à une référence ;
+- ``compress-report`` : comparer taille, chargement, latence et F1 de
+  plusieurs niveaux d'élagage et de quantification ;
+- ``catalog-build`` / ``catalog-append`` : construire ou compléter l'index de
+  plus proches voisins du catalogue (suggestions d'annonce) ;
+- ``warmup`` : chauffer les modèles et rapporter l'écart de latence entre
+  premier appel et régime établi ;
+- ``loadtest`` : banc de charge de l'application (sessions simultanées,
+  latences des réexécutions, débit, CPU et mémoire du serveur) ;
+- ``app`` : lancer l'application Streamlit après avoir démarré la chauffe et
+  la sonde ``/ready`` dans son processus ;
+- ``serve`` : lancer le point d'entrée HTTP local.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from .batch import CHUNK_SIZE, classify_frame, map_chunks, read_chunks
+
+logger = logging.getLogger(__name__)
+
+
+def file_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if suffix in (".parquet", ".pq"):
+        return "parquet"
+    return "csv"
+
+
+def iter_frames(path, chunksize):
+    """Morceaux (DataFrame) d'un fichier d'annonces"""
+    fmt = file_format(path)
+    if fmt == "jsonl":
+        with pd.read_json(path, lines=True, chunksize=chunksize, dtype=False) as reader:
+            yield from reader
+    else:
+        with open(path, "rb") as handle:
+            for frame, _ in read_chunks(handle, fmt, chunksize):
+                yield frame
+
+
+def write_frame(frame, handle, fmt, first):
+    if fmt == "jsonl":
+        # to_json(lines=True) termine déjà par un saut de ligne
+        frame.to_json(handle, orient="records", lines=True, force_ascii=False)
+    else:
+        frame.to_csv(handle, header=first, index=False)
+
+
+def _classify_chunk(task):
+    from .engine import get_engine
+
+    frame, top_k = task
+    return classify_frame(get_engine(), frame, top_k)
+
+
+def classify_path(source, destination, workers=1, chunksize=CHUNK_SIZE, top_k=3):
+    """Classer un fichier ; au plus 2 × workers morceaux en mémoire à la fois"""
+    out_fmt = file_format(destination)
+    if out_fmt == "parquet":
+        raise ValueError("Sortie JSONL ou CSV attendue")
+
+    rows = 0
+    start = time.perf_counter()
+    with open(destination, "w", encoding="utf-8", newline="") as output:
+        def write(result):
+            nonlocal rows
+            write_frame(result, output, out_fmt, rows == 0)
+            rows += len(result)
+
+        tasks = ((frame, top_k) for frame in iter_frames(source, chunksize))
+        for result in map_chunks(_classify_chunk, tasks, workers):
+            write(result)
+
+    elapsed = time.perf_counter() - start
+    return {"rows": rows, "seconds": elapsed, "rows_per_second": rows / elapsed if elapsed else 0.0}
+
+
+def _classify(args):
+    stats = classify_path(args.input, args.output, args.workers, args.chunk_size, args.top_k)
+    print(json.dumps(stats), file=sys.stderr)
+
+
+def _cascade_report(args):
+    from .cascade import FUSION_PATH, cascade_report
+
+    parameters, report = cascade_report(iter_frames(args.input, args.chunk_size), args.precision,
+                                        image_root=args.image_root, label_column=args.label_column,
+                                        image_column=args.image_column)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.save:
+        parameters.save(FUSION_PATH)
+        logger.info("Paramètres de la cascade écrits dans %s", FUSION_PATH)
+
+
+def _feedback(args):
+    from .feedback import FEEDBACK_PATH, FeedbackStore
+
+    store = FeedbackStore(args.database or FEEDBACK_PATH)
+    try:
+        if args.action == "export":
+            if not args.output:
+                raise SystemExit("feedback export : --output requis")
+            rows = store.export(args.output, since=args.since)
+            print(json.dumps({"rows": rows, "output": args.output}))
+        elif args.action == "compact":
+            print(json.dumps({"removed": store.compact(), "remaining": store.count()}))
+        else:
+            print(json.dumps({"corrections": store.count(), "database": str(store.path)}))
+    finally:
+        store.close()
+
+
+def _export_compact(args):
+    from .compact import directory_size, export_compact, sample_texts, verify_compact
+    from .registry import ModelRegistry
+
+    registry = ModelRegistry(mmap_mode=None, compact_path=None)
+    start = time.perf_counter()
+    bundle = registry.get()
+    pickle_seconds = time.perf_counter() - start
+    export_compact(bundle.vectorizer, bundle.model, args.output, dtype=args.dtype, prune=args.prune,
+                   max_trees=args.max_trees)
+
+    report = verify_compact(args.output, bundle.vectorizer, bundle.model,
+                            sample_texts(bundle.vectorizer, args.verify_rows), tolerance=args.tolerance)
+    report.update(
+        output=args.output,
+        compact_bytes=directory_size(args.output),
+        pickle_bytes=sum(os.path.getsize(path) for path in registry.paths),
+        pickle_load_ms=pickle_seconds * 1e3,
+    )
+    print(json.dumps(report, indent=2))
+    if not report["within_tolerance"]:
+        raise SystemExit(f"Écart de prédiction {report['max_abs_difference']:.3g} > {args.tolerance}")
+
+
+def _evaluate(args):
+    from .evaluation import evaluate_path, load_mapping
+
+    mapping = load_mapping(args.mapping) if args.mapping else None
+    result = evaluate_path(args.input, args.workers, args.chunk_size, mapping, args.limit)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        summary = {key: result[key] for key in ("rows", "unmapped_rows", "accuracy", "weighted_f1", "macro_f1",
+                                                "rows_per_second")}
+        print(json.dumps(summary), file=sys.stderr)
+    else:
+        print(text)
+
+
+def _benchmark(args):
+    from .benchmark import compare, environment_differences, format_comparison, run_benchmarks
+
+    report = run_benchmarks(args.stages, args.repeat, args.random_weights)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n", encoding="utf-8")
+        logger.info("Référence enregistrée dans %s", args.save_baseline)
+    if not args.baseline:
+        if not args.output:
+            print(text)
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    rows = compare(report, baseline, args.tolerance)
+    for key, values in environment_differences(report, baseline).items():
+        logger.warning("Environnement différent de la référence (%s) : %s → %s", key, values["baseline"],
+                       values["current"])
+    print(format_comparison(rows))
+    regressions = [row["name"] for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"Régressions (> {args.tolerance:.0%}) : {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _compress_report(args):
+    from .compression import compression_report, format_report
+    from .registry import ModelRegistry
+
+    registry = ModelRegistry(compact_path=None)
+    texts = targets = None
+    if args.labels:
+        from .compression import labeled_texts
+        from .engine import TextEngine
+
+        engine = TextEngine(registry.get(), cache_dir=None)
+        texts, targets = labeled_texts(iter_frames(args.labels, args.chunk_size), engine, args.label_column)
+        if not len(targets):
+            raise SystemExit(f"Aucune ligne de {args.labels} n'a de catégorie connue du modèle")
+
+    model = registry.get().model
+    from .compression import operating_points
+
+    points = operating_points(model, args.dtypes, args.prune, args.max_trees)
+    rows = compression_report(registry.vectorizer_path, registry.model_path, points, texts, targets,
+                              sample_rows=args.sample_rows)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_report(rows))
+
+
+def _catalog(args):
+    from .catalog import CatalogIndex, append_index, build_index, input_dim, listing_batches, query_latency
+
+    building = args.command == "catalog-build"
+    kind = args.kind if building else CatalogIndex(args.index).kind
+    start = time.perf_counter()
+    batches = listing_batches(iter_frames(args.input, args.chunk_size), kind, args.label_column, args.image_column,
+                              args.image_root)
+    if building:
+        directory = build_index(args.output, kind, batches, input_dim(kind), args.dim, args.lists, args.dtype)
+    else:
+        directory = args.index
+        append_index(directory, batches, args.max_segments)
+    seconds = time.perf_counter() - start
+
+    index = CatalogIndex(directory)
+    print(json.dumps({
+        "index": str(directory),
+        "kind": index.kind,
+        "items": len(index),
+        "lists": len(index.centroids),
+        "segments": len(index.segments),
+        "seconds": seconds,
+        **query_latency(index),
+    }, indent=2))
+
+
+def _warmup(args):
+    from .warmup import run_warmup
+
+    report = run_warmup(args.rounds, not args.no_image)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["state"] == "ready" else 1
+
+
+def _loadtest(args):
+    from .loadtest import format_report, run_load_test
+
+    report = run_load_test(args.sessions, args.duration, args.url, args.pid, args.port, args.images,
+                           random_weights=args.random_weights)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(format_report(report))
+    for level in report["levels"]:
+        if level["errors"]:
+            logger.warning("%d session(s) : %d erreur(s), dernière : %s", level["sessions"], level["errors"],
+                           level["last_error"])
+    return 0
+
+
+def _app(args):
+    from streamlit.web import bootstrap
+
+    from . import warmup
+
+    # Même processus que les sessions : modèles chargés et chemins chauffés avant la première visite
+    warmup.start_in_background(args.ready_port)
+    flags = {"server_port": args.port, "server_address": args.address}
+    bootstrap.load_config_options(flags)
+    bootstrap.run(str(Path(__file__).resolve().parent.parent / "app.py"), False, [], flags)
+
+
+def _serve(args):
+    from .server import serve
+
+    serve(args.host, args.port)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m rakuten_classifier",
+                                     description="Classification de produits Rakuten")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify = subparsers.add_parser("classify", help="classer un fichier JSONL, CSV ou Parquet")
+    classify.add_argument("input", help="fichier d'annonces (designation / description)")
+    classify.add_argument("-o", "--output", required=True, help="fichier de sortie (.jsonl ou .csv)")
+    classify.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    classify.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    classify.add_argument("--top-k", type=int, default=3)
+    classify.set_defaults(func=_classify)
+
+    report = subparsers.add_parser("cascade-report",
+                                   help="calibrer la cascade texte → image sur un jeu annoté")
+    report.add_argument("input", help="fichier annoté (designation, description, image, category)")
+    report.add_argument("--image-root", default=".", help="dossier des chemins d'images")
+    report.add_argument("--image-column", default="image")
+    report.add_argument("--label-column", default="category")
+    report.add_argument("--precision", type=float, default=0.9,
+                        help="précision visée pour les annonces classées par le texte seul")
+    report.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    report.add_argument("--save", action="store_true", help="écrire les paramètres dans RAKUTEN_FUSION_PATH")
+    report.set_defaults(func=_cascade_report)
+
+    feedback = subparsers.add_parser("feedback", help="exporter ou compacter les corrections enregistrées")
+    feedback.add_argument("action", choices=("stats", "export", "compact"))
+    feedback.add_argument("-o", "--output", help="fichier d'export (.csv ou .parquet)")
+    feedback.add_argument("--since", type=float, help="horodatage Unix minimal des corrections exportées")
+    feedback.add_argument("--database", help="base SQLite (défaut : RAKUTEN_FEEDBACK_PATH)")
+    feedback.set_defaults(func=_feedback)
+
+    compact = subparsers.add_parser("export-compact", help="exporter les artefacts au format compact")
+    compact.add_argument("output", help="dossier de sortie (remplacé de façon atomique)")
+    compact.add_argument("--dtype", choices=("float64", "float32", "float16", "int8"), default="float32",
+                         help="type des coefficients / probabilités des feuilles (float64 : parité exacte)")
+    compact.add_argument("--prune", type=float, default=0.0,
+                         help="coefficients de valeur absolue inférieure mis à zéro (régression logistique)")
+    compact.add_argument("--max-trees", type=int, help="arbres conservés (forêt)")
+    compact.add_argument("--verify-rows", type=int, default=1000, help="textes de vérification de la parité")
+    compact.add_argument("--tolerance", type=float, default=1e-3, help="écart maximal accepté des probabilités")
+    compact.set_defaults(func=_export_compact)
+
+    evaluate = subparsers.add_parser("evaluate", help="évaluer le modèle sur un CSV annoté (format Rakuten)")
+    evaluate.add_argument("input", help="CSV avec designation, description et prdtypecode (ou category)")
+    evaluate.add_argument("-o", "--output", help="fichier JSON des résultats (défaut : sortie standard)")
+    evaluate.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    evaluate.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    evaluate.add_argument("--mapping", help='JSON {"prdtypecode": "catégorie"} remplaçant la correspondance par défaut')
+    evaluate.add_argument("--limit", type=int, help="nombre maximal de lignes lues")
+    evaluate.set_defaults(func=_evaluate)
+
+    bench = subparsers.add_parser("benchmark", help="mesurer chaque étape et comparer à une référence")
+    bench.add_argument("-o", "--output", help="fichier JSON des résultats")
+    bench.add_argument("--baseline", help="résultats de référence (JSON) à comparer")
+    bench.add_argument("--save-baseline", help="enregistrer ces résultats comme référence")
+    bench.add_argument("--tolerance", type=float, default=0.25, help="ralentissement toléré de la médiane")
+    bench.add_argument("--stages", nargs="+", choices=("text", "image", "app"), default=["text", "image", "app"])
+    bench.add_argument("--repeat", type=int, default=30)
+    bench.add_argument("--random-weights", action="store_true",
+                       help="poids image aléatoires (même latence, sans téléchargement)")
+    bench.set_defaults(func=_benchmark)
+
+    compress = subparsers.add_parser("compress-report",
+                                     help="mesurer élagage et quantification (taille, latence, F1)")
+    compress.add_argument("--labels", help="jeu annoté (designation, description, category) ; "
+                                           "sinon fidélité au modèle d'origine sur des textes tirés")
+    compress.add_argument("--label-column", default="category")
+    compress.add_argument("--dtypes", nargs="+", choices=("float64", "float32", "float16", "int8"),
+                          default=["float64", "float32", "float16", "int8"])
+    compress.add_argument("--prune", nargs="+", type=float, default=[0.0],
+                          help="seuils d'élagage des coefficients (régression logistique)")
+    compress.add_argument("--max-trees", nargs="+", type=int, default=[None],
+                          help="nombres d'arbres conservés (forêt)")
+    compress.add_argument("--sample-rows", type=int, default=2000)
+    compress.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    compress.add_argument("--json", action="store_true", help="sortie JSON")
+    compress.set_defaults(func=_compress_report)
+
+    for name in ("catalog-build", "catalog-append"):
+        building = name == "catalog-build"
+        catalog = subparsers.add_parser(name, help="construire l'index de plus proches voisins du catalogue"
+                                        if building else "ajouter des annonces à l'index du catalogue")
+        catalog.add_argument("input", help="fichier d'annonces (designation / description, image, catégorie)")
+        if building:
+            catalog.add_argument("-o", "--output", required=True, help="dossier de l'index (ex. catalog/image)")
+            catalog.add_argument("--kind", choices=("image", "text"), default="image")
+            catalog.add_argument("--dim", type=int, default=128, help="dimension après projection (0 : aucune)")
+            catalog.add_argument("--lists", type=int, default=None, help="nombre de listes IVF (défaut : 4 √n)")
+            catalog.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+        else:
+            catalog.add_argument("--index", required=True, help="dossier de l'index existant")
+            catalog.add_argument("--max-segments", type=int, default=8)
+        catalog.add_argument("--image-root", default=".")
+        catalog.add_argument("--image-column", default="image")
+        catalog.add_argument("--label-column", default="category")
+        catalog.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        catalog.set_defaults(func=_catalog)
+
+    warm = subparsers.add_parser("warmup",
+                                 help="chauffer les modèles et mesurer l'écart premier appel / régime établi")
+    warm.add_argument("--rounds", type=int, default=20, help="appels de régime établi par chemin")
+    warm.add_argument("--no-image", action="store_true", help="ne pas chauffer le modèle image")
+    warm.set_defaults(func=_warmup)
+
+    load = subparsers.add_parser("loadtest", help="simuler des sessions simultanées sur l'application")
+    load.add_argument("--sessions", nargs="+", type=int, default=[1, 2, 4, 8, 16],
+                      help="paliers de concurrence (sessions simultanées)")
+    load.add_argument("--duration", type=float, default=30.0, help="durée de chaque palier (secondes)")
+    load.add_argument("--url", help="application déjà lancée (ex. http://127.0.0.1:8501)")
+    load.add_argument("--pid", type=int, help="processus de l'application déjà lancée (CPU, mémoire)")
+    load.add_argument("--port", type=int, default=8599, help="port de l'application lancée par le banc")
+    load.add_argument("--images", type=int, default=12, help="photos synthétiques distinctes")
+    load.add_argument("--random-weights", action="store_true",
+                      help="poids image aléatoires pour l'application lancée par le banc (hors ligne)")
+    load.add_argument("-o", "--output", help="fichier JSON des résultats")
+    load.set_defaults(func=_loadtest)
+
+    app = subparsers.add_parser("app", help="lancer l'application Streamlit, chauffée dès le démarrage")
+    app.add_argument("--address", default=None, help="adresse d'écoute (défaut : celle de Streamlit)")
+    app.add_argument("--port", type=int, default=8501)
+    app.add_argument("--ready-port", type=int, default=8502, help="port de la sonde /ready (0 : aucune)")
+    app.set_defaults(func=_app)
+
+    serve = subparsers.add_parser("serve", help="lancer le point d'entrée HTTP local")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.set_defaults(func=_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return args.func(args) or 0
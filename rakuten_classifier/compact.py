@@ -0,0 +1,475 @@
+"""Format de service compact pour le vectoriseur TF-IDF et le modèle.
+
+Les pickles scikit-learn sont lents à désérialiser, dangereux à charger
+depuis une source non fiable et gardent le vocabulaire dans un ``dict``
+Python. Le format compact est un dossier de tableaux ``.npy`` projetables en
+mémoire et d'un ``manifest.json`` :
+
+- ``terms.npy`` : termes du vocabulaire encodés en UTF-8, triés (octets de
+  largeur fixe), et ``columns.npy`` leur colonne TF-IDF ; la recherche des
+  jetons d'un texte se fait en un seul ``np.searchsorted`` ;
+- ``idf.npy`` : vecteur IDF ;
+- régression logistique : ``coef.npy`` / ``intercept.npy`` ;
+- forêt : les tableaux aplatis du noyau ``ForestKernel`` (index int32,
+  seuils float64, probabilités des feuilles au type choisi).
+
+Le chargement ne désérialise aucun objet Python ni n'importe scikit-learn :
+quelques millisecondes quelle que soit la taille. ``float64`` reproduit
+exactement les probabilités des pickles ; ``float32`` / ``float16`` réduisent
+la taille avec un écart borné, vérifié par ``verify_compact``.
+
+Options de compression (``rakuten_classifier.compression`` en mesure l'effet) :
+
+- seules les colonnes réellement lues par le modèle sont conservées
+  (``model_columns.npy`` : colonne TF-IDF → colonne du modèle, -1 si aucune
+  classe ne l'utilise) ; la normalisation L2 porte toujours sur tout le
+  vocabulaire, les probabilités ne changent pas ;
+- ``prune`` : coefficients de valeur absolue inférieure au seuil mis à zéro,
+  matrice stockée en CSC (``coef_data`` / ``coef_indices`` / ``coef_indptr``) ;
+- ``max_trees`` : seuls les premiers arbres de la forêt sont gardés ;
+- ``int8`` : coefficients quantifiés par classe (``coef_scale.npy``) ou
+  probabilités des feuilles sur 8 bits (pas de 1/255).
+
+Les nœuds des arbres sont renumérotés feuilles d'abord : seules les feuilles
+gardent une ligne de probabilités.
+
+    python -m rakuten_classifier export-compact model.rkc --dtype float32
+
+Le registre sert ce format si ``RAKUTEN_COMPACT_PATH`` désigne un tel dossier.
+"""
+import copy
+import json
+import os
+import re
+import shutil
+import time
+import unicodedata
+import uuid
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+from .engine import SMALL_BATCH_ROWS, ForestKernel, LinearKernel, TextFeaturizer, build_text, pad_features
+
+FORMAT_VERSION = 2
+SUPPORTED_FORMATS = (1, 2)
+MANIFEST = "manifest.json"
+DTYPES = ("float64", "float32", "float16", "int8")
+# Paramètres du vectoriseur reproduits sans scikit-learn
+VECTORIZER_PARAMS = ("lowercase", "strip_accents", "token_pattern", "ngram_range", "binary",
+                     "sublinear_tf", "norm", "use_idf")
+
+
+def _check_vectorizer(vectorizer):
+    params = vectorizer.get_params()
+    unsupported = [name for name, value in (("analyzer", params["analyzer"] != "word"),
+                                            ("preprocessor", params["preprocessor"] is not None),
+                                            ("tokenizer", params["tokenizer"] is not None)) if value]
+    if unsupported:
+        raise ValueError(f"Format compact : paramètres non pris en charge ({', '.join(unsupported)})")
+
+
+def _model_columns(used, n_terms):
+    """Colonne TF-IDF → colonne du modèle (-1 : inutilisée), dans l'ordre"""
+    used = np.unique(used[used < n_terms])
+    columns = np.full(n_terms, -1, dtype=np.int32)
+    columns[used] = np.arange(len(used), dtype=np.int32)
+    return columns, len(used)
+
+
+def _linear_arrays(model, n_terms, dtype, prune):
+    coef = np.array(model.coef_, dtype=np.float64)[:, :n_terms]
+    if prune:
+        coef[np.abs(coef) < prune] = 0.0
+    model_columns, n_features = _model_columns(np.flatnonzero(np.any(coef != 0.0, axis=0)), n_terms)
+    coef = coef[:, model_columns >= 0]
+
+    arrays = {"model_columns": model_columns, "intercept": np.asarray(model.intercept_, dtype=np.float64)}
+    if dtype == "int8":
+        # Quantification symétrique par classe : coef ≈ q × échelle
+        scale = np.abs(coef).max(axis=1) / 127.0
+        scale[scale == 0.0] = 1.0
+        coef = np.rint(coef / scale[:, np.newaxis]).astype(np.int8)
+        arrays["coef_scale"] = scale
+    else:
+        coef = coef.astype(dtype)
+    if prune:
+        # Colonnes compressées : coefficients d'un attribut contigus (chemin ligne par ligne)
+        matrix = sp.csc_matrix(coef)
+        matrix.eliminate_zeros()
+        arrays.update(coef_data=matrix.data, coef_indices=matrix.indices.astype(np.int32),
+                      coef_indptr=matrix.indptr.astype(np.int32))
+    else:
+        arrays["coef"] = coef
+    return arrays, n_features
+
+
+def _forest_arrays(model, n_terms, dtype, max_trees):
+    if max_trees and max_trees < len(model.estimators_):
+        model = copy.copy(model)
+        model.estimators_ = model.estimators_[:max_trees]
+    forest = ForestKernel.compile(model)
+    feature, threshold, children = forest["feature"], forest["threshold"], forest["children"]
+
+    # Feuilles d'abord : seules les feuilles gardent leurs probabilités
+    is_leaf = np.isinf(threshold)
+    order = np.concatenate([np.flatnonzero(is_leaf), np.flatnonzero(~is_leaf)])
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    feature, threshold = feature[order], threshold[order]
+    children = renumber[children.reshape(-1, 2)[order]].ravel()
+    value = forest["value"][is_leaf]
+    is_leaf = is_leaf[order]
+
+    # Attributs hors vocabulaire (toujours nuls) : une colonne nulle commune en fin de ligne
+    model_columns, n_features = _model_columns(feature[~is_leaf], n_terms)
+    feature = np.where(feature < n_terms, model_columns[np.minimum(feature, n_terms - 1)], n_features)
+    feature[is_leaf] = 0
+
+    arrays = {
+        "model_columns": model_columns,
+        "feature": feature.astype(np.int32),
+        "threshold": threshold,
+        "children": children.astype(np.int32),
+        "roots": renumber[forest["roots"]].astype(np.int32),
+        "depth": forest["depth"],
+    }
+    if dtype == "int8":
+        arrays["value"] = np.rint(value * 255.0).astype(np.uint8)
+        arrays["value_scale"] = np.array([1.0 / 255.0])
+    else:
+        arrays["value"] = value.astype(dtype)
+    return arrays, n_features + 1
+
+
+def export_compact(vectorizer, model, directory, dtype="float32", prune=0.0, max_trees=None):
+    """Écrire les artefacts au format compact (dossier publié par renommage atomique).
+
+    ``prune`` ne s'applique qu'à une régression logistique, ``max_trees``
+    qu'à une forêt.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Type inconnu : {dtype} ({', '.join(DTYPES)})")
+    _check_vectorizer(vectorizer)
+
+    vocabulary = sorted((term.encode("utf-8"), column) for term, column in vectorizer.vocabulary_.items())
+    n_terms = len(vocabulary)
+    arrays = {
+        "terms": np.array([term for term, _ in vocabulary], dtype=bytes),
+        "columns": np.array([column for _, column in vocabulary], dtype=np.int32),
+    }
+    if vectorizer.use_idf:
+        arrays["idf"] = np.asarray(vectorizer.idf_, dtype=np.float64)
+
+    params = vectorizer.get_params()
+    stop_words = vectorizer.get_stop_words()
+    manifest = {
+        "format": FORMAT_VERSION,
+        "dtype": dtype,
+        "vectorizer": {name: params[name] for name in VECTORIZER_PARAMS},
+        "stop_words": sorted(stop_words) if stop_words else [],
+        "n_terms": n_terms,
+        "classes": [str(label) for label in model.classes_],
+        "input_features": int(model.n_features_in_),
+        "prune": prune,
+        "max_trees": max_trees,
+    }
+
+    if LinearKernel.supports(model):
+        model_arrays, n_features = _linear_arrays(model, n_terms, dtype, prune)
+        manifest.update(kind="linear", ovr=bool(LinearKernel(model).ovr))
+    elif ForestKernel.supports(model):
+        model_arrays, n_features = _forest_arrays(model, n_terms, dtype, max_trees)
+        manifest["kind"] = "forest"
+    else:
+        raise ValueError(f"Format compact : modèle {type(model).__name__} non pris en charge")
+    arrays.update(model_arrays)
+    manifest["n_features"] = n_features
+
+    target = Path(directory)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.{uuid.uuid4().hex}")
+    tmp.mkdir(parents=True)
+    try:
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+        (tmp / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        if target.exists():
+            shutil.rmtree(target)
+        os.rename(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return target
+
+
+class CompactVectorizer:
+    """Vectoriseur TF-IDF lu depuis le format compact"""
+
+    def __init__(self, manifest, arrays):
+        params = manifest["vectorizer"]
+        self.lowercase = params["lowercase"]
+        self.strip_accents = params["strip_accents"]
+        self.token_pattern = re.compile(params["token_pattern"])
+        self.ngram_range = tuple(params["ngram_range"])
+        self.binary = params["binary"]
+        self.sublinear_tf = params["sublinear_tf"]
+        self.norm = params["norm"]
+        self.use_idf = params["use_idf"]
+        self.stop_words = frozenset(manifest["stop_words"])
+        self.terms = arrays["terms"]
+        self.columns = arrays["columns"]
+        self.idf_ = arrays.get("idf")
+        self.n_features = manifest["n_terms"]
+        # Colonnes du modèle (format 2) : sinon l'espace TF-IDF lui-même
+        self.model_columns = arrays.get("model_columns")
+        self.n_model_features = manifest["n_features"] if self.model_columns is not None else self.n_features
+
+    def build_analyzer(self):
+        """Même découpage que l'analyseur ``word`` de scikit-learn"""
+        token_pattern, stop_words = self.token_pattern, self.stop_words
+        min_n, max_n = self.ngram_range
+
+        def analyze(doc):
+            if self.lowercase:
+                doc = doc.lower()
+            if self.strip_accents == "ascii":
+                doc = unicodedata.normalize("NFKD", doc).encode("ASCII", "ignore").decode("ASCII")
+            elif self.strip_accents == "unicode":
+                normalized = unicodedata.normalize("NFKD", doc)
+                doc = "".join(c for c in normalized if not unicodedata.combining(c))
+            tokens = token_pattern.findall(doc)
+            if stop_words:
+                tokens = [w for w in tokens if w not in stop_words]
+            if max_n == 1:
+                return tokens
+            original = tokens
+            low = min_n
+            tokens = list(original) if low == 1 else []
+            low = max(low, 2)
+            for n in range(low, min(max_n + 1, len(original) + 1)):
+                for i in range(len(original) - n + 1):
+                    tokens.append(" ".join(original[i:i + n]))
+            return tokens
+
+        return analyze
+
+    def featurizer(self):
+        return CompactFeaturizer(self)
+
+
+class CompactFeaturizer(TextFeaturizer):
+    """``TextFeaturizer`` dont le vocabulaire est un tableau trié (recherche dichotomique)"""
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.analyzer = vectorizer.build_analyzer()
+        self.terms = np.asarray(vectorizer.terms)
+        self.columns = np.asarray(vectorizer.columns)
+        self.width = vectorizer.terms.dtype.itemsize
+        self.model_columns = None if vectorizer.model_columns is None else np.asarray(vectorizer.model_columns)
+        self.n_features = vectorizer.n_model_features
+        self.binary = vectorizer.binary
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.norm = vectorizer.norm
+        self.idf = np.asarray(vectorizer.idf_) if vectorizer.use_idf else None
+
+    def term_counts(self, text):
+        # Un jeton plus long que le plus long terme ne peut pas être dans le vocabulaire
+        width = self.width
+        tokens = [t for t in (token.encode("utf-8") for token in self.analyzer(text)) if len(t) <= width]
+        if not tokens or not len(self.terms):
+            return [], []
+        terms = self.terms
+        tokens = np.array(tokens, dtype=terms.dtype)
+        position = np.searchsorted(terms, tokens)
+        position[position == len(terms)] = 0
+        # Peu de jetons par texte : compter en Python coûte moins que np.unique
+        counts = {}
+        for j in self.columns[position[terms[position] == tokens]].tolist():
+            counts[j] = counts.get(j, 0) + 1
+        indices = sorted(counts)
+        return indices, [counts[j] for j in indices]
+
+    def row(self, text):
+        indices, data = super().row(text)
+        if self.model_columns is None:
+            return indices, data
+        # Normalisation faite sur tout le vocabulaire, puis colonnes inutilisées écartées
+        columns = self.model_columns[indices]
+        kept = columns >= 0
+        return columns[kept].astype(np.intp), data[kept]
+
+    def transform(self, texts):
+        rows = [self.row(text) for text in texts]
+        indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+        indptr[1:] = np.cumsum([len(indices) for indices, _ in rows])
+        indices = np.concatenate([i for i, _ in rows]) if rows else np.zeros(0, dtype=np.intp)
+        data = np.concatenate([d for _, d in rows]) if rows else np.zeros(0)
+        return sp.csr_matrix((data, indices, indptr), shape=(len(rows), self.n_features))
+
+
+class CompactLinearKernel(LinearKernel):
+    def __init__(self, manifest, arrays):
+        self.model = None
+        self.n_features = manifest["n_features"]
+        self.intercept = np.asarray(arrays["intercept"], dtype=np.float64)
+        self.scale = None if "coef_scale" not in arrays else np.asarray(arrays["coef_scale"])
+        self.ovr = manifest["ovr"]
+        self.sparse = "coef_data" in arrays
+        if self.sparse:
+            n_classes = len(manifest["classes"])
+            self.coef = sp.csc_matrix((arrays["coef_data"], arrays["coef_indices"], arrays["coef_indptr"]),
+                                      shape=(n_classes, self.n_features))
+        else:
+            self.coef = np.asarray(arrays["coef"])
+
+    def scores(self, X):
+        scores = X @ self.coef.T
+        scores = scores.toarray() if sp.issparse(scores) else np.asarray(scores)
+        scores = scores.astype(np.float64, copy=False)
+        if self.scale is not None:
+            scores = scores * self.scale
+        return scores + self.intercept
+
+    def predict_proba_row(self, indices, data):
+        if not self.sparse and self.scale is None:
+            return super().predict_proba_row(indices, data)
+        scores = np.zeros(len(self.intercept), dtype=np.float64)
+        if self.sparse:
+            coef, rows, indptr = self.coef.data, self.coef.indices, self.coef.indptr
+            for j, value in zip(indices, data):
+                start, end = indptr[j], indptr[j + 1]
+                scores[rows[start:end]] += value * coef[start:end]
+        else:
+            for j, value in zip(indices, data):
+                scores += value * self.coef[:, j]
+        if self.scale is not None:
+            scores *= self.scale
+        return self.probabilities((scores + self.intercept).reshape(1, -1))[0]
+
+    def predict_proba(self, X):
+        return self.probabilities(self.scores(pad_features(X, self.n_features)))
+
+    def probabilities(self, scores):
+        if self.ovr:
+            prob = 1.0 / (1.0 + np.exp(-scores))
+            if prob.shape[1] == 1:
+                return np.c_[1.0 - prob[:, 0], prob[:, 0]]
+            return prob / prob.sum(axis=1, keepdims=True)
+        if scores.shape[1] == 1:
+            scores = np.c_[-scores, scores]
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, scores)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+class CompactForestKernel(ForestKernel):
+    def __init__(self, manifest, arrays):
+        self.model = None
+        self.n_features = manifest["n_features"]
+        # np.asarray : vues simples sur la projection mémoire, sans le surcoût de np.memmap
+        self.feature = np.asarray(arrays["feature"])
+        self.threshold = np.asarray(arrays["threshold"])
+        self.children = np.asarray(arrays["children"])
+        self.value = np.asarray(arrays["value"])
+        self.roots = np.array(arrays["roots"])
+        self.depth = int(arrays["depth"][0])
+        self.n_trees = len(self.roots)
+        # Feuilles quantifiées sur 8 bits : probabilité = q × value_scale
+        scale = arrays.get("value_scale")
+        self.value_scale = float(scale[0]) if scale is not None else None
+
+    def _average(self, proba):
+        if self.value_scale is not None:
+            proba *= self.value_scale
+        proba /= self.n_trees
+        return proba
+
+    def predict_proba_row(self, indices, data):
+        x = np.zeros(self.n_features, dtype=np.float32)
+        x[indices] = data
+        # Somme en float64 même si les feuilles sont stockées en float32 / float16 / uint8
+        return self._average(np.add.reduce(self.value.take(self.leaves(x), axis=0), axis=0, dtype=np.float64))
+
+    def predict_proba(self, X):
+        # Pas de forêt scikit-learn : tout passe par le parcours aplati, par blocs
+        X = pad_features(X, self.n_features)
+        parts = []
+        for start in range(0, X.shape[0], SMALL_BATCH_ROWS):
+            dense = np.asarray(X[start:start + SMALL_BATCH_ROWS].toarray(), dtype=np.float32)
+            leaves = self.leaves_batch(dense)
+            parts.append(self._average(np.add.reduce(self.value.take(leaves, axis=0), axis=1, dtype=np.float64)))
+        return np.concatenate(parts) if parts else np.zeros((0, self.value.shape[1]))
+
+
+class CompactModel:
+    """Modèle lu depuis le format compact (``classes_``, ``n_features_in_``, noyau)"""
+
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.arrays = arrays
+        self.kind = manifest["kind"]
+        self.classes_ = np.array(manifest["classes"], dtype=object)
+        self.n_features_in_ = manifest["n_features"]
+
+    def build_kernel(self):
+        if self.kind == "linear":
+            return CompactLinearKernel(self.manifest, self.arrays)
+        return CompactForestKernel(self.manifest, self.arrays)
+
+
+def load_compact(directory, mmap_mode="r"):
+    """(vectoriseur, modèle) depuis un dossier au format compact"""
+    directory = Path(directory)
+    manifest = json.loads((directory / MANIFEST).read_text(encoding="utf-8"))
+    if manifest.get("format") not in SUPPORTED_FORMATS:
+        raise ValueError(f"Version de format compact non prise en charge : {manifest.get('format')}")
+    arrays = {path.stem: np.load(path, mmap_mode=mmap_mode, allow_pickle=False) for path in directory.glob("*.npy")}
+    return CompactVectorizer(manifest, arrays), CompactModel(manifest, arrays)
+
+
+def directory_size(directory):
+    return sum(path.stat().st_size for path in Path(directory).iterdir() if path.is_file())
+
+
+def verify_compact(directory, vectorizer, model, texts, tolerance=1e-6):
+    """Comparer les probabilités du format compact à celles des pickles.
+
+    ``exact`` : probabilités identiques au bit près ; ``within_tolerance`` :
+    écart maximal inférieur à ``tolerance`` ; ``argmax_agreement`` : part des
+    textes dont la classe prédite est la même.
+    """
+    from .engine import TextEngine
+    from .registry import ModelBundle
+
+    texts = list(texts)
+    start = time.perf_counter()
+    compact_vectorizer, compact_model = load_compact(directory)
+    load_seconds = time.perf_counter() - start
+
+    reference = TextEngine(ModelBundle(vectorizer, model, "pickle", 0.0, 0.0), cache_dir=None)
+    compact = TextEngine(ModelBundle(compact_vectorizer, compact_model, "compact", 0.0, 0.0), cache_dir=None)
+    expected = model.predict_proba(pad_features(vectorizer.transform(texts), model.n_features_in_))
+    single = np.array([compact.predict_proba_one(text) for text in texts])
+    batch = compact.predict_proba(texts)
+    reference_single = np.array([reference.predict_proba_one(text) for text in texts])
+
+    difference = max(float(np.abs(single - expected).max()), float(np.abs(batch - expected).max()))
+    return {
+        "rows": len(texts),
+        "dtype": compact_model.manifest["dtype"],
+        "load_ms": load_seconds * 1e3,
+        "exact": bool(np.array_equal(single, expected) and np.array_equal(batch, expected)),
+        "reference_exact": bool(np.array_equal(reference_single, expected)),
+        "max_abs_difference": difference,
+        "within_tolerance": difference <= tolerance,
+        "argmax_agreement": float((batch.argmax(axis=1) == expected.argmax(axis=1)).mean()),
+    }
+
+
+def sample_texts(vectorizer, n=1000, seed=0):
+    """Textes aléatoires formés de termes du vocabulaire (et de mots inconnus)"""
+    rng = np.random.default_rng(seed)
+    words = list(vectorizer.vocabulary_) + ["iphone", "xyz", "Été", "Livre", "bébé"]
+    return [build_text(" ".join(rng.choice(words, size=rng.integers(0, 40))), "") for _ in range(n)]
@@ -0,0 +1,148 @@
+"""Compression du modèle texte : taille, chargement, latence et F1 par point de fonctionnement.
+
+Chaque point de fonctionnement est un export au format compact
+(``rakuten_classifier.compact``) : type des poids (``float32``, ``float16``,
+``int8``), seuil d'élagage des coefficients (régression logistique) ou nombre
+d'arbres conservés (forêt). Le rapport compare chaque point aux pickles
+d'origine :
+
+- taille sur disque et temps de chargement (artefacts + construction du moteur) ;
+- latence par ligne (chemin rapide ``predict_proba_one``, médiane et p95) ;
+- F1 macro et pondéré, et leur écart avec le modèle d'origine.
+
+Sans jeu annoté, la référence est la prédiction du modèle d'origine sur des
+textes tirés du vocabulaire : le F1 mesure alors la fidélité au modèle
+d'origine (1.0 pour celui-ci).
+
+    python -m rakuten_classifier compress-report --labels valid.csv --dtypes float32 int8
+"""
+import gc
+import itertools
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .compact import directory_size, export_compact, load_compact, sample_texts
+from .engine import TextEngine, build_text
+from .registry import ModelBundle
+
+DEFAULT_DTYPES = ("float64", "float32", "float16", "int8")
+
+
+def labeled_texts(frames, engine, label_column="category"):
+    """(textes, index de classe du modèle) des lignes dont le libellé est connu du modèle"""
+    from .categories import display_label
+
+    index = {label: i for i, label in enumerate(engine.labels)}
+    texts, targets = [], []
+    for frame in frames:
+        frame = frame.fillna("")
+        for row in frame.to_dict("records"):
+            target = index.get(display_label(row.get(label_column, "")))
+            if target is not None:
+                texts.append(build_text(str(row.get("designation", "")), str(row.get("description", ""))))
+                targets.append(target)
+    return texts, np.array(targets, dtype=np.intp)
+
+
+def measure(engine, texts, targets):
+    """Latence par ligne (µs) et F1 macro / pondéré"""
+    from sklearn.metrics import f1_score
+
+    timings = np.empty(len(texts))
+    predictions = np.empty(len(texts), dtype=np.intp)
+    for i, text in enumerate(texts):
+        start = time.perf_counter()
+        proba = engine.predict_proba_one(text)
+        timings[i] = time.perf_counter() - start
+        predictions[i] = int(np.argmax(proba))
+    return {
+        "row_p50_us": float(np.percentile(timings, 50) * 1e6),
+        "row_p95_us": float(np.percentile(timings, 95) * 1e6),
+        "macro_f1": float(f1_score(targets, predictions, average="macro", zero_division=0)),
+        "weighted_f1": float(f1_score(targets, predictions, average="weighted", zero_division=0)),
+        "predictions": predictions,
+    }
+
+
+def operating_points(model, dtypes=DEFAULT_DTYPES, prune=(0.0,), max_trees=(None,)):
+    """Combinaisons pertinentes pour le type de modèle"""
+    if hasattr(model, "estimators_"):
+        return [{"dtype": dtype, "max_trees": trees} for dtype, trees in itertools.product(dtypes, max_trees)]
+    return [{"dtype": dtype, "prune": threshold} for dtype, threshold in itertools.product(dtypes, prune)]
+
+
+def _timed_engine(load):
+    gc.collect()
+    start = time.perf_counter()
+    vectorizer, model = load()
+    engine = TextEngine(ModelBundle(vectorizer, model, "report", 0.0, 0.0), cache_dir=None)
+    return engine, vectorizer, model, (time.perf_counter() - start) * 1e3
+
+
+def compression_report(vectorizer_path, model_path, points=None, texts=None, targets=None, sample_rows=2000,
+                       workdir=None):
+    """Lignes du rapport : l'original (``pickle``) puis un export par point de fonctionnement"""
+    import joblib
+
+    original, vectorizer, model, load_ms = _timed_engine(
+        lambda: (joblib.load(vectorizer_path), joblib.load(model_path)))
+    if texts is None:
+        texts = sample_texts(vectorizer, sample_rows)
+        targets = None
+    if targets is None:
+        targets = original.predict_proba(texts).argmax(axis=1)
+        reference = "original_predictions"
+    else:
+        reference = "labels"
+
+    baseline = measure(original, texts, targets)
+    rows = [{
+        "name": "pickle",
+        "reference": reference,
+        "bytes": sum(Path(path).stat().st_size for path in (vectorizer_path, model_path)),
+        "load_ms": load_ms,
+        **{key: value for key, value in baseline.items() if key != "predictions"},
+    }]
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for i, options in enumerate(points or operating_points(model)):
+            directory = Path(tmp) / f"point{i}"
+            export_compact(vectorizer, model, directory, **options)
+            compact, _, _, load_ms = _timed_engine(lambda: load_compact(directory))
+            result = measure(compact, texts, targets)
+            name = "-".join(f"{key}={value}" for key, value in options.items() if value not in (None, 0.0))
+            rows.append({
+                "name": name or "compact",
+                "reference": reference,
+                **options,
+                "bytes": directory_size(directory),
+                "load_ms": load_ms,
+                "row_p50_us": result["row_p50_us"],
+                "row_p95_us": result["row_p95_us"],
+                "macro_f1": result["macro_f1"],
+                "weighted_f1": result["weighted_f1"],
+                "macro_f1_change": result["macro_f1"] - baseline["macro_f1"],
+                "weighted_f1_change": result["weighted_f1"] - baseline["weighted_f1"],
+                "agreement": float((result["predictions"] == baseline["predictions"]).mean()),
+            })
+            del compact
+    for row in rows:
+        row["size_ratio"] = row["bytes"] / rows[0]["bytes"]
+    return rows
+
+
+def format_report(rows):
+    """Tableau texte du rapport"""
+    header = f"{'point':<28} {'taille':>10} {'ratio':>6} {'charg. ms':>9} {'p50 µs':>8} {'p95 µs':>8} " \
+             f"{'F1 macro':>9} {'Δ':>7} {'F1 pond.':>9} {'Δ':>7}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['name']:<28} {row['bytes']:>10,} {row['size_ratio']:>6.2f} {row['load_ms']:>9.1f} "
+            f"{row['row_p50_us']:>8.0f} {row['row_p95_us']:>8.0f} {row['macro_f1']:>9.4f} "
+            f"{row.get('macro_f1_change', 0.0):>+7.4f} {row['weighted_f1']:>9.4f} "
+            f"{row.get('weighted_f1_change', 0.0):>+7.4f}")
+    return "\n".join(lines)
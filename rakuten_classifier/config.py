@@ -0,0 +1,36 @@
+"""Paramètres partagés, surchargeables par variables d'environnement"""
+import os
+from pathlib import Path
+
+# Dossier contenant les artefacts (par défaut : racine du dépôt)
+ARTIFACT_DIR = Path(os.environ.get("RAKUTEN_ARTIFACT_DIR", Path(__file__).resolve().parent.parent))
+
+VECTORIZER_PATH = Path(os.environ.get("RAKUTEN_VECTORIZER_PATH", ARTIFACT_DIR / "tfidf_vectorizer.pkl"))
+MODEL_PATH = Path(os.environ.get("RAKUTEN_MODEL_PATH", ARTIFACT_DIR / "logistic_model.pkl"))
+
+# Dossier au format compact (rakuten_classifier.compact) servi à la place des pickles
+COMPACT_PATH = os.environ.get("RAKUTEN_COMPACT_PATH")
+
+# Tableaux compilés (arbres aplatis...) projetés en mémoire et partagés entre workers
+CACHE_DIR = Path(os.environ.get("RAKUTEN_CACHE_DIR", ARTIFACT_DIR / ".model_cache"))
+
+# Intervalle minimal (secondes) entre deux vérifications des fichiers sur disque
+RELOAD_CHECK_INTERVAL = float(os.environ.get("RAKUTEN_RELOAD_CHECK_INTERVAL", "2.0"))
+
+
+def env_flag(name, default=False):
+    """Lire un booléen depuis l'environnement ("1", "true", "yes", "on")"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
@@ -0,0 +1,100 @@
+"""Points d'entrée de classification, indépendants de Streamlit.
+
+Ces fonctions assemblent registre, moteur texte, classifieur image et cache de
+prédictions. L'application Streamlit, la ligne de commande et le serveur HTTP
+passent tous par elles.
+
+Les prédictions unitaires absentes du cache passent par les micro-lots
+(``microbatch``) : les requêtes concurrentes de plusieurs sessions sont
+calculées ensemble. Une image absente du cache mais proche (pHash) d'une
+image récemment analysée reprend son résultat (``duplicates``).
+"""
+from . import metrics
+from .cache import get_prediction_cache, prediction_key
+from .engine import build_text, get_engine
+from .microbatch import ENABLED as MICROBATCH_ENABLED, get_batcher
+from .registry import get_registry
+
+
+def _predict_text(designation, description):
+    if MICROBATCH_ENABLED:
+        return get_batcher("text")(build_text(designation, description))
+    return get_engine().predict(designation, description)
+
+
+def _analyze_image(array):
+    batcher = get_batcher("image")
+    if MICROBATCH_ENABLED:
+        return batcher(array)
+    # Même traitement (pool de processus ou modèle local), sans la file
+    return batcher.process([array])[0]
+
+
+def classify_text(designation, description=""):
+    """Classer une annonce par son texte (servie depuis le cache si déjà vue)"""
+    key = prediction_key("text", get_registry().get().version,
+                         designation=designation, description=description)
+    return get_prediction_cache("text").get_or_compute(
+        key, lambda: _predict_text(designation, description))
+
+
+def classify_texts(listings):
+    """Classer un lot de (désignation, description) : un seul appel vectorisé pour les absents du cache"""
+    listings = list(listings)
+    cache = get_prediction_cache("text")
+    version = get_registry().get().version
+    keys = [prediction_key("text", version, designation=d, description=s) for d, s in listings]
+
+    predictions = [cache.get(key) for key in keys]
+    missing = [i for i, prediction in enumerate(predictions) if prediction is None]
+    if missing:
+        engine = get_engine()
+        proba = engine.predict_proba([build_text(*listings[i]) for i in missing])
+        for i, row in zip(missing, proba):
+            predictions[i] = engine.prediction(row)
+            cache.put(keys[i], predictions[i])
+    return predictions
+
+
+def _analyze_near_duplicate(prepared, version):
+    from .duplicates import ENABLED, get_near_duplicate_index
+    from .imaging import perceptual_hash
+
+    if not ENABLED:
+        return _analyze_image(prepared.array)
+    phash = prepared.phash if prepared.phash is not None else perceptual_hash(prepared.array)
+    return get_near_duplicate_index().get_or_compute(phash, version, lambda: _analyze_image(prepared.array))
+
+
+def analyze_image(prepared):
+    """(Prediction, plongement) d'une image prétraitée (``PreparedImage``), servis depuis le cache si déjà vue"""
+    from .vision import MODEL_VERSION
+
+    key = prediction_key("image", MODEL_VERSION, image_digest=prepared.digest)
+    return get_prediction_cache("image").get_or_compute(
+        key, lambda: _analyze_near_duplicate(prepared, MODEL_VERSION))
+
+
+def classify_image(prepared):
+    """Classer une image prétraitée (``PreparedImage``), servie depuis le cache si déjà vue"""
+    return analyze_image(prepared)[0]
+
+
+def classify_listing(designation="", description="", prepared=None):
+    """Classer une annonce complète : cascade texte → image (``CascadeResult``)"""
+    from .cascade import get_cascade
+
+    with metrics.stage("classify_listing"):
+        return get_cascade().predict(designation, description, prepared)
+
+
+def prediction_to_dict(prediction, top_k=3):
+    """Représentation JSON d'une prédiction"""
+    return {
+        "category": prediction.label,
+        "category_index": prediction.category,
+        "confidence": prediction.confidence,
+        "top_k": [{"category": label, "confidence": confidence}
+                  for label, confidence in prediction.top_k(top_k)],
+        "model_version": prediction.version,
+    }
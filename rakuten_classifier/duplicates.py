@@ -0,0 +1,148 @@
+"""Index des photos récentes par empreinte perceptuelle (quasi-doublons).
+
+Une photo réencodée, redimensionnée ou légèrement recadrée change d'empreinte
+SHA-256 et manque donc le cache de prédictions. Son pHash (``imaging``) reste
+à quelques bits de l'original : ``NearDuplicateIndex`` garde les empreintes
+des dernières images analysées avec leur (Prediction, plongement) et renvoie le
+résultat d'une empreinte à distance de Hamming ≤ ``RAKUTEN_NEARDUP_DISTANCE``
+(4 bits sur 64) sans repasser par le modèle image. Le seuil est volontairement
+bas : un réencodage ou un redimensionnement change au plus 2 bits, alors que
+des photos différentes mais proches (même produit, autre coloris) peuvent
+tomber à moins de 8 bits l'une de l'autre.
+
+Les empreintes tiennent dans un tableau ``uint64`` parcouru en une opération
+vectorisée ; l'index est borné à ``RAKUTEN_NEARDUP_MAX_ENTRIES`` entrées (4096),
+la moins récemment utilisée est remplacée. Un changement de version du modèle
+image vide l'index. ``RAKUTEN_NEARDUP=0`` le désactive.
+"""
+import threading
+
+import numpy as np
+
+from .config import env_flag, env_int
+
+ENABLED = env_flag("RAKUTEN_NEARDUP", True)
+MAX_ENTRIES = env_int("RAKUTEN_NEARDUP_MAX_ENTRIES", 4096)
+MAX_DISTANCE = env_int("RAKUTEN_NEARDUP_DISTANCE", 4)
+
+
+def _unpacked_popcount(values):
+    """Bits à 1 de chaque ``uint64``, octet par octet (NumPy < 2)"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return np.unpackbits(values.view(np.uint8)).reshape(len(values), 64).sum(axis=1)
+
+
+# np.bitwise_count (instruction popcount) n'existe qu'à partir de NumPy 2.0
+popcount = getattr(np, "bitwise_count", _unpacked_popcount)
+
+
+class NearDuplicateIndex:
+    """Empreintes 64 bits → résultat, recherche par distance de Hamming, éviction LRU"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_distance=MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.version = None
+        self._hashes = np.zeros(max_entries, dtype=np.uint64)
+        self._used = np.zeros(max_entries, dtype=np.int64)
+        self._values = [None] * max_entries
+        self._size = 0
+        self._tick = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self._size
+
+    def _nearest(self, phash):
+        """(position, distance) de l'empreinte la plus proche, sous le verrou"""
+        if not self._size:
+            return None, None
+        distances = popcount(self._hashes[:self._size] ^ np.uint64(phash))
+        slot = int(distances.argmin())
+        return slot, int(distances[slot])
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._values = [None] * self.max_entries
+            self._size = 0
+            self.version = version
+
+    def get(self, phash, version):
+        """Résultat d'une image à distance ≤ max_distance, None sinon"""
+        with self._lock:
+            self._check_version(version)
+            slot, distance = self._nearest(phash)
+            if slot is None or distance > self.max_distance:
+                self.misses += 1
+                return None
+            self._tick += 1
+            self._used[slot] = self._tick
+            self.hits += 1
+            self.exact_hits += distance == 0
+            return self._values[slot]
+
+    def put(self, phash, version, value):
+        with self._lock:
+            self._check_version(version)
+            slot, distance = self._nearest(phash)
+            if slot is None or distance:
+                if self._size < self.max_entries:
+                    slot = self._size
+                    self._size += 1
+                else:
+                    slot = int(self._used.argmin())
+                    self.evictions += 1
+            self._tick += 1
+            self._hashes[slot] = phash
+            self._used[slot] = self._tick
+            self._values[slot] = value
+
+    def get_or_compute(self, phash, version, compute):
+        """Résultat d'un quasi-doublon, sinon calculé (hors verrou) puis indexé"""
+        value = self.get(phash, version)
+        if value is None:
+            value = compute()
+            self.put(phash, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values = [None] * self.max_entries
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self._size,
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """Index de quasi-doublons du processus, partagé par toutes les sessions"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex()
+    return _index
+
+
+def duplicate_stats():
+    """Compteurs de l'index de quasi-doublons ({} s'il n'a pas encore servi)"""
+    return _index.stats() if _index is not None else {}
@@ -0,0 +1,422 @@
+"""Moteur d'inférence texte TF-IDF à faible latence.
+
+Le chemin « une ligne » évite le coût générique de scikit-learn (validation,
+construction de matrices creuses, parallélisme joblib) : le vocabulaire est
+consulté directement, la ligne TF-IDF est calculée à la main puis passée à un
+noyau spécialisé selon le type de modèle :
+
+- ``LogisticRegression`` : un produit ligne creuse × coefficients denses puis
+  softmax (ou normalisation one-vs-rest) ;
+- forêts d'arbres (``RandomForestClassifier``, ``ExtraTreesClassifier``) : les
+  arbres sont aplatis en tableaux et parcourus tous ensemble, niveau par niveau
+  (une ligne ou un petit lot à la fois) ;
+- tout autre estimateur : repli sur ``predict_proba``.
+
+Chaque opération reproduit l'ordre des calculs de scikit-learn pour renvoyer
+exactement les mêmes probabilités que ``predict_proba``.
+
+Le modèle livré attend plus de colonnes que le vocabulaire TF-IDF n'en produit
+(bloc d'attributs image) : ces colonnes supplémentaires sont laissées à zéro.
+"""
+import logging
+import math
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+from . import metrics
+from .categories import category_index, display_label
+from .config import CACHE_DIR
+from .registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+TREE_LEAF = -1
+# Au-delà, le predict_proba multithreadé de la forêt redevient plus rapide
+SMALL_BATCH_ROWS = 128
+
+
+@dataclass(frozen=True)
+class Prediction:
+    """Résultat d'une classification"""
+    label: str
+    category: int  # None si la classe ne figure pas dans CATEGORIES
+    confidence: float
+    labels: tuple
+    probabilities: np.ndarray
+    version: str = ""
+
+    def top_k(self, k=3):
+        """Les k classes les plus probables, sous forme de (libellé, probabilité)"""
+        order = np.argsort(-self.probabilities, kind="stable")[:k]
+        return [(self.labels[i], float(self.probabilities[i])) for i in order]
+
+
+def build_text(designation, description):
+    """Texte soumis au vectoriseur : désignation puis description"""
+    return " ".join(part.strip() for part in (designation or "", description or "") if part and part.strip())
+
+
+def pad_features(X, n_features):
+    """Élargir une matrice CSR à n_features colonnes sans copier les données"""
+    if X.shape[1] == n_features:
+        return X
+    return sp.csr_matrix((X.data, X.indices, X.indptr), shape=(X.shape[0], n_features))
+
+
+class TextFeaturizer:
+    """Calcul d'une ligne TF-IDF identique à ``TfidfVectorizer.transform``"""
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = dict(vectorizer.vocabulary_)
+        self.n_features = len(self.vocabulary)
+        self.binary = vectorizer.binary
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.norm = vectorizer.norm
+        self.idf = np.asarray(vectorizer.idf_) if vectorizer.use_idf else None
+
+    def term_counts(self, text):
+        """Colonnes (triées) des termes du vocabulaire présents et leurs occurrences"""
+        vocabulary = self.vocabulary
+        counts = {}
+        for token in self.analyzer(text):
+            j = vocabulary.get(token)
+            if j is not None:
+                counts[j] = counts.get(j, 0) + 1
+        indices = sorted(counts)
+        return indices, [counts[j] for j in indices]
+
+    def row(self, text):
+        """Indices (triés) et valeurs non nulles de la ligne TF-IDF d'un texte"""
+        indices, counts = self.term_counts(text)
+        data = [1.0 if self.binary else float(count) for count in counts]
+        if self.sublinear_tf:
+            data = [math.log(value) + 1.0 for value in data]
+        if self.idf is not None:
+            idf = self.idf
+            data = [value * idf[j] for value, j in zip(data, indices)]
+
+        if self.norm == "l2":
+            total = 0.0
+            for value in data:
+                total += value * value
+            if total != 0.0:
+                total = math.sqrt(total)
+                data = [value / total for value in data]
+        elif self.norm == "l1":
+            total = 0.0
+            for value in data:
+                total += abs(value)
+            if total != 0.0:
+                data = [value / total for value in data]
+
+        return np.asarray(indices, dtype=np.intp), np.asarray(data, dtype=np.float64)
+
+    def transform(self, texts):
+        """Matrice TF-IDF d'un lot de textes (chemin vectorisé de scikit-learn)"""
+        return self.vectorizer.transform(texts)
+
+
+class EstimatorKernel:
+    """Repli générique : ``predict_proba`` de l'estimateur"""
+
+    kind = "estimator"
+
+    def __init__(self, model):
+        self.model = model
+        self.n_features = model.n_features_in_
+
+    def predict_proba_row(self, indices, data):
+        X = sp.csr_matrix((data, indices, np.array([0, len(indices)])), shape=(1, self.n_features))
+        return self.model.predict_proba(X)[0]
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(pad_features(X, self.n_features))
+
+
+class LinearKernel(EstimatorKernel):
+    """``LogisticRegression`` : produit creux × coefficients puis softmax"""
+
+    kind = "linear"
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.coef = model.coef_
+        self.intercept = np.asarray(model.intercept_, dtype=np.float64)
+        multi_class = getattr(model, "multi_class", "auto")
+        self.ovr = multi_class in ("ovr", "warn") or (
+            multi_class in ("auto", "deprecated")
+            and (len(model.classes_) <= 2 or model.solver == "liblinear")
+        )
+
+    @staticmethod
+    def supports(model):
+        return type(model).__name__ == "LogisticRegression" and hasattr(model, "coef_")
+
+    def predict_proba_row(self, indices, data):
+        # Accumulation dans l'ordre des indices, comme le produit CSR de scipy
+        scores = np.zeros(self.coef.shape[0], dtype=np.float64)
+        coef = self.coef
+        for j, value in zip(indices, data):
+            scores += value * coef[:, j]
+        scores += self.intercept
+        scores = scores.reshape(1, -1)
+
+        if self.ovr:
+            prob = 1.0 / (1.0 + np.exp(-scores))
+            if prob.shape[1] == 1:
+                return np.array([1.0 - prob[0, 0], prob[0, 0]])
+            return (prob / prob.sum(axis=1).reshape((1, -1)))[0]
+
+        if scores.shape[1] == 1:
+            scores = np.c_[-scores, scores]
+        scores -= np.max(scores, axis=1).reshape((-1, 1))
+        np.exp(scores, scores)
+        scores /= np.sum(scores, axis=1).reshape((-1, 1))
+        return scores[0]
+
+
+class ForestKernel(EstimatorKernel):
+    """Forêt aplatie : tous les arbres avancent d'un niveau à chaque itération.
+
+    Les enfants de chaque nœud sont rangés côte à côte (``children[2 * n]`` à
+    gauche, ``children[2 * n + 1]`` à droite) et les feuilles bouclent sur
+    elles-mêmes (seuil infini), ce qui évite tout masquage : on itère
+    simplement ``depth`` fois.
+    """
+
+    kind = "forest"
+
+    def __init__(self, model, arrays=None):
+        super().__init__(model)
+        arrays = arrays if arrays is not None else self.compile(model)
+        # np.asarray : vues simples sur la projection mémoire, sans le surcoût de np.memmap
+        self.feature = np.asarray(arrays["feature"])
+        self.threshold = np.asarray(arrays["threshold"])
+        self.children = np.asarray(arrays["children"])
+        self.value = np.asarray(arrays["value"])
+        self.roots = np.array(arrays["roots"])
+        self.depth = int(arrays["depth"][0])
+        self.n_trees = len(self.roots)
+
+    @staticmethod
+    def supports(model):
+        estimators = getattr(model, "estimators_", None)
+        return (
+            type(model).__name__ in ("RandomForestClassifier", "ExtraTreesClassifier")
+            and getattr(model, "n_outputs_", 1) == 1
+            and bool(estimators)
+            and all(hasattr(tree, "tree_") for tree in estimators)
+        )
+
+    @staticmethod
+    def compile(model):
+        """Aplatir les arbres en tableaux contigus (indices globaux)"""
+        n_classes = len(model.classes_)
+        # Avant scikit-learn 1.4, tree_.value contenait des effectifs normalisés à la prédiction
+        normalize = _sklearn_version() < (1, 4)
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            local = np.arange(n_nodes)
+            is_leaf = tree.children_left == TREE_LEAF
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            left = np.where(is_leaf, local, tree.children_left) + offset
+            right = np.where(is_leaf, local, tree.children_right) + offset
+            children.append(np.column_stack([left, right]).ravel())
+
+            # Mêmes valeurs que DecisionTreeClassifier.predict_proba
+            proba = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            if normalize:
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba /= normalizer
+            values.append(proba)
+
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += n_nodes
+
+        return {
+            "feature": np.concatenate(features).astype(np.intp),
+            "threshold": np.concatenate(thresholds).astype(np.float64),
+            "children": np.concatenate(children).astype(np.intp),
+            "value": np.concatenate(values),
+            "roots": np.asarray(roots, dtype=np.intp),
+            "depth": np.asarray([depth], dtype=np.int32),
+        }
+
+    def leaves(self, x):
+        """Feuille atteinte dans chaque arbre pour une ligne dense float32"""
+        node = self.roots
+        feature, threshold, children = self.feature, self.threshold, self.children
+        for _ in range(self.depth):
+            node = children.take(2 * node + (x.take(feature.take(node)) > threshold.take(node)))
+        return node
+
+    def leaves_batch(self, X):
+        """Feuilles atteintes (n, arbres) pour un lot dense float32 (n, attributs)"""
+        flat = X.ravel()
+        offsets = (np.arange(X.shape[0]) * X.shape[1])[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        feature, threshold, children = self.feature, self.threshold, self.children
+        for _ in range(self.depth):
+            node = children.take(2 * node + (flat.take(offsets + feature.take(node)) > threshold.take(node)))
+        return node
+
+    def predict_proba(self, X):
+        # Petits lots (micro-lots du service) : parcours aplati, sans le coût
+        # fixe de la forêt scikit-learn ; gros lots : predict_proba multithreadé
+        if X.shape[0] > SMALL_BATCH_ROWS:
+            return super().predict_proba(X)
+        dense = np.asarray(pad_features(X, self.n_features).toarray(), dtype=np.float32)
+        proba = np.add.reduce(self.value.take(self.leaves_batch(dense), axis=0), axis=1)
+        proba /= self.n_trees
+        return proba
+
+    def predict_proba_row(self, indices, data):
+        # Les arbres de scikit-learn comparent des attributs convertis en float32
+        x = np.zeros(self.n_features, dtype=np.float32)
+        x[indices] = data
+        # Somme arbre par arbre dans l'ordre des estimateurs, comme la forêt
+        proba = np.add.reduce(self.value.take(self.leaves(x), axis=0), axis=0)
+        proba /= self.n_trees
+        return proba
+
+
+def _sklearn_version():
+    import sklearn
+    return tuple(int(part) for part in sklearn.__version__.split(".")[:2])
+
+
+def _mapped_arrays(cache_dir, name, build):
+    """Tableaux compilés persistés en .npy puis projetés en mémoire.
+
+    Les workers d'un même hôte qui servent la même version du modèle
+    partagent ainsi les pages du cache disque.
+    """
+    if cache_dir is None:
+        return build()
+
+    target = Path(cache_dir) / name
+    if not target.is_dir():
+        arrays = build()
+        tmp = target.with_name(f".{name}.{os.getpid()}.{uuid.uuid4().hex}")
+        try:
+            tmp.mkdir(parents=True)
+            for key, array in arrays.items():
+                np.save(tmp / f"{key}.npy", np.ascontiguousarray(array))
+            os.rename(tmp, target)
+        except OSError:
+            # Un autre processus a publié le même cache entre-temps, ou disque en lecture seule
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not target.is_dir():
+                logger.warning("Cache %s non persisté, tableaux gardés en mémoire", target)
+                return arrays
+    return {path.stem: np.load(path, mmap_mode="r") for path in target.glob("*.npy")}
+
+
+def build_kernel(model, cache_dir=None, version=""):
+    """Choisir le noyau le plus rapide pour ce modèle"""
+    if hasattr(model, "build_kernel"):
+        # Artefacts au format compact (rakuten_classifier.compact) : noyau déjà prêt
+        return model.build_kernel()
+    if LinearKernel.supports(model):
+        return LinearKernel(model)
+    if ForestKernel.supports(model):
+        arrays = _mapped_arrays(cache_dir, f"forest-{version}", lambda: ForestKernel.compile(model))
+        return ForestKernel(model, arrays)
+    return EstimatorKernel(model)
+
+
+class TextEngine:
+    """Classifieur texte construit à partir d'un ``ModelBundle``"""
+
+    def __init__(self, bundle, cache_dir=CACHE_DIR):
+        self.version = bundle.version
+        vectorizer = bundle.vectorizer
+        self.featurizer = vectorizer.featurizer() if hasattr(vectorizer, "featurizer") else TextFeaturizer(vectorizer)
+        self.kernel = build_kernel(bundle.model, cache_dir, bundle.version)
+        self.classes = tuple(bundle.model.classes_)
+        self.labels = tuple(display_label(c) for c in self.classes)
+        self.categories = tuple(category_index(c) for c in self.classes)
+
+    def predict_proba_one(self, text):
+        """Probabilités pour un seul texte (chemin rapide)"""
+        with metrics.stage("vectorize"):
+            indices, data = self.featurizer.row(text)
+        metrics.increment("model_calls", model="text")
+        with metrics.stage("predict"):
+            return self.kernel.predict_proba_row(indices, data)
+
+    def predict_proba(self, texts):
+        """Probabilités pour un lot de textes (chemin vectorisé)"""
+        with metrics.stage("vectorize_batch"):
+            X = self.featurizer.transform(list(texts))
+        metrics.increment("model_calls", model="text_batch")
+        with metrics.stage("predict_batch"):
+            return self.kernel.predict_proba(X)
+
+    def prediction(self, probabilities):
+        """Construire une ``Prediction`` à partir d'un vecteur de probabilités"""
+        best = int(np.argmax(probabilities))
+        return Prediction(
+            label=self.labels[best],
+            category=self.categories[best],
+            confidence=float(probabilities[best]),
+            labels=self.labels,
+            probabilities=probabilities,
+            version=self.version,
+        )
+
+    def predict(self, designation, description=""):
+        """Classer une annonce à partir de sa désignation et de sa description"""
+        return self.prediction(self.predict_proba_one(build_text(designation, description)))
+
+
+# Moteurs récents par version : après une publication ou un rollback, le
+# moteur déjà construit sert immédiatement
+MAX_ENGINES = 4
+_engines = OrderedDict()
+_engine_lock = threading.Lock()
+
+
+def register_engine(engine):
+    """Rendre un moteur construit hors du chemin des requêtes disponible pour sa version"""
+    with _engine_lock:
+        _remember(engine)
+
+
+def _remember(engine):
+    _engines[engine.version] = engine
+    _engines.move_to_end(engine.version)
+    while len(_engines) > MAX_ENGINES:
+        _engines.popitem(last=False)
+
+
+def get_engine(registry=None):
+    """Moteur correspondant au bundle courant du registre (reconstruit après rechargement)"""
+    bundle = (registry or get_registry()).get()
+    engine = _engines.get(bundle.version)
+    if engine is not None:
+        return engine
+    with _engine_lock:
+        engine = _engines.get(bundle.version)
+        if engine is None:
+            engine = TextEngine(bundle)
+            _remember(engine)
+    return engine
@@ -0,0 +1,182 @@
+"""Évaluation hors ligne du modèle texte sur un fichier annoté.
+
+Le fichier suit le format du challenge Rakuten (``designation``,
+``description``, ``productid``, ``imageid``, ``prdtypecode``) ; il est lu par
+morceaux et chaque morceau est classé par un pool de processus. Les workers ne
+renvoient qu'une matrice de confusion partielle, additionnée au fur et à
+mesure : la mémoire dépend de la taille des morceaux et du nombre de workers,
+pas de celle du fichier.
+
+Les codes ``prdtypecode`` sont ramenés aux 14 ``CATEGORIES`` par
+``PRDTYPECODE_CATEGORIES`` (surchargeable par un fichier JSON
+``{"code": "libellé"}``) ; une colonne de libellés (``category``) est aussi
+acceptée. Les lignes dont le code n'a pas de catégorie sont comptées mais
+exclues des métriques. Le résultat (JSON) contient F1 pondéré et macro,
+précision, matrice de confusion, métriques par classe et lignes par seconde.
+
+    python -m rakuten_classifier evaluate X_train.csv -o eval.json
+"""
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from .batch import CHUNK_SIZE, map_chunks, texts_of
+from .categories import CATEGORIES, CATEGORY_INDEX, display_label
+
+# Codes produit du challenge Rakuten → index dans CATEGORIES. Le challenge n'a
+# pas de code pour la musique, la téléphonie, l'informatique, l'image et le son,
+# l'électroménager, la mode et la beauté.
+PRDTYPECODE_CATEGORIES = {
+    10: 0,     # Livres d'occasion
+    2280: 0,   # Magazines
+    2403: 0,   # Livres et BD en lot
+    2705: 0,   # Livres neufs
+    40: 2,     # Jeux vidéo (import, rétro)
+    50: 2,     # Accessoires de jeux vidéo
+    60: 2,     # Consoles
+    2462: 2,   # Jeux vidéo d'occasion en lot
+    2905: 2,   # Jeux PC à télécharger
+    1560: 6,   # Mobilier
+    1920: 6,   # Linge de maison
+    2060: 6,   # Décoration
+    2522: 6,   # Papeterie, fournitures
+    1940: 8,   # Alimentation, épicerie
+    2220: 9,   # Animalerie
+    2582: 9,   # Mobilier de jardin
+    2583: 9,   # Piscine, spa
+    2585: 9,   # Outillage, bricolage, jardin
+    1301: 10,  # Jeux de bar, fléchettes, billard
+    1302: 10,  # Jeux et sports d'extérieur
+    1140: 13,  # Figurines, pop culture
+    1160: 13,  # Cartes à collectionner
+    1180: 13,  # Jeux de figurines, jeux de rôle
+    1280: 13,  # Jouets
+    1281: 13,  # Jeux de société
+    1300: 13,  # Modélisme, drones
+    1320: 13,  # Puériculture
+}
+LABEL_COLUMNS = ("prdtypecode", "category")
+# Colonne supplémentaire de la matrice : classe du modèle hors CATEGORIES
+OTHER = len(CATEGORIES)
+
+
+def load_mapping(path):
+    """Correspondance ``{code: index}`` depuis un JSON ``{"code": "libellé" ou index}``"""
+    with open(path, encoding="utf-8") as handle:
+        raw = json.load(handle)
+    mapping = {}
+    for code, target in raw.items():
+        index = target if isinstance(target, int) else CATEGORY_INDEX.get(display_label(target))
+        if index is None or index not in CATEGORIES:
+            raise ValueError(f"Catégorie inconnue pour le code {code} : {target}")
+        mapping[int(code)] = index
+    return mapping
+
+
+def label_categories(values, mapping=None):
+    """Index dans CATEGORIES de chaque étiquette (code produit ou libellé), -1 si inconnue"""
+    mapping = PRDTYPECODE_CATEGORIES if mapping is None else mapping
+    out = np.full(len(values), -1, dtype=np.intp)
+    for i, value in enumerate(values):
+        value = str(value).strip()
+        if value.lstrip("-").isdigit():
+            out[i] = mapping.get(int(value), -1)
+        else:
+            out[i] = CATEGORY_INDEX.get(display_label(value), -1)
+    return out
+
+
+def evaluate_chunk(task):
+    """Matrice de confusion partielle (CATEGORIES × CATEGORIES + hors catégories)"""
+    from .engine import get_engine
+
+    frame, label_column, mapping = task
+    confusion = np.zeros((len(CATEGORIES), len(CATEGORIES) + 1), dtype=np.int64)
+    targets = label_categories(frame[label_column].tolist(), mapping)
+    known = targets >= 0
+    start = time.perf_counter()
+    if known.any():
+        engine = get_engine()
+        categories = np.array([OTHER if c is None else c for c in engine.categories])
+        proba = engine.predict_proba(texts_of(frame[known]))
+        np.add.at(confusion, (targets[known], categories[proba.argmax(axis=1)]), 1)
+    return confusion, int((~known).sum()), time.perf_counter() - start
+
+
+def _chunks(path, chunksize, limit=None):
+    header = pd.read_csv(path, nrows=0).columns
+    label_column = next((column for column in LABEL_COLUMNS if column in header), None)
+    if label_column is None:
+        raise ValueError(f"Colonne d'étiquettes introuvable ({' ou '.join(LABEL_COLUMNS)})")
+    columns = [column for column in ("designation", "description", label_column) if column in header]
+    rows = 0
+    with pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+        for frame in reader:
+            if limit is not None:
+                frame = frame.iloc[:max(0, limit - rows)]
+                if frame.empty:
+                    return
+            rows += len(frame)
+            yield frame, label_column
+
+
+def classification_metrics(confusion):
+    """Précision, F1 pondéré / macro et métriques par classe à partir de la matrice"""
+    support = confusion.sum(axis=1)
+    predicted = confusion[:, :OTHER].sum(axis=0)
+    true_positive = np.diag(confusion[:, :OTHER]).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positive / predicted, 0.0)
+        recall = np.where(support > 0, true_positive / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    total = int(support.sum())
+    present = support > 0
+    return {
+        "rows": total,
+        "accuracy": float(true_positive.sum() / total) if total else None,
+        "weighted_f1": float((f1 * support).sum() / total) if total else None,
+        "macro_f1": float(f1[present].mean()) if present.any() else None,
+        "per_class": {
+            CATEGORIES[i]: {"precision": float(precision[i]), "recall": float(recall[i]), "f1": float(f1[i]),
+                            "support": int(support[i])}
+            for i in range(OTHER) if support[i] or predicted[i]
+        },
+    }
+
+
+def evaluate_path(path, workers=1, chunksize=CHUNK_SIZE, mapping=None, limit=None):
+    """Évaluer le modèle servi sur un CSV annoté ; au plus 2 × workers morceaux en mémoire"""
+    from .engine import get_engine
+
+    confusion = np.zeros((len(CATEGORIES), len(CATEGORIES) + 1), dtype=np.int64)
+    unmapped = 0
+    model_seconds = 0.0
+    start = time.perf_counter()
+
+    def add(result):
+        nonlocal confusion, unmapped, model_seconds
+        confusion += result[0]
+        unmapped += result[1]
+        model_seconds += result[2]
+
+    tasks = ((frame, label_column, mapping) for frame, label_column in _chunks(path, chunksize, limit))
+    for result in map_chunks(evaluate_chunk, tasks, workers):
+        add(result)
+    elapsed = time.perf_counter() - start
+
+    result = classification_metrics(confusion)
+    rows = result["rows"] + unmapped
+    result.update(
+        input=str(path),
+        model_version=get_engine().version,
+        workers=workers,
+        unmapped_rows=unmapped,
+        seconds=elapsed,
+        rows_per_second=rows / elapsed if elapsed else 0.0,
+        model_rows_per_second=result["rows"] / model_seconds if model_seconds else 0.0,
+        labels=list(CATEGORIES.values()) + ["(hors catégories)"],
+        confusion=confusion.tolist(),
+    )
+    return result
@@ -0,0 +1,239 @@
+"""Enregistrement des corrections de catégorie (bouton « Confirmer cette correction »).
+
+Les corrections sont ajoutées à une base SQLite en mode WAL
+(``RAKUTEN_FEEDBACK_PATH``, ``feedback.sqlite3`` à côté des artefacts). Un
+thread d'écriture unique reçoit les corrections par une file et les valide par
+lots (une transaction pour toutes celles arrivées pendant
+``RAKUTEN_FEEDBACK_FLUSH_MS``) : l'interface n'attend jamais le disque.
+
+Chaque correction conserve le texte de l'annonce, l'empreinte de l'image, la
+catégorie prédite, la catégorie corrigée, la version du modèle et la date.
+``compact`` ne garde que la dernière correction de chaque annonce (même texte,
+même image) puis récupère l'espace ; ``export`` écrit un CSV ou un Parquet
+directement exploitable pour le réentraînement.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .config import ARTIFACT_DIR, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_PATH = Path(os.environ.get("RAKUTEN_FEEDBACK_PATH", ARTIFACT_DIR / "feedback.sqlite3"))
+FLUSH_SECONDS = env_float("RAKUTEN_FEEDBACK_FLUSH_MS", 200.0) / 1000.0
+MAX_BATCH = env_int("RAKUTEN_FEEDBACK_MAX_BATCH", 500)
+EXPORT_CHUNK_SIZE = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS corrections (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    designation TEXT NOT NULL,
+    description TEXT NOT NULL,
+    image_digest TEXT NOT NULL,
+    predicted_index INTEGER,
+    predicted_label TEXT,
+    corrected_index INTEGER NOT NULL,
+    corrected_label TEXT NOT NULL,
+    model_version TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS corrections_created_at ON corrections (created_at);
+"""
+COLUMNS = ("created_at", "designation", "description", "image_digest", "predicted_index",
+           "predicted_label", "corrected_index", "corrected_label", "model_version")
+
+
+@dataclass(frozen=True)
+class Correction:
+    designation: str
+    description: str
+    image_digest: str
+    predicted_index: Optional[int]
+    predicted_label: Optional[str]
+    corrected_index: int
+    corrected_label: str
+    model_version: str = ""
+    created_at: float = 0.0
+
+    def row(self):
+        """Valeurs dans l'ordre de ``COLUMNS``"""
+        return (self.created_at or time.time(), self.designation, self.description, self.image_digest,
+                self.predicted_index, self.predicted_label, self.corrected_index, self.corrected_label,
+                self.model_version)
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30.0)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # WAL : NORMAL suffit à la durabilité des transactions validées hors coupure de courant
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class FeedbackStore:
+    """Base de corrections avec écriture par lots en arrière-plan"""
+
+    def __init__(self, path=FEEDBACK_PATH, flush_interval=FLUSH_SECONDS, max_batch=MAX_BATCH):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(connect(self.path)) as connection:
+            connection.executescript(SCHEMA)
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        self.written = 0
+        self.failed = 0
+
+    def record(self, correction):
+        """Ajouter une correction (retour immédiat, écriture en arrière-plan)"""
+        self._queue.put(correction.row())
+
+    def flush(self, timeout=None):
+        """Attendre l'écriture de toutes les corrections déjà soumises"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        connection = connect(self.path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                rows, events = [], []
+                deadline = time.monotonic() + self.flush_interval
+                while item is not None:
+                    if isinstance(item, threading.Event):
+                        # Demande de flush : écrire sans attendre l'échéance
+                        events.append(item)
+                        break
+                    rows.append(item)
+                    if len(rows) >= self.max_batch:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                self._write(connection, rows)
+                for event in events:
+                    event.set()
+                if item is None:
+                    return
+        finally:
+            connection.close()
+
+    def _write(self, connection, rows):
+        if not rows:
+            return
+        try:
+            with connection:
+                connection.executemany(
+                    f"INSERT INTO corrections ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows)
+            self.written += len(rows)
+        except sqlite3.Error:
+            self.failed += len(rows)
+            logger.exception("Échec de l'écriture de %d correction(s)", len(rows))
+
+    # Maintenance et export (connexions séparées : le WAL autorise les lectures concurrentes)
+
+    def count(self):
+        with closing(connect(self.path)) as connection:
+            return connection.execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+
+    def read_after(self, after_id=0, limit=1000):
+        """Corrections d'identifiant supérieur à ``after_id`` (dictionnaires avec ``id``)"""
+        with closing(connect(self.path)) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM corrections WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def compact(self):
+        """Garder la dernière correction de chaque annonce, puis récupérer l'espace"""
+        self.flush()
+        with closing(connect(self.path)) as connection:
+            with connection:
+                removed = connection.execute("""
+                    DELETE FROM corrections WHERE id NOT IN (
+                        SELECT MAX(id) FROM corrections
+                        GROUP BY designation, description, image_digest
+                    )""").rowcount
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            connection.execute("VACUUM")
+        return removed
+
+    def export(self, destination, since=None, chunksize=EXPORT_CHUNK_SIZE):
+        """Écrire les corrections (CSV ou Parquet selon l'extension) ; renvoie le nombre de lignes"""
+        import pandas as pd
+
+        from .batch import detect_format
+
+        self.flush()
+        fmt = detect_format(destination)
+        query = f"SELECT {', '.join(COLUMNS)} FROM corrections"
+        params = ()
+        if since is not None:
+            query += " WHERE created_at >= ?"
+            params = (since,)
+        query += " ORDER BY id"
+
+        rows = 0
+        writer = None
+        with closing(connect(self.path)) as connection:
+            try:
+                for frame in pd.read_sql_query(query, connection, params=params, chunksize=chunksize):
+                    frame["predicted_index"] = frame["predicted_index"].astype("Int64")
+                    if fmt == "parquet":
+                        import pyarrow as pa
+                        import pyarrow.parquet as pq
+
+                        table = pa.Table.from_pandas(frame, preserve_index=False)
+                        if writer is None:
+                            writer = pq.ParquetWriter(destination, table.schema)
+                        writer.write_table(table.cast(writer.schema))
+                    else:
+                        frame.to_csv(destination, mode="a" if rows else "w", header=not rows, index=False)
+                    rows += len(frame)
+            finally:
+                if writer is not None:
+                    writer.close()
+        if not rows:
+            empty = pd.DataFrame(columns=list(COLUMNS))
+            if fmt == "parquet":
+                empty.to_parquet(destination, index=False)
+            else:
+                empty.to_csv(destination, index=False)
+        return rows
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feedback_store():
+    """Base de corrections du processus, ouverte au premier appel"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FeedbackStore()
+    return _store
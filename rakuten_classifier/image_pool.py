@@ -0,0 +1,401 @@
+"""Inférence image hors processus, dans un pool de processus dédiés.
+
+Dans les threads de script Streamlit, chaque session se dispute le GIL et le
+pool de threads intra-op de torch. Avec ``RAKUTEN_IMAGE_POOL=<n>``, les
+images sont classées par ``n`` processus dédiés :
+
+- chaque processus charge le modèle une fois au démarrage, avec son propre
+  nombre de threads torch (``RAKUTEN_IMAGE_THREADS``) ;
+- les images prétraitées transitent par un tampon de mémoire partagée découpé
+  en emplacements (``RAKUTEN_IMAGE_POOL_SLOTS``) : seul l'indice de
+  l'emplacement passe par le tube, jamais les pixels ;
+- un processus qui meurt est relancé automatiquement ; ses requêtes en cours
+  sont resoumises une fois à un autre processus.
+
+Le processus Streamlit n'importe alors jamais torch et reste réactif pendant
+que l'inférence occupe les autres cœurs.
+"""
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from .config import env_int
+from .imaging import IMAGE_SIZE
+from .vision import BACKBONE, NUM_THREADS, image_prediction
+
+logger = logging.getLogger(__name__)
+
+POOL_WORKERS = env_int("RAKUTEN_IMAGE_POOL", 0)
+POOL_SLOTS = env_int("RAKUTEN_IMAGE_POOL_SLOTS", 32)
+SLOT_SHAPE = (3, IMAGE_SIZE, IMAGE_SIZE)
+# Nombre de resoumissions d'une requête dont le processus est mort
+MAX_RETRIES = 1
+
+
+class WorkerCrashedError(RuntimeError):
+    """Le processus d'inférence est mort pendant la requête"""
+
+
+class PoolUnavailableError(RuntimeError):
+    """Le pool ne peut pas (ou plus) servir de requêtes"""
+
+
+def _images_view(buffer):
+    return np.frombuffer(buffer, dtype=np.float32).reshape(-1, *SLOT_SHAPE)
+
+
+def _worker_main(tasks, results, buffer, num_threads, classifier_options):
+    """Boucle d'un processus : (tâche, emplacements) → (probabilités, plongements)"""
+    try:
+        from .vision import ImageClassifier
+
+        classifier = ImageClassifier(num_threads=num_threads, **classifier_options)
+    except BaseException:
+        results.send(("failed", None, traceback.format_exc()))
+        return
+    images = _images_view(buffer)
+    results.send(("ready", None, os.getpid()))
+
+    while True:
+        try:
+            message = tasks.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        task_id, slots = message
+        try:
+            embeddings, proba = classifier.forward(images[slots])
+            results.send(("done", task_id, (proba, embeddings)))
+        except Exception:
+            results.send(("error", task_id, traceback.format_exc()))
+
+
+class _Task:
+    __slots__ = ("task_id", "slots", "future", "attempts", "worker")
+
+    def __init__(self, task_id, slots):
+        self.task_id = task_id
+        self.slots = slots
+        self.future = Future()
+        self.attempts = 0
+        self.worker = None
+
+
+class _Worker:
+    def __init__(self, index, process, tasks, results):
+        self.index = index
+        self.process = process
+        self.tasks = tasks
+        self.results = results
+        self.in_flight = set()
+        self.ready = threading.Event()
+
+
+class ImageWorkerPool:
+    """Pool de processus d'inférence image partageant un tampon d'images"""
+
+    def __init__(self, workers=POOL_WORKERS, num_threads=NUM_THREADS, slots=POOL_SLOTS, **classifier_options):
+        self.n_workers = max(1, workers)
+        self.num_threads = num_threads
+        self.n_slots = max(1, slots)
+        self.classifier_options = classifier_options
+        self.backbone = classifier_options.get("backbone", BACKBONE)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._buffer = self._context.RawArray("f", self.n_slots * int(np.prod(SLOT_SHAPE)))
+        self._images = _images_view(self._buffer)
+        self._free = queue.Queue()
+        for slot in range(self.n_slots):
+            self._free.put(slot)
+        self._acquire_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._task_ids = itertools.count()
+        self._workers = []
+        self._collector = None
+        self._closed = False
+        self._error = None
+        self.restarts = 0
+        self.completed = 0
+
+    # Cycle de vie
+
+    def start(self, timeout=300.0):
+        """Lancer les processus et attendre qu'ils aient chargé le modèle"""
+        with self._lock:
+            if self._workers:
+                return self
+            self._workers = [self._spawn(index) for index in range(self.n_workers)]
+        # Avant l'arrêt des processus fils par multiprocessing : pas de relance à la sortie
+        atexit.register(self.close)
+        self._collector = threading.Thread(target=self._collect, name="image-pool", daemon=True)
+        self._collector.start()
+        for worker in list(self._workers):
+            if not worker.ready.wait(timeout) and self._error is None:
+                raise PoolUnavailableError("Délai de démarrage du pool d'inférence image dépassé")
+        if self._error is not None:
+            raise PoolUnavailableError(self._error)
+        logger.info("Pool d'inférence image : %d processus × %d thread(s)", self.n_workers, self.num_threads)
+        return self
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.tasks.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        if self._collector is not None:
+            self._collector.join(5)
+        self._fail_all(PoolUnavailableError("Pool d'inférence image arrêté"))
+
+    def _spawn(self, index):
+        task_recv, task_send = self._context.Pipe(duplex=False)
+        result_recv, result_send = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(task_recv, result_send, self._buffer, self.num_threads, self.classifier_options),
+            name=f"image-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        # Extrémités utilisées seulement par l'enfant
+        task_recv.close()
+        result_send.close()
+        return _Worker(index, process, task_send, result_recv)
+
+    # Requêtes
+
+    def analyze_many(self, arrays, timeout=None):
+        """Tableaux prétraités (3, 224, 224) → liste de (Prediction, plongement)"""
+        futures = []
+        arrays = list(arrays)
+        for start in range(0, len(arrays), self.n_slots):
+            group = arrays[start:start + self.n_slots]
+            slots = self._acquire(len(group))
+            for slot, array in zip(slots, group):
+                self._images[slot] = array
+            futures.extend(self._dispatch_slots(slots))
+
+        results = []
+        for future in futures:
+            proba, embeddings = future.result(timeout)
+            results.extend(zip(proba, embeddings))
+        return [(image_prediction(p, self.backbone), e) for p, e in results]
+
+    def analyze(self, array, timeout=None):
+        return self.analyze_many([array], timeout)[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.n_workers,
+                "threads_per_worker": self.num_threads,
+                "alive": sum(w.process.is_alive() for w in self._workers),
+                "in_flight": len(self._tasks),
+                "free_slots": self._free.qsize(),
+                "completed": self.completed,
+                "restarts": self.restarts,
+            }
+
+    def _acquire(self, count):
+        # Un appelant à la fois réserve son groupe : pas d'interblocage entre
+        # deux appelants qui auraient chacun une partie des emplacements
+        with self._acquire_lock:
+            return [self._free.get() for _ in range(count)]
+
+    def _release(self, slots):
+        for slot in slots:
+            self._free.put(slot)
+
+    def _dispatch_slots(self, slots):
+        """Répartir les emplacements en tâches contiguës, une par processus au plus"""
+        if self._error is not None or self._closed:
+            self._release(slots)
+            raise PoolUnavailableError(self._error or "Pool d'inférence image arrêté")
+        parts = np.array_split(np.asarray(slots), min(self.n_workers, len(slots)))
+        with self._lock:
+            tasks = [_Task(next(self._task_ids), [int(s) for s in part]) for part in parts]
+            for task in tasks:
+                self._tasks[task.task_id] = task
+                self._send(task)
+        return [task.future for task in tasks]
+
+    def _send(self, task):
+        """Envoyer une tâche au processus le moins chargé (sous self._lock)"""
+        worker = min((w for w in self._workers if w.process.is_alive()),
+                     key=lambda w: len(w.in_flight), default=None)
+        if worker is None:
+            # Tous en cours de relance : la tâche partira avec la prochaine relance
+            task.worker = None
+            return
+        task.worker = worker
+        worker.in_flight.add(task.task_id)
+        try:
+            worker.tasks.send((task.task_id, task.slots))
+        except (OSError, ValueError):
+            # Processus mort entre-temps : le collecteur resoumettra la tâche
+            pass
+
+    # Collecteur : résultats et surveillance des processus
+
+    def _collect(self):
+        while not self._closed:
+            with self._lock:
+                workers = list(self._workers)
+            handles = {}
+            for worker in workers:
+                handles[worker.results] = worker
+                handles[worker.process.sentinel] = worker
+            for handle in wait(list(handles), timeout=0.5):
+                worker = handles[handle]
+                if handle is worker.results:
+                    self._receive(worker)
+                elif not self._closed:
+                    self._restart(worker)
+
+    def _receive(self, worker):
+        """Traiter un message du processus ; False si le tube est fermé"""
+        try:
+            kind, task_id, payload = worker.results.recv()
+        except (EOFError, OSError):
+            return False
+        if kind == "ready":
+            worker.ready.set()
+            return True
+        if kind == "failed":
+            logger.error("Échec du chargement du modèle image :\n%s", payload)
+            self._error = f"Échec du chargement du modèle image dans le pool : {payload.strip().splitlines()[-1]}"
+            self._fail_all(PoolUnavailableError(self._error))
+            for other in self._workers:
+                other.ready.set()
+            return True
+
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            worker.in_flight.discard(task_id)
+            if kind == "done":
+                self.completed += 1
+        if task is None:
+            return True
+        self._release(task.slots)
+        if kind == "done":
+            task.future.set_result(payload)
+        else:
+            task.future.set_exception(RuntimeError(f"Erreur d'inférence image :\n{payload}"))
+        return True
+
+    def _restart(self, worker):
+        worker.process.join()
+        if self._error is not None:
+            with self._lock:
+                self._workers = [w for w in self._workers if w is not worker]
+            return
+        logger.warning("Processus d'inférence image %d mort (code %s), relance",
+                       worker.index, worker.process.exitcode)
+
+        # Lire les résultats déjà envoyés avant la mort du processus
+        while True:
+            try:
+                if not worker.results.poll():
+                    break
+            except (EOFError, OSError):
+                break
+            if not self._receive(worker):
+                break
+        worker.tasks.close()
+        worker.results.close()
+
+        with self._lock:
+            replacement = self._spawn(worker.index)
+            self._workers = [replacement if w is worker else w for w in self._workers]
+            self.restarts += 1
+            failed = []
+            for task_id in list(worker.in_flight):
+                task = self._tasks[task_id]
+                task.attempts += 1
+                if task.attempts > MAX_RETRIES:
+                    del self._tasks[task_id]
+                    failed.append(task)
+                else:
+                    self._send(task)
+            # Tâches restées sans processus pendant la relance
+            for task in self._tasks.values():
+                if task.worker is None:
+                    self._send(task)
+        for task in failed:
+            self._release(task.slots)
+            task.future.set_exception(WorkerCrashedError(
+                f"Le processus d'inférence image {worker.index} est mort pendant la requête"))
+
+    def _fail_all(self, error):
+        with self._lock:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            for worker in self._workers:
+                worker.in_flight.clear()
+        for task in tasks:
+            self._release(task.slots)
+            if not task.future.done():
+                task.future.set_exception(error)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Démarrage en arrière-plan demandé une seule fois par processus
+_start_lock = threading.Lock()
+_started = False
+
+
+def get_image_pool():
+    """Pool du processus (``RAKUTEN_IMAGE_POOL`` processus), démarré au premier appel"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ImageWorkerPool()
+                try:
+                    _pool = pool.start()
+                except BaseException:
+                    pool.close()
+                    raise
+    return _pool
+
+
+def start_in_background():
+    """Démarrer le pool sans bloquer l'appelant (premier affichage de la page), une fois par processus"""
+    global _started
+    if _started or _pool is not None or not POOL_WORKERS:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        threading.Thread(target=_start_quietly, name="image-pool-start", daemon=True).start()
+
+
+def _start_quietly():
+    try:
+        get_image_pool()
+    except Exception:
+        logger.exception("Démarrage du pool d'inférence image impossible")
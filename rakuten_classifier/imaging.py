@@ -0,0 +1,167 @@
+"""Décodage et prétraitement des photos téléversées.
+
+Les vendeurs envoient des JPEG de 12 à 48 Mpx : les décoder en pleine
+résolution à chaque réexécution coûte des centaines de millisecondes et des
+centaines de Mio. ``prepare_image`` demande au décodeur JPEG une sortie
+réduite (``Image.draft`` : mise à l'échelle 1/2, 1/4 ou 1/8 pendant la
+décompression), juste assez grande pour l'entrée du modèle et la vignette
+d'affichage, applique l'orientation EXIF puis produit en une seule passe :
+
+- le tableau normalisé (3, 224, 224) attendu par le modèle image ;
+- une vignette JPEG légère pour ``st.image`` ;
+- une empreinte perceptuelle (pHash 64 bits) de ce tableau, stable au
+  réencodage et au redimensionnement, pour reconnaître une photo déjà
+  analysée (``rakuten_classifier.duplicates``).
+
+Le résultat est calculé une fois par téléversement et réutilisé ensuite.
+"""
+import hashlib
+import io
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from . import metrics
+
+IMAGE_SIZE = 224
+RESIZE_SIZE = 256
+THUMBNAIL_SIZE = 512
+THUMBNAIL_QUALITY = 85
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+HASH_SIZE = 8
+HASH_GRID = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, np.newaxis]
+    matrix = np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(HASH_GRID)
+# Luminance de l'image d'origine, à une constante près, depuis les canaux normalisés
+_LUMA = (np.array([0.299, 0.587, 0.114], dtype=np.float32) * IMAGENET_STD)[:, np.newaxis, np.newaxis]
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """Image décodée une fois : empreinte, entrée du modèle et vignette"""
+    digest: str
+    array: np.ndarray
+    thumbnail: bytes
+    # Inconnus pour une image restaurée depuis le cache de téléversements (rakuten_classifier.blobs)
+    original_size: tuple = None
+    decoded_size: tuple = None
+    decode_seconds: float = 0.0
+    phash: int = None
+
+
+def content_digest(data):
+    """Empreinte SHA-256 du contenu brut téléversé"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def decode(data, min_size=max(RESIZE_SIZE, THUMBNAIL_SIZE)):
+    """Décoder en RGB à la plus petite échelle JPEG couvrant min_size, orientation EXIF appliquée"""
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    if image.format == "JPEG":
+        image.draft("RGB", (min_size, min_size))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image, original_size
+
+
+def preprocess(image):
+    """Image PIL → tableau (3, 224, 224) normalisé (côté court à 256 puis recadrage central)"""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    width, height = image.size
+    scale = RESIZE_SIZE / min(width, height)
+    size = (max(IMAGE_SIZE, round(width * scale)), max(IMAGE_SIZE, round(height * scale)))
+    image = image.resize(size, Image.BILINEAR, reducing_gap=3.0)
+    left = (image.width - IMAGE_SIZE) // 2
+    top = (image.height - IMAGE_SIZE) // 2
+    image = image.crop((left, top, left + IMAGE_SIZE, top + IMAGE_SIZE))
+
+    array = np.asarray(image, dtype=np.float32)
+    array *= 1.0 / 255.0
+    array -= IMAGENET_MEAN
+    array /= IMAGENET_STD
+    return np.ascontiguousarray(array.transpose(2, 0, 1))
+
+
+def perceptual_hash(array):
+    """pHash 64 bits d'un tableau (3, 224, 224) : signe des basses fréquences DCT par rapport à leur médiane"""
+    gray = (array * _LUMA).sum(axis=0)
+    # 224 = 32 × 7 : moyenne par blocs de 7 × 7 pixels
+    step = gray.shape[0] // HASH_GRID
+    grid = gray[:step * HASH_GRID, :step * HASH_GRID].reshape(HASH_GRID, step, HASH_GRID, step).mean(axis=(1, 3))
+    low = (_DCT @ grid @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # Composante continue exclue de la médiane : elle ne dit rien de la forme
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def make_thumbnail(image, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """Vignette JPEG (côté long ≤ size) pour l'affichage"""
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size), Image.BILINEAR, reducing_gap=3.0)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_image(data, digest=None):
+    """Décoder un téléversement une seule fois et produire tout ce dont l'app a besoin"""
+    start = time.perf_counter()
+    image, original_size = decode(data)
+    array = preprocess(image)
+    thumbnail = make_thumbnail(image)
+    # Durée déjà mesurée pour PreparedImage : reprise telle quelle par les métriques
+    metrics.observe("decode", time.perf_counter() - start)
+    return PreparedImage(
+        digest=digest or content_digest(data),
+        array=array,
+        thumbnail=thumbnail,
+        original_size=original_size,
+        decoded_size=image.size,
+        decode_seconds=time.perf_counter() - start,
+        phash=perceptual_hash(array),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Décodage complet vs décodage réduit d'une photo")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as handle:
+        payload = handle.read()
+
+    start = time.perf_counter()
+    full = ImageOps.exif_transpose(Image.open(io.BytesIO(payload))).convert("RGB")
+    preprocess(full)
+    full_seconds = time.perf_counter() - start
+
+    prepared = prepare_image(payload)
+    print(json.dumps({
+        "original_size": prepared.original_size,
+        "full_decode_seconds": full_seconds,
+        "full_decode_mib": full.width * full.height * 3 / 2 ** 20,
+        "draft_decode_seconds": prepared.decode_seconds,
+        "draft_decode_mib": prepared.decoded_size[0] * prepared.decoded_size[1] * 3 / 2 ** 20,
+        "thumbnail_kib": len(prepared.thumbnail) / 1024,
+    }, indent=2))
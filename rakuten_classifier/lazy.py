@@ -0,0 +1,166 @@
+"""Imports différés des dépendances lourdes (torch, torchvision...).
+
+La page et la classification texte n'ont pas besoin de torch : ``lazy_import``
+renvoie un mandataire qui n'importe réellement le module qu'au premier accès à
+l'un de ses attributs. ``preload_in_background`` permet de lancer cet import
+dans un thread, juste après le premier affichage de la page, pour que la
+première requête image ne paie pas ce coût.
+
+Les durées d'import réellement payées par le processus sont consignées dans
+``import_times()``. ``python -m rakuten_classifier.lazy`` mesure le coût de
+chaque dépendance lourde (durée et mémoire résidente) dans un interpréteur neuf.
+"""
+import importlib
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Dépendances dont le coût d'import est rapporté
+HEAVY_MODULES = (
+    "numpy",
+    "scipy.sparse",
+    "PIL.Image",
+    "joblib",
+    "sklearn",
+    "pandas",
+    "streamlit",
+    "torch",
+    "torchvision",
+)
+
+_import_times = {}
+_import_lock = threading.RLock()
+_preload_lock = threading.Lock()
+_preload_threads = {}
+
+
+def import_module(name):
+    """Importer un module en consignant la durée de l'import s'il n'était pas chargé"""
+    # Le verrou sérialise les imports différés : un thread qui demande torch pendant
+    # son préchargement attend la fin de l'import au lieu d'obtenir un module partiel
+    with _import_lock:
+        already_loaded = name in sys.modules
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        if not already_loaded:
+            _import_times[name] = time.perf_counter() - start
+            logger.info("Import de %s : %.2f s", name, _import_times[name])
+        return module
+
+
+def import_times():
+    """Durées (secondes) des imports différés effectués par ce processus"""
+    return dict(_import_times)
+
+
+def is_loaded(name):
+    return name in sys.modules
+
+
+class LazyModule:
+    """Mandataire qui importe le module au premier accès à un attribut"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "chargé" if is_loaded(self.__dict__["_name"]) else "différé"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_import(name):
+    """Mandataire qui chargera le module au premier usage"""
+    return LazyModule(name)
+
+
+def preload_in_background(*names):
+    """Importer des modules dans un thread démon, une seule fois par processus"""
+    started = []
+    with _preload_lock:
+        for name in names:
+            if is_loaded(name) or name in _preload_threads:
+                continue
+            thread = threading.Thread(target=_preload, args=(name,), name=f"preload-{name}", daemon=True)
+            _preload_threads[name] = thread
+            thread.start()
+            started.append(thread)
+    return started
+
+
+def _preload(name):
+    try:
+        import_module(name)
+    except Exception:
+        logger.exception("Préchargement de %s impossible", name)
+
+
+_MEASURE_SNIPPET = """
+import importlib, json, os, resource, time
+
+def rss_kib():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+rss = rss_kib()
+start = time.perf_counter()
+importlib.import_module({name!r})
+print(json.dumps({{"seconds": time.perf_counter() - start, "rss_kib": rss_kib() - rss}}))
+"""
+
+
+def measure_import(name):
+    """Coût d'import d'un module dans un interpréteur neuf (durée, RSS ajoutée)"""
+    proc = subprocess.run([sys.executable, "-c", _MEASURE_SNIPPET.format(name=name)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"module": name, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "échec"}
+    return {"module": name, **json.loads(proc.stdout.strip().splitlines()[-1])}
+
+
+def import_report(names=HEAVY_MODULES):
+    """Mesurer chaque dépendance lourde isolément"""
+    return [measure_import(name) for name in names]
+
+
+def format_report(rows):
+    lines = [f"{'module':<16}{'durée (s)':>12}{'RSS (Mio)':>12}"]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['module']:<16}{'—':>12}{'—':>12}  {row['error']}")
+        else:
+            lines.append(f"{row['module']:<16}{row['seconds']:>12.3f}{row['rss_kib'] / 1024:>12.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Coût d'import des dépendances lourdes")
+    parser.add_argument("modules", nargs="*", default=list(HEAVY_MODULES))
+    parser.add_argument("--json", action="store_true", help="sortie JSON")
+    args = parser.parse_args()
+
+    report = import_report(args.modules)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
@@ -0,0 +1,325 @@
+"""Apprentissage incrémental à partir des corrections, avec remplacement à chaud.
+
+Un thread lit périodiquement les nouvelles corrections de la base de retours
+(``rakuten_classifier.feedback``). Dès qu'un mini-lot de
+``RAKUTEN_LEARNER_BATCH_SIZE`` corrections est disponible, un modèle candidat
+est dérivé du modèle servi, sans réentraînement complet :
+
+- ``LogisticRegression`` : quelques époques de descente de gradient
+  (entropie croisée softmax) partant des coefficients actuels, avec un rappel
+  L2 vers ces coefficients pour ne pas oublier l'entraînement initial ;
+- forêts d'arbres : quelques arbres supplémentaires ajustés sur le mini-lot
+  viennent compléter les arbres existants, partagés sans copie. Au-delà de
+  ``RAKUTEN_LEARNER_MAX_TREES`` arbres ajoutés (100), les plus anciens ajouts
+  sont remplacés : la forêt, sa mémoire et sa latence restent bornées.
+
+Le candidat est validé sur les corrections mises de côté (une sur cinq) et,
+si ``RAKUTEN_LEARNER_HOLDOUT`` désigne un CSV annoté (``designation``,
+``description``, ``category``), sur ce jeu fixe. Il n'est publié que si sa
+précision ne baisse pas de plus de ``RAKUTEN_LEARNER_TOLERANCE``. Son moteur
+est construit dans ce thread puis publié par une simple affectation dans le
+registre : les requêtes en cours ne sont pas bloquées et la page n'est pas
+rechargée. ``rollback`` rétablit instantanément le modèle précédent, dont le
+moteur est encore en mémoire.
+
+Les mises à jour ne vivent qu'en mémoire : rien n'est réécrit sur disque, et
+un redémarrage repart des artefacts d'origine (les corrections restent dans la
+base et sont rejouées). Chaque processus (réplique, worker) apprend de son
+côté, à son rythme : deux répliques peuvent servir des modèles différents.
+
+Activé par ``RAKUTEN_LEARNER=1`` dans l'application et le serveur HTTP.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from .categories import category_index
+from .config import env_flag, env_float, env_int
+from .engine import TextEngine, build_text, get_engine, pad_features, register_engine
+from .registry import ModelBundle, get_registry
+
+logger = logging.getLogger(__name__)
+
+LEARNER_ENABLED = env_flag("RAKUTEN_LEARNER", False)
+BATCH_SIZE = env_int("RAKUTEN_LEARNER_BATCH_SIZE", 32)
+INTERVAL_SECONDS = env_float("RAKUTEN_LEARNER_INTERVAL", 30.0)
+TOLERANCE = env_float("RAKUTEN_LEARNER_TOLERANCE", 0.0)
+TREES_PER_BATCH = env_int("RAKUTEN_LEARNER_TREES", 5)
+MAX_EXTRA_TREES = env_int("RAKUTEN_LEARNER_MAX_TREES", 100)
+HOLDOUT_PATH = os.environ.get("RAKUTEN_LEARNER_HOLDOUT")
+# Une correction sur VALIDATION_EVERY est réservée à la validation
+VALIDATION_EVERY = 5
+MAX_VALIDATION_ROWS = 5000
+
+
+def class_positions(model):
+    """Index dans CATEGORIES → position de la classe dans ``model.classes_``"""
+    positions = {}
+    for position, label in enumerate(model.classes_):
+        index = category_index(label)
+        if index is not None:
+            positions[index] = position
+    return positions
+
+
+def update_linear(model, X, y, epochs=5, learning_rate=0.2, l2=0.5, batch_size=32, seed=0):
+    """Copie de ``model`` (multinomial) ajustée par mini-lots, partant de ses coefficients"""
+    coef = np.array(model.coef_, dtype=np.float64)
+    if coef.shape[0] != len(model.classes_):
+        raise ValueError("Mise à jour incrémentale : régression logistique multiclasse attendue")
+    intercept = np.array(model.intercept_, dtype=np.float64)
+    anchor, intercept_anchor = coef.copy(), intercept.copy()
+    targets = np.eye(len(model.classes_))[y]
+    rng = np.random.default_rng(seed)
+
+    for _ in range(epochs):
+        order = rng.permutation(X.shape[0])
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            scores = np.asarray(X[rows] @ coef.T) + intercept
+            scores -= scores.max(axis=1, keepdims=True)
+            proba = np.exp(scores)
+            proba /= proba.sum(axis=1, keepdims=True)
+            error = (proba - targets[rows]) / len(rows)
+            coef -= learning_rate * (np.asarray(X[rows].T @ error).T + l2 * (coef - anchor))
+            intercept -= learning_rate * (error.sum(axis=0) + l2 * (intercept - intercept_anchor))
+
+    updated = copy.copy(model)
+    updated.coef_ = coef
+    updated.intercept_ = intercept
+    return updated
+
+
+def update_forest(model, X, y, n_trees=TREES_PER_BATCH, seed=0, max_extra=MAX_EXTRA_TREES):
+    """Copie de ``model`` avec ``n_trees`` arbres de plus, ajustés sur (X, y).
+
+    Une ligne de poids nul par classe garantit que les nouveaux arbres
+    connaissent toutes les classes du modèle, dans le même ordre. Au-delà de
+    ``max_extra`` arbres ajoutés, les ajouts les plus anciens sont retirés ;
+    les arbres d'origine sont toujours conservés.
+    """
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+    n_classes = len(model.classes_)
+    X_all = sp.vstack([X, sp.csr_matrix((n_classes, X.shape[1]))]).tocsr()
+    y_all = np.concatenate([y, np.arange(n_classes)])
+    weights = np.concatenate([np.ones(len(y)), np.zeros(n_classes)])
+
+    cls = ExtraTreesClassifier if type(model).__name__ == "ExtraTreesClassifier" else RandomForestClassifier
+    extra = cls(n_estimators=n_trees, max_features=model.max_features, min_samples_leaf=model.min_samples_leaf,
+                max_depth=model.max_depth, random_state=seed)
+    extra.fit(X_all, y_all, sample_weight=weights)
+
+    # Nombre d'arbres du modèle d'origine, transmis d'une mise à jour à la suivante
+    base = getattr(model, "n_base_estimators_", len(model.estimators_))
+    added = (list(model.estimators_[base:]) + list(extra.estimators_))[-max_extra:] if max_extra > 0 else []
+
+    updated = copy.copy(model)
+    # Les arbres existants sont partagés (lecture seule), seuls les nouveaux sont alloués
+    updated.estimators_ = list(model.estimators_[:base]) + added
+    updated.n_estimators = len(updated.estimators_)
+    updated.n_base_estimators_ = base
+    return updated
+
+
+def update_model(model, X, y, seed=0):
+    """Modèle candidat dérivé de ``model`` pour le mini-lot (X, y)"""
+    name = type(model).__name__
+    if name == "LogisticRegression":
+        return update_linear(model, X, y, seed=seed)
+    if name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        return update_forest(model, X, y, seed=seed)
+    raise TypeError(f"Mise à jour incrémentale non prise en charge pour {name}")
+
+
+def accuracy(engine, texts, targets):
+    if not len(targets):
+        return None
+    return float((engine.predict_proba(texts).argmax(axis=1) == np.asarray(targets)).mean())
+
+
+@dataclass
+class UpdateReport:
+    version: str
+    accepted: bool
+    train_rows: int
+    validation_rows: int
+    accuracy_before: Optional[float]
+    accuracy_after: Optional[float]
+    seconds: float
+    reason: str = ""
+
+
+class IncrementalLearner:
+    """Consomme les corrections par mini-lots et publie les modèles validés"""
+
+    def __init__(self, registry=None, store=None, batch_size=BATCH_SIZE, interval=INTERVAL_SECONDS,
+                 tolerance=TOLERANCE, holdout_path=HOLDOUT_PATH):
+        self.registry = registry or get_registry()
+        self._store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.tolerance = tolerance
+        self.holdout_path = holdout_path
+        self.last_id = 0
+        self.updates = 0
+        self.reports = []
+        self._train = []
+        self._validation = []
+        self._holdout = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            from .feedback import get_feedback_store
+
+            self._store = get_feedback_store()
+        return self._store
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="incremental-learner", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception:
+                logger.exception("Échec de la mise à jour incrémentale")
+
+    def rollback(self):
+        """Rétablir le modèle précédent (moteur déjà construit)"""
+        return self.registry.rollback()
+
+    def stats(self):
+        return {
+            "updates": self.updates,
+            "last_correction_id": self.last_id,
+            "pending": len(self._train),
+            "validation_rows": len(self._validation),
+            "model_version": self.registry.get().version,
+            "history": self.registry.history,
+            "last_report": asdict(self.reports[-1]) if self.reports else None,
+        }
+
+    def step(self):
+        """Lire les nouvelles corrections ; mettre à jour si un mini-lot est complet"""
+        with self._lock:
+            self._consume()
+            if len(self._train) < self.batch_size:
+                return None
+            batch, self._train = self._train, []
+            report = self._update(batch)
+            self.reports = (self.reports + [report])[-50:]
+            return report
+
+    def _consume(self):
+        while True:
+            rows = self.store.read_after(self.last_id, limit=1000)
+            if not rows:
+                return
+            for row in rows:
+                sample = (build_text(row["designation"], row["description"]), row["corrected_index"])
+                if row["id"] % VALIDATION_EVERY == 0:
+                    self._validation = (self._validation + [sample])[-MAX_VALIDATION_ROWS:]
+                else:
+                    self._train.append(sample)
+            self.last_id = rows[-1]["id"]
+
+    def _validation_set(self, positions):
+        samples = list(self._validation) + self._holdout_samples()
+        samples = [(text, positions[index]) for text, index in samples if index in positions]
+        return [text for text, _ in samples], [target for _, target in samples]
+
+    def _holdout_samples(self):
+        if self._holdout is None:
+            self._holdout = []
+            if self.holdout_path:
+                import pandas as pd
+
+                from .categories import CATEGORY_INDEX, display_label
+
+                frame = pd.read_csv(self.holdout_path, dtype=str, keep_default_na=False)
+                for row in frame.to_dict("records"):
+                    index = CATEGORY_INDEX.get(display_label(row.get("category", "")))
+                    if index is not None:
+                        self._holdout.append((build_text(row.get("designation", ""), row.get("description", "")),
+                                              index))
+        return self._holdout
+
+    def _update(self, batch):
+        start = time.perf_counter()
+        bundle = self.registry.get()
+        engine = get_engine(self.registry)
+        positions = class_positions(bundle.model)
+        # Catégories absentes du modèle (pas de classe à ajuster) : ignorées
+        batch = [(text, positions[index]) for text, index in batch if index in positions]
+        version = f"{bundle.version.split('+')[0]}+u{self.updates + 1}"
+
+        def report(accepted, before=None, after=None, reason=""):
+            validation_rows = len(self._validation_set(positions)[1])
+            return UpdateReport(version, accepted, len(batch), validation_rows, before, after,
+                                time.perf_counter() - start, reason)
+
+        if not batch:
+            return report(False, reason="aucune correction vers une classe du modèle")
+
+        X = pad_features(engine.featurizer.transform([text for text, _ in batch]), engine.kernel.n_features)
+        y = np.array([target for _, target in batch])
+        candidate = update_model(bundle.model, X, y, seed=self.updates)
+        candidate_engine = TextEngine(ModelBundle(bundle.vectorizer, candidate, version, time.time(), 0.0),
+                                      cache_dir=None)
+
+        texts, targets = self._validation_set(positions)
+        if not targets:
+            return report(False, reason="pas encore de corrections de validation")
+        before = accuracy(engine, texts, targets)
+        after = accuracy(candidate_engine, texts, targets)
+        if after < before - self.tolerance:
+            logger.info("Modèle %s rejeté : précision %.3f → %.3f", version, before, after)
+            return report(False, before, after, "précision de validation en baisse")
+
+        if self.registry.get().version != bundle.version:
+            return report(False, before, after, "modèle remplacé pendant la mise à jour")
+        # Moteur prêt avant la publication : aucune requête ne le construit
+        register_engine(candidate_engine)
+        self.registry.publish(candidate, version)
+        self.updates += 1
+        logger.info("Modèle %s publié : précision %.3f → %.3f (%d corrections)", version, before, after, len(batch))
+        return report(True, before, after)
+
+
+_learner = None
+_learner_lock = threading.Lock()
+
+
+def get_learner():
+    """Apprenant du processus (démarré par l'application si ``RAKUTEN_LEARNER=1``)"""
+    global _learner
+    if _learner is None:
+        with _learner_lock:
+            if _learner is None:
+                _learner = IncrementalLearner()
+    return _learner
+
+
+def start_if_enabled():
+    if LEARNER_ENABLED:
+        get_learner().start()
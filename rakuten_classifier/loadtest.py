@@ -0,0 +1,465 @@
+"""Banc de charge de l'application Streamlit : N sessions vendeur simultanées.
+
+Chaque session simulée se comporte comme un navigateur : elle ouvre le
+websocket ``/_stcore/stream``, envoie les mêmes messages ``BackMsg`` (état de
+tous les widgets, fragment concerné) et téléverse ses photos par
+``/_stcore/upload_file``. Un scénario vendeur enchaîne :
+
+1. téléversement d'une photo de taille réaliste (1 à 12 Mpx) ;
+2. saisie de la désignation puis de la description ;
+3. clic sur « Classifier » ;
+4. « Modifier la catégorie », choix d'une catégorie, confirmation ;
+5. retrait de l'image, puis scénario suivant.
+
+La latence d'une réexécution va de l'envoi du message à la fin du script
+(``script_finished``), fragments et ``st.rerun`` compris. Pour chaque palier
+de concurrence, le rapport donne p50 / p95 / p99 par action et au total, le
+débit (annonces classées et réexécutions par seconde), les erreurs, et le CPU
+et la mémoire résidente de chaque processus du serveur (processus Streamlit
+et workers du pool image), lus dans ``/proc`` (Linux).
+
+Sans ``--url``, le banc lance lui-même ``python -m rakuten_classifier app``
+et attend ``/ready`` (fin de la chauffe) :
+
+    python -m rakuten_classifier loadtest --sessions 1 2 4 8 16 --duration 30 -o charge.json
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+
+from .benchmark import environment, synthetic_image, synthetic_listings
+
+# Photos de téléphone et d'appareil : 1,1 Mpx, 6 Mpx, 12 Mpx
+IMAGE_SIZES = ((1200, 900), (3000, 2000), (4000, 3000))
+DEFAULT_LEVELS = (1, 2, 4, 8, 16)
+QUANTILES = (50, 95, 99)
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+XSRF_COOKIE = "_streamlit_xsrf"
+
+
+class SessionError(RuntimeError):
+    """Réexécution en erreur ou widget attendu absent"""
+
+
+def _finished_statuses():
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    return (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+
+def _multipart(name, data, content_type="image/jpeg"):
+    boundary = uuid.uuid4().hex
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n").encode()
+    return head + data + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+class SessionClient:
+    """Client websocket qui rejoue le protocole du navigateur pour une session"""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.websocket = None
+        self.session_id = None
+        self.xsrf = None
+        self.page_script_hash = ""
+        # id → (type, libellé, fragment) des widgets affichés, et état envoyé à chaque réexécution
+        self.widgets = {}
+        self.state = {}
+
+    def _fetch_xsrf(self):
+        # Cookie posé par /_stcore/health ; renvoyé en en-tête avec chaque téléversement
+        with urllib.request.urlopen(f"{self.url}/_stcore/health") as response:
+            for header in response.headers.get_all("Set-Cookie") or []:
+                name, _, value = header.split(";", 1)[0].partition("=")
+                if name.strip() == XSRF_COOKIE:
+                    return value
+        return None
+
+    async def connect(self):
+        import websockets
+
+        self.xsrf = await asyncio.to_thread(self._fetch_xsrf)
+        parsed = urlparse(self.url)
+        scheme = "wss" if parsed.scheme == "https" else "ws"
+        self.websocket = await websockets.connect(f"{scheme}://{parsed.netloc}{parsed.path}/_stcore/stream",
+                                                  subprotocols=["streamlit"], max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def _send(self, message):
+        await self.websocket.send(message.SerializeToString())
+
+    async def _receive(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = ForwardMsg()
+        message.ParseFromString(await self.websocket.recv())
+        return message
+
+    async def rerun(self, fragment_id="", trigger=None):
+        """Réexécuter le script (ou un fragment) ; durée jusqu'à ``script_finished``"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        message = BackMsg()
+        client_state = message.rerun_script
+        client_state.page_script_hash = self.page_script_hash
+        client_state.fragment_id = fragment_id
+        for state in self.state.values():
+            client_state.widget_states.widgets.append(state)
+        if trigger is not None:
+            client_state.widget_states.widgets.add(id=trigger, trigger_value=True)
+
+        finished = _finished_statuses()
+        seen = set()
+        errors = []
+        full_run = not fragment_id
+        start = time.perf_counter()
+        await self._send(message)
+        while True:
+            forward = await self._receive()
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = self.session_id or forward.new_session.initialize.session_id
+                self.page_script_hash = forward.new_session.page_script_hash
+                if not forward.new_session.fragment_ids_this_run:
+                    # Exécution complète (éventuellement relancée par st.rerun depuis un fragment)
+                    full_run = True
+                    seen.clear()
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._track(forward.delta.new_element, forward.delta.fragment_id, seen, errors)
+            elif kind == "script_finished" and forward.script_finished in finished:
+                break
+        seconds = time.perf_counter() - start
+        if full_run:
+            # Comme le navigateur : seuls les widgets de la dernière exécution complète gardent un état
+            self.widgets = {key: value for key, value in self.widgets.items() if key in seen}
+            self.state = {key: value for key, value in self.state.items() if key in seen}
+        if errors:
+            raise SessionError(errors[0])
+        return seconds
+
+    def _track(self, element, fragment_id, seen, errors):
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            errors.append(f"{element.exception.type}: {element.exception.message}")
+        elif kind == "alert" and element.alert.format == element.alert.ERROR:
+            errors.append(element.alert.body)
+        elif kind in ("button", "text_input", "text_area", "file_uploader", "number_input"):
+            widget = getattr(element, kind)
+            self.widgets.pop(widget.id, None)
+            self.widgets[widget.id] = (kind, widget.label, fragment_id)
+            seen.add(widget.id)
+
+    def find(self, kind, key=None, label=None):
+        """Dernier widget affiché de ce type, par clé (préfixe si elle finit par « _ ») ou libellé"""
+        for widget_id, (widget_kind, widget_label, fragment_id) in reversed(self.widgets.items()):
+            if widget_kind != kind:
+                continue
+            # Identifiant « $$ID-<empreinte>-<clé utilisateur> »
+            user_key = widget_id.split("-", 2)[-1]
+            if key is not None and user_key != key and not (key.endswith("_") and user_key.startswith(key)):
+                continue
+            if label is not None and label not in widget_label:
+                continue
+            return widget_id, fragment_id
+        raise SessionError(f"Widget introuvable : {kind} {key or label}")
+
+    async def click(self, label=None, key=None):
+        widget_id, fragment_id = self.find("button", key=key, label=label)
+        return await self.rerun(fragment_id, trigger=widget_id)
+
+    async def type(self, key, text, kind="text_input"):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id, fragment_id = self.find(kind, key=key)
+        self.state[widget_id] = WidgetState(id=widget_id, string_value=text)
+        return await self.rerun(fragment_id)
+
+    async def upload(self, key, name, data):
+        """Demander une URL de dépôt, envoyer le fichier, puis réexécuter avec l'état du widget"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id, fragment_id = self.find("file_uploader", key=key)
+        request_id = uuid.uuid4().hex
+        message = BackMsg()
+        message.file_urls_request.request_id = request_id
+        message.file_urls_request.file_names.append(name)
+        message.file_urls_request.session_id = self.session_id
+        await self._send(message)
+        while True:
+            forward = await self._receive()
+            if (forward.WhichOneof("type") == "file_urls_response"
+                    and forward.file_urls_response.response_id == request_id):
+                break
+        response = forward.file_urls_response
+        if response.error_msg:
+            raise SessionError(response.error_msg)
+        urls = response.file_urls[0]
+
+        body, content_type = _multipart(name, data)
+        headers = {"Content-Type": content_type}
+        if self.xsrf:
+            headers.update({"Cookie": f"{XSRF_COOKIE}={self.xsrf}", "X-Xsrftoken": self.xsrf})
+        request = urllib.request.Request(f"{self.url}{urls.upload_url}", data=body, method="PUT", headers=headers)
+        await asyncio.to_thread(lambda: urllib.request.urlopen(request).close())
+
+        state = WidgetState(id=widget_id)
+        info = state.file_uploader_state_value.uploaded_file_info.add(name=name, size=len(data),
+                                                                        file_id=urls.file_id)
+        info.file_urls.CopyFrom(urls)
+        self.state[widget_id] = state
+        return await self.rerun(fragment_id)
+
+
+async def seller_scenario(client, image, listing, category, record):
+    """Un vendeur : photo, désignation, description, classification, correction, retrait"""
+    designation, description = listing
+    record("upload", await client.upload("product_image_", "photo.jpg", image))
+    record("designation", await client.type("designation", designation))
+    record("description", await client.type("description", description, kind="text_area"))
+    record("classify", await client.click(label="Classifier automatiquement"))
+    record("open_selector", await client.click(label="Modifier la catégorie"))
+    record("pick_category", await client.click(key=f"cat_btn_{category}"))
+    record("confirm", await client.click(label="Confirmer cette correction"))
+    record("remove_image", await client.click(label="Retirer l'image"))
+
+
+async def _session_loop(url, deadline, images, listings, seed, record, counts):
+    rng = np.random.default_rng(seed)
+    client = SessionClient(url)
+    try:
+        record("connect", await client.connect())
+        while time.perf_counter() < deadline:
+            try:
+                await seller_scenario(client, images[rng.integers(len(images))],
+                                      listings[rng.integers(len(listings))], int(rng.integers(14)), record)
+                counts["scenarios"] += 1
+            except SessionError as e:
+                counts["errors"] += 1
+                counts["last_error"] = str(e)
+                # État incertain : nouvelle session, comme un vendeur qui recharge la page
+                await client.close()
+                client = SessionClient(url)
+                record("connect", await client.connect())
+    finally:
+        await client.close()
+
+
+def _children(pid):
+    """Descendants d'un processus (workers du pool image), depuis /proc"""
+    parents = {}
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                stat = (entry / "stat").read_text()
+            except OSError:
+                continue
+            parents.setdefault(int(stat.rsplit(")", 1)[1].split()[1]), []).append(int(entry.name))
+    found, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def _process_sample(pid):
+    """(secondes CPU, RSS en octets, nom) d'un processus, None s'il a disparu"""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    rss = next((int(line.split()[1]) * 1024 for line in status.splitlines() if line.startswith("VmRSS:")), 0)
+    name = next((line.split()[1] for line in status.splitlines() if line.startswith("Name:")), "?")
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), rss, name
+
+
+class ProcessSampler:
+    """CPU et RSS (moyen et maximal) du serveur et de ses descendants pendant un palier"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = {}
+        self._peak = {}
+        self._rss = {}
+        self._names = {}
+
+    def _pids(self):
+        return [self.pid] + _children(self.pid)
+
+    def _sample(self):
+        samples = {}
+        for pid in self._pids():
+            sample = _process_sample(pid)
+            if sample is not None:
+                samples[pid] = sample
+                self._names[pid] = sample[2]
+                self._peak[pid] = max(self._peak.get(pid, 0), sample[1])
+                self._rss.setdefault(pid, []).append(sample[1])
+        return samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._start = {pid: sample[0] for pid, sample in self._sample().items()}
+        self._thread = threading.Thread(target=self._run, name="loadtest-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._end = self._sample()
+        self._wall = time.perf_counter() - self._wall
+
+    def report(self):
+        processes = []
+        for pid, (cpu, rss, _) in sorted(self._end.items()):
+            processes.append({
+                "pid": pid,
+                "role": "server" if pid == self.pid else "worker",
+                "name": self._names.get(pid),
+                "cpu_percent": (cpu - self._start.get(pid, 0.0)) / self._wall * 100,
+                "rss_mb": float(np.mean(self._rss[pid])) / 2 ** 20,
+                "peak_rss_mb": self._peak[pid] / 2 ** 20,
+            })
+        return processes
+
+
+def latency_summary(samples):
+    """Nombre, p50 / p95 / p99 et maximum (ms) d'une liste de durées en secondes"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1e3
+    return {"count": len(values), **{f"p{q}_ms": float(np.percentile(values, q)) for q in QUANTILES},
+            "max_ms": float(values.max())}
+
+
+def run_level(url, sessions, duration, images, listings, pid=None, seed=0):
+    """Un palier : ``sessions`` vendeurs simultanés pendant ``duration`` secondes"""
+    samples = {}
+    counts = {"scenarios": 0, "errors": 0}
+
+    def record(action, seconds):
+        samples.setdefault(action, []).append(seconds)
+
+    async def level():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(_session_loop(url, deadline, images, listings, seed * 1000 + i, record, counts)
+                               for i in range(sessions)))
+
+    sampler = ProcessSampler(pid) if pid else None
+    start = time.perf_counter()
+    if sampler is not None:
+        with sampler:
+            asyncio.run(level())
+    else:
+        asyncio.run(level())
+    elapsed = time.perf_counter() - start
+
+    reruns = [seconds for action, values in samples.items() if action != "connect" for seconds in values]
+    return {
+        "sessions": sessions,
+        "seconds": elapsed,
+        "scenarios": counts["scenarios"],
+        "errors": counts["errors"],
+        "last_error": counts.get("last_error"),
+        "listings_per_second": counts["scenarios"] / elapsed,
+        "reruns_per_second": len(reruns) / elapsed,
+        "rerun": latency_summary(reruns),
+        "actions": {action: latency_summary(values) for action, values in sorted(samples.items())},
+        "processes": sampler.report() if sampler is not None else [],
+    }
+
+
+def _wait_for(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} injoignable après {timeout:.0f} s")
+
+
+def start_server(port=8599, ready_port=8598, timeout=300, random_weights=False):
+    """Lancer l'application chauffée et attendre qu'elle soit prête"""
+    env = dict(os.environ)
+    if random_weights:
+        # Hors ligne : mêmes calculs que les vrais poids, sans téléchargement (vision.WEIGHTS)
+        env["RAKUTEN_VISION_WEIGHTS"] = "random"
+    process = subprocess.Popen([sys.executable, "-m", "rakuten_classifier", "app", "--port", str(port),
+                                "--ready-port", str(ready_port)], cwd=APP_PATH.parent, env=env)
+    try:
+        _wait_for(f"http://127.0.0.1:{port}/_stcore/health", timeout)
+        _wait_for(f"http://127.0.0.1:{ready_port}/ready", timeout)
+    except BaseException:
+        process.terminate()
+        raise
+    return process
+
+
+def run_load_test(levels=DEFAULT_LEVELS, duration=30.0, url=None, pid=None, port=8599, n_images=12,
+                  sizes=IMAGE_SIZES, seed=0, random_weights=False):
+    """Paliers de concurrence croissants sur un serveur lancé ici (ou existant, ``url``).
+
+    ``random_weights`` : le serveur lancé ici charge des poids image aléatoires
+    (sans effet sur un serveur existant).
+    """
+    images = [synthetic_image(*sizes[i % len(sizes)], seed=seed + i) for i in range(n_images)]
+    listings = synthetic_listings(200, seed=seed)
+    process = None
+    if url is None:
+        process = start_server(port, port - 1, random_weights=random_weights)
+        url, pid = f"http://127.0.0.1:{port}", process.pid
+    try:
+        report = {"environment": environment(), "url": url, "duration": duration,
+                  "image_sizes": [list(size) for size in sizes], "images": n_images,
+                  "random_weights": random_weights and process is not None, "levels": []}
+        for i, sessions in enumerate(levels):
+            report["levels"].append(run_level(url, sessions, duration, images, listings, pid, seed + i))
+        return report
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def format_report(report):
+    lines = [f"{'sessions':>8} {'annonces/s':>10} {'réexéc./s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+             f"{'erreurs':>7} {'CPU %':>7} {'RSS Mo':>8}"]
+    for level in report["levels"]:
+        rerun = level["rerun"]
+        processes = level["processes"]
+        cpu = f"{sum(p['cpu_percent'] for p in processes):.0f}" if processes else "-"
+        rss = f"{sum(p['peak_rss_mb'] for p in processes):.0f}" if processes else "-"
+        quantiles = [f"{rerun.get(f'p{q}_ms', float('nan')):.0f}" for q in QUANTILES]
+        lines.append(f"{level['sessions']:>8} {level['listings_per_second']:>10.2f} "
+                     f"{level['reruns_per_second']:>10.1f} {quantiles[0]:>8} {quantiles[1]:>8} {quantiles[2]:>8} "
+                     f"{level['errors']:>7} {cpu:>7} {rss:>8}")
+    return "\n".join(lines)
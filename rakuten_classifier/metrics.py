@@ -0,0 +1,341 @@
+"""Mesure de la latence par étape et export au format Prometheus.
+
+Chaque étape de la classification (téléversement, décodage, vectorisation,
+prédiction, modèle image, cascade, rendu, réexécution complète) est chronométrée
+par ``stage(nom)`` et agrégée dans un histogramme à seaux fixes. Des compteurs
+(``increment``) suivent les appels aux modèles ; les statistiques des caches de
+prédiction, des micro-lots, de l'index de quasi-doublons et du cache de
+téléversements, ainsi que l'état de la chauffe (``warmup``), sont lues au
+moment de l'export.
+
+Désactivé par défaut : ``stage`` renvoie alors un contexte vide partagé et
+``increment`` retourne immédiatement, sans horloge ni verrou.
+
+- ``RAKUTEN_METRICS=1`` : activer la mesure ;
+- ``RAKUTEN_METRICS_FILE`` : fichier ``.prom`` réécrit toutes les
+  ``RAKUTEN_METRICS_INTERVAL`` secondes (10), pour le collecteur textfile de
+  node exporter ;
+- ``RAKUTEN_METRICS_PORT`` : point d'entrée HTTP local ``/metrics`` ;
+- ``RAKUTEN_METRICS_SIDEBAR=1`` : panneau de débogage dans la barre latérale
+  de l'application.
+
+Le serveur HTTP (``python -m rakuten_classifier serve``) expose aussi ``GET /metrics``.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .config import env_flag, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+ENABLED = env_flag("RAKUTEN_METRICS", False)
+METRICS_FILE = os.environ.get("RAKUTEN_METRICS_FILE")
+METRICS_PORT = env_int("RAKUTEN_METRICS_PORT", 0)
+WRITE_INTERVAL = env_float("RAKUTEN_METRICS_INTERVAL", 10.0)
+SIDEBAR = env_flag("RAKUTEN_METRICS_SIDEBAR", False)
+
+# Bornes supérieures des seaux (secondes), de 0,1 ms à 10 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Histogramme à seaux fixes (effectifs non cumulés, dernier seau : +Inf)"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def quantile(self, q):
+        """Estimation par interpolation linéaire dans le seau concerné"""
+        counts, count, _, maximum = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for upper, n in zip(self.buckets + (maximum,), counts):
+            if n and seen + n >= rank:
+                return lower + (min(upper, maximum) - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return maximum
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def stop(self):
+        pass
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class MetricsRegistry:
+    """Histogrammes par étape et compteurs étiquetés du processus"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histograms(self):
+        return dict(self._histograms)
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _registry
+
+
+def stage(name):
+    """Contexte chronométrant une étape (contexte vide si la mesure est désactivée)"""
+    if not ENABLED:
+        return _NOOP
+    return _Timer(_registry.histogram(name))
+
+
+def start(name):
+    """Chronomètre à arrêter avec ``.stop()``, pour une étape qui ne tient pas dans un bloc"""
+    if not ENABLED:
+        return _NOOP_TIMER
+    return _Timer(_registry.histogram(name))
+
+
+def observe(name, seconds):
+    """Ajouter une durée déjà mesurée à l'histogramme d'une étape"""
+    if ENABLED:
+        _registry.observe(name, seconds)
+
+
+def increment(name, amount=1, **labels):
+    if ENABLED:
+        _registry.increment(name, amount, **labels)
+
+
+def summary():
+    """Lignes (étape, nombre, moyenne, p50, p95, max en ms) pour l'affichage"""
+    rows = []
+    for name, histogram in sorted(_registry.histograms().items()):
+        _, count, total, maximum = histogram.snapshot()
+        if not count:
+            continue
+        rows.append({
+            "étape": name,
+            "appels": count,
+            "moyenne_ms": total / count * 1e3,
+            "p50_ms": histogram.quantile(0.5) * 1e3,
+            "p95_ms": histogram.quantile(0.95) * 1e3,
+            "max_ms": maximum * 1e3,
+        })
+    return rows
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Toutes les métriques au format texte d'exposition de Prometheus"""
+    from .blobs import blob_stats
+    from .cache import cache_stats
+    from .duplicates import duplicate_stats
+    from .microbatch import batcher_stats
+    from .warmup import is_ready, report
+
+    lines = [
+        "# HELP rakuten_stage_seconds Durée des étapes de classification.",
+        "# TYPE rakuten_stage_seconds histogram",
+    ]
+    for name, histogram in sorted(_registry.histograms().items()):
+        counts, count, total, _ = histogram.snapshot()
+        cumulative = 0
+        for upper, n in zip(histogram.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if upper == float("inf") else repr(upper)
+            lines.append(f'rakuten_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'rakuten_stage_seconds_sum{{stage="{name}"}} {total!r}')
+        lines.append(f'rakuten_stage_seconds_count{{stage="{name}"}} {count}')
+
+    counters = {}
+    for (name, labels), value in _registry.counters().items():
+        counters.setdefault(name, []).append((labels, value))
+    for name, samples in sorted(counters.items()):
+        lines.append(f"# TYPE rakuten_{name}_total counter")
+        lines.extend(f"rakuten_{name}_total{_labels(labels)} {_format_value(value)}" for labels, value in samples)
+
+    caches = cache_stats()
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        metric = f"rakuten_cache_{field}_total" if kind == "counter" else "rakuten_cache_entries"
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f'{metric}{{cache="{name}"}} {stats[field]}' for name, stats in sorted(caches.items()))
+
+    batchers = batcher_stats()
+    if batchers:
+        for field in ("batches", "items"):
+            lines.append(f"# TYPE rakuten_microbatch_{field}_total counter")
+            lines.extend(f'rakuten_microbatch_{field}_total{{batcher="{name}"}} {stats[field]}'
+                         for name, stats in sorted(batchers.items()))
+
+    blobs = blob_stats()
+    if blobs:
+        lines.append("# TYPE rakuten_blob_bytes gauge")
+        lines.extend(f'rakuten_blob_bytes{{tier="{tier}"}} {blobs[f"{tier}_bytes"]}' for tier in ("memory", "disk"))
+        lines.append("# TYPE rakuten_blob_sessions gauge")
+        lines.append(f"rakuten_blob_sessions {blobs['sessions']}")
+        for field in ("hits", "disk_hits", "misses", "spills", "evictions"):
+            lines.append(f"# TYPE rakuten_blob_{field}_total counter")
+            lines.append(f"rakuten_blob_{field}_total {blobs[field]}")
+
+    duplicates = duplicate_stats()
+    if duplicates:
+        lines.append("# TYPE rakuten_neardup_entries gauge")
+        lines.append(f"rakuten_neardup_entries {duplicates['size']}")
+        for field in ("hits", "exact_hits", "misses", "evictions"):
+            lines.append(f"# TYPE rakuten_neardup_{field}_total counter")
+            lines.append(f"rakuten_neardup_{field}_total {duplicates[field]}")
+
+    lines.append("# TYPE rakuten_ready gauge")
+    lines.append(f"rakuten_ready {int(is_ready())}")
+    warm = report()
+    for field in ("first_ms", "steady_p50_ms", "after_warmup_ms"):
+        paths = [(path, warm[path][field]) for path in ("text", "image") if field in warm.get(path, {})]
+        if paths:
+            metric = f"rakuten_warmup_{field[:-3]}_seconds"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f'{metric}{{path="{path}"}} {value / 1e3!r}' for path, value in paths)
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Écrire les métriques de façon atomique (le collecteur ne lit jamais un fichier partiel)"""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(render_prometheus(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+def _write_periodically(path, interval):
+    while True:
+        try:
+            write_textfile(path)
+        except OSError:
+            logger.exception("Écriture des métriques impossible dans %s", path)
+        time.sleep(interval)
+
+
+def start_exporter(path=METRICS_FILE, port=METRICS_PORT, interval=WRITE_INTERVAL):
+    """Démarrer une fois par processus l'écriture du fichier et/ou le point d'entrée HTTP"""
+    global _exporter_started
+    if not ENABLED or _exporter_started or not (path or port):
+        return
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+        if path:
+            threading.Thread(target=_write_periodically, args=(path, interval), name="metrics-textfile",
+                             daemon=True).start()
+        if port:
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError:
+                # Autre worker sur le même hôte : le port est déjà servi
+                logger.warning("Port de métriques %d indisponible", port)
+            else:
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
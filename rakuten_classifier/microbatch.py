@@ -0,0 +1,177 @@
+"""Regroupement des requêtes concurrentes en micro-lots.
+
+Streamlit exécute le script de chaque session dans son propre thread : sous
+charge, des dizaines de sessions appellent le modèle une ligne à la fois et se
+disputent le GIL. Un ``MicroBatcher`` place ces requêtes dans une file
+partagée ; un thread unique les regroupe (au plus ``max_batch_size`` requêtes,
+en attendant au plus ``max_wait`` secondes après la première) et les passe en
+un seul appel vectorisé. Chaque appelant reçoit un ``Future`` qui ne porte que
+son propre résultat.
+
+Pendant qu'un lot est calculé, les requêtes suivantes s'accumulent dans la
+file : plus la charge est forte, plus les lots sont gros, sans attente
+supplémentaire.
+
+Paramètres : ``RAKUTEN_MICROBATCH`` (activé par défaut),
+``RAKUTEN_MICROBATCH_MAX_SIZE`` (32) et ``RAKUTEN_MICROBATCH_MAX_WAIT_MS`` (2).
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .config import env_flag, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+ENABLED = env_flag("RAKUTEN_MICROBATCH", True)
+MAX_BATCH_SIZE = env_int("RAKUTEN_MICROBATCH_MAX_SIZE", 32)
+MAX_WAIT_SECONDS = env_float("RAKUTEN_MICROBATCH_MAX_WAIT_MS", 2.0) / 1000.0
+
+
+class MicroBatcher:
+    """File partagée qui appelle ``process(items) -> résultats`` par lots"""
+
+    def __init__(self, process, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT_SECONDS, name="microbatch"):
+        self.process = process
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def submit(self, item):
+        """Ajouter une requête à la file ; renvoie un ``Future``"""
+        if self._closed:
+            raise RuntimeError(f"{self.name} est arrêté")
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Soumettre une requête et attendre son résultat"""
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        """Arrêter le thread après les requêtes déjà en file"""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _collect(self, first):
+        """Premier élément + ce qui arrive avant l'échéance, dans la limite du lot"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Déjà en file : pris sans attendre ; sinon jusqu'à l'échéance
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [(item, future) for item, future in self._collect(first)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                results = self.process([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} : {len(results)} résultats pour {len(batch)} requêtes")
+            except BaseException as e:
+                logger.exception("Échec d'un micro-lot (%s)", self.name)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+def _predict_texts(texts):
+    from .engine import get_engine
+
+    engine = get_engine()
+    if len(texts) == 1:
+        return [engine.prediction(engine.predict_proba_one(texts[0]))]
+    return [engine.prediction(row) for row in engine.predict_proba(texts)]
+
+
+def _analyze_images(arrays):
+    import numpy as np
+
+    from . import metrics
+    from .image_pool import POOL_WORKERS, get_image_pool
+    from .vision import get_image_classifier
+
+    metrics.increment("model_calls", model="image")
+    with metrics.stage("image_forward"):
+        if POOL_WORKERS:
+            return get_image_pool().analyze_many(arrays)
+
+        classifier = get_image_classifier()
+        embeddings, proba = classifier.forward(np.stack(arrays))
+        return [(classifier.prediction(p), e) for p, e in zip(proba, embeddings)]
+
+
+_PROCESSORS = {"text": _predict_texts, "image": _analyze_images}
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(kind):
+    """Micro-lots du processus : ``text`` (textes → Prediction) ou ``image``
+    (tableaux prétraités → (Prediction, plongement))"""
+    if kind not in _PROCESSORS:
+        raise ValueError(f"Type de micro-lot inconnu : {kind}")
+    batcher = _batchers.get(kind)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.setdefault(kind, MicroBatcher(_PROCESSORS[kind], name=f"microbatch-{kind}"))
+    return batcher
+
+
+def batcher_stats():
+    return {kind: batcher.stats() for kind, batcher in _batchers.items()}
@@ -0,0 +1,182 @@
+"""Registre des artefacts du classifieur, chargés une seule fois par processus.
+
+Les deux pickles (vectoriseur TF-IDF et modèle) sont chargés avec
+``joblib.load(..., mmap_mode="r")`` : les tableaux numériques conservés tels
+quels par scikit-learn (``idf_``, ``coef_``...) restent projetés en mémoire, ce
+qui permet à plusieurs workers Streamlit d'un même hôte de partager les mêmes
+pages du cache disque au lieu d'en garder chacun une copie.
+
+Le registre surveille la taille, la date de modification et l'inode des
+fichiers et recharge le couple vectoriseur/modèle quand ils changent, sans
+redémarrer le serveur. Un modèle mis à jour en mémoire (apprentissage
+incrémental) peut aussi être publié avec ``publish`` ; les bundles remplacés
+restent dans un historique court pour un retour arrière immédiat
+(``rollback``). Un rechargement depuis le disque vide cet historique. Les artefacts doivent être remplacés par renommage
+atomique (``os.replace``) : réécrire en place un fichier projeté en mémoire
+invaliderait les pages encore utilisées.
+
+Si ``RAKUTEN_COMPACT_PATH`` désigne un dossier au format compact
+(``rakuten_classifier.compact``), il est servi à la place des pickles ; son
+``manifest.json``, écrit en dernier, sert d'empreinte.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import joblib
+
+from .config import COMPACT_PATH, MODEL_PATH, RELOAD_CHECK_INTERVAL, VECTORIZER_PATH
+
+logger = logging.getLogger(__name__)
+
+# Bundles remplacés conservés pour rollback
+MAX_HISTORY = 5
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Couple vectoriseur/modèle cohérent, immuable une fois publié"""
+    vectorizer: object
+    model: object
+    version: str
+    loaded_at: float
+    load_seconds: float
+
+
+def _fingerprint(paths):
+    """Empreinte (taille, mtime, inode) des fichiers, ou None s'il en manque un"""
+    try:
+        stats = [os.stat(path) for path in paths]
+    except FileNotFoundError:
+        return None
+    return tuple((st.st_size, st.st_mtime_ns, st.st_ino) for st in stats)
+
+
+class ModelRegistry:
+    """Charge les artefacts à la demande et les recharge si les fichiers changent.
+
+    ``get()`` est sans verrou sur le chemin chaud : tant que l'intervalle de
+    vérification n'est pas écoulé, il renvoie directement le bundle publié.
+    """
+
+    def __init__(self, vectorizer_path=VECTORIZER_PATH, model_path=MODEL_PATH,
+                 check_interval=RELOAD_CHECK_INTERVAL, mmap_mode="r", compact_path=COMPACT_PATH):
+        self.vectorizer_path = Path(vectorizer_path)
+        self.model_path = Path(model_path)
+        self.compact_path = Path(compact_path) if compact_path else None
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self._lock = threading.Lock()
+        self._bundle = None
+        self._history = []
+        self._fingerprint = None
+        self._next_check = 0.0
+        self.reload_count = 0
+
+    @property
+    def paths(self):
+        if self.compact_path is not None:
+            from .compact import MANIFEST
+
+            return (self.compact_path / MANIFEST,)
+        return (self.vectorizer_path, self.model_path)
+
+    def get(self):
+        """Renvoyer le bundle courant, en le (re)chargeant si nécessaire"""
+        bundle = self._bundle
+        if bundle is not None and time.monotonic() < self._next_check:
+            return bundle
+
+        with self._lock:
+            now = time.monotonic()
+            if self._bundle is None:
+                self._load()
+            elif now >= self._next_check:
+                fingerprint = _fingerprint(self.paths)
+                if fingerprint is not None and fingerprint != self._fingerprint:
+                    try:
+                        self._load()
+                    except Exception:
+                        # Fichier en cours de copie ou corrompu : on garde l'ancien modèle
+                        logger.exception("Rechargement des artefacts impossible, version %s conservée",
+                                         self._bundle.version)
+            self._next_check = time.monotonic() + self.check_interval
+            return self._bundle
+
+    def reload(self):
+        """Forcer le rechargement depuis le disque"""
+        with self._lock:
+            self._load()
+            self._next_check = time.monotonic() + self.check_interval
+            return self._bundle
+
+    def publish(self, model, version):
+        """Servir ``model`` (même vectoriseur) à la place du modèle courant.
+
+        Le remplacement est une simple affectation : les requêtes en cours
+        terminent avec le bundle qu'elles ont déjà obtenu.
+        """
+        with self._lock:
+            if self._bundle is None:
+                self._load()
+            current = self._bundle
+            self._history = (self._history + [current])[-MAX_HISTORY:]
+            self._bundle = ModelBundle(current.vectorizer, model, version, time.time(), 0.0)
+            logger.info("Modèle %s publié (remplace %s)", version, current.version)
+            return self._bundle
+
+    def rollback(self):
+        """Revenir au bundle précédent ; None s'il n'y en a pas"""
+        with self._lock:
+            if not self._history:
+                return None
+            replaced = self._bundle
+            self._bundle = self._history.pop()
+            logger.info("Retour au modèle %s (abandon de %s)", self._bundle.version, replaced.version)
+            return self._bundle
+
+    @property
+    def history(self):
+        """Versions disponibles pour rollback, de la plus ancienne à la plus récente"""
+        return [bundle.version for bundle in self._history]
+
+    def _load(self):
+        fingerprint = _fingerprint(self.paths)
+        if fingerprint is None:
+            missing = [str(path) for path in self.paths if not path.exists()]
+            raise FileNotFoundError(f"Artefacts introuvables : {', '.join(missing)}")
+
+        start = time.perf_counter()
+        if self.compact_path is not None:
+            from .compact import load_compact
+
+            vectorizer, model = load_compact(self.compact_path, mmap_mode=self.mmap_mode)
+        else:
+            vectorizer = joblib.load(self.vectorizer_path, mmap_mode=self.mmap_mode)
+            model = joblib.load(self.model_path, mmap_mode=self.mmap_mode)
+        elapsed = time.perf_counter() - start
+
+        version = hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:12]
+        self._bundle = ModelBundle(vectorizer, model, version, time.time(), elapsed)
+        self._history = []
+        self._fingerprint = fingerprint
+        self.reload_count += 1
+        logger.info("Artefacts chargés (version %s) en %.3f s", version, elapsed)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registre unique du processus, partagé par toutes les sessions"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
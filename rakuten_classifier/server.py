@@ -0,0 +1,173 @@
+"""Point d'entrée HTTP local, sans Streamlit.
+
+``POST /predict`` accepte une annonce ou un lot :
+
+    {"designation": "...", "description": "...", "image": "<base64>", "top_k": 3}
+    {"items": [{"designation": "...", "description": "..."}, ...], "top_k": 3}
+
+Avec une image, l'annonce passe par la cascade texte → image
+(``rakuten_classifier.cascade``) : ``image_model_used`` indique si le modèle
+image a été sollicité.
+
+``GET /health`` renvoie l'état du service et la version du modèle ;
+``GET /ready`` ne répond 200 qu'une fois la chauffe terminée (503 avant,
+``rakuten_classifier.warmup``) : le répartiteur de charge attend ce signal ;
+``GET /metrics`` expose les latences par étape au format Prometheus
+(``rakuten_classifier.metrics``, mesure activée par ``RAKUTEN_METRICS=1``) ;
+``POST /rollback`` rétablit le modèle précédent après une mise à jour
+incrémentale (``rakuten_classifier.learner``).
+
+Le serveur parle HTTP/1.1 et garde les connexions ouvertes (keep-alive) : un
+client qui enchaîne les requêtes ne paie pas une poignée de main TCP par
+annonce. Chaque connexion est servie par son propre thread ; le registre, le
+moteur et le cache sont partagés par toutes.
+"""
+import base64
+import binascii
+import json
+import logging
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import metrics, warmup
+from .core import classify_listing, classify_text, classify_texts, prediction_to_dict
+from .registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_BATCH_ITEMS = 10000
+
+
+class RequestError(ValueError):
+    """Requête invalide (réponse 400)"""
+
+
+def predict_payload(payload):
+    """Réponse JSON pour le corps d'une requête /predict"""
+    if not isinstance(payload, dict):
+        raise RequestError("Objet JSON attendu")
+    top_k = int(payload.get("top_k", 3))
+
+    if "items" in payload:
+        items = payload["items"]
+        if not isinstance(items, list) or len(items) > MAX_BATCH_ITEMS:
+            raise RequestError(f"'items' doit être une liste d'au plus {MAX_BATCH_ITEMS} annonces")
+        listings = [(str(item.get("designation") or ""), str(item.get("description") or "")) for item in items]
+        return {"results": [prediction_to_dict(p, top_k) for p in classify_texts(listings)]}
+
+    designation = str(payload.get("designation") or "")
+    description = str(payload.get("description") or "")
+    image = payload.get("image")
+    if not (designation or description or image):
+        raise RequestError("Renseignez 'designation', 'description' ou 'image'")
+
+    if not image:
+        return prediction_to_dict(classify_text(designation, description), top_k)
+
+    from PIL import Image
+
+    from .imaging import prepare_image
+
+    try:
+        data = base64.b64decode(image, validate=True)
+    except (binascii.Error, TypeError):
+        raise RequestError("'image' doit être encodée en base64")
+    try:
+        prepared = prepare_image(data)
+    except (OSError, Image.DecompressionBombError) as e:
+        # Fichier illisible, tronqué ou trop grand : erreur du client, pas du service
+        raise RequestError(f"'image' n'est pas une image lisible ({type(e).__name__})")
+    # Cascade : l'image n'est analysée que si le texte est vide ou ambigu
+    result = classify_listing(designation, description, prepared)
+    return {**prediction_to_dict(result.prediction, top_k), "image_model_used": result.used_image}
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "RakutenClassifier/1.0"
+
+    def do_GET(self):
+        if self.path in ("/health", "/healthz"):
+            bundle = get_registry().get()
+            self._send_json(HTTPStatus.OK, {"status": "ok", "model_version": bundle.version})
+        elif self.path in ("/ready", "/readyz"):
+            self._send_json(*warmup.readiness())
+        elif self.path == "/metrics":
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Ressource inconnue"})
+
+    def do_POST(self):
+        if self.path == "/rollback":
+            self._discard_body()
+            bundle = get_registry().rollback()
+            if bundle is None:
+                self._send_json(HTTPStatus.CONFLICT, {"error": "Aucun modèle précédent"})
+            else:
+                self._send_json(HTTPStatus.OK, {"model_version": bundle.version})
+            return
+        if self.path != "/predict":
+            self._discard_body()
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Ressource inconnue"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                raise RequestError("Requête trop volumineuse")
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            with metrics.stage("http_predict"):
+                response = predict_payload(payload)
+            self._send_json(HTTPStatus.OK, response)
+        except (RequestError, ValueError, TypeError, AttributeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception:
+            logger.exception("Erreur pendant la classification")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Erreur interne"})
+
+    def _discard_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if 0 < length <= MAX_BODY_BYTES:
+            self.rfile.read(length)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(host="127.0.0.1", port=8080):
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host="127.0.0.1", port=8080):
+    """Charger le modèle, chauffer en arrière-plan et servir jusqu'à interruption"""
+    from .learner import start_if_enabled
+
+    get_registry().get()
+    start_if_enabled()
+    metrics.start_exporter()
+    server = make_server(host, port)
+    # /ready répond 503 jusqu'à la fin de la chauffe ; /health reste la sonde de vie
+    warmup.start_in_background()
+    logger.info("Serveur d'inférence sur http://%s:%d", host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
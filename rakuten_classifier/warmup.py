@@ -0,0 +1,197 @@
+"""Chauffe au démarrage et sonde de disponibilité.
+
+Après un déploiement, la première classification d'un processus paie le
+chargement des artefacts, les premières allocations de scikit-learn / NumPy
+et, pour les images, le premier passage de torch. ``run_warmup`` fait passer
+des annonces factices (toutes différentes, donc absentes du cache) par le vrai
+chemin de classification — ``classify_listing``, micro-lots, cascade, et
+``prepare_image`` puis le modèle image si ``RAKUTEN_WARMUP_IMAGE`` (activé par
+défaut) — avant que le processus ne se déclare prêt.
+
+Le rapport compare, pour chaque chemin, le premier appel (à froid) à la
+médiane des ``RAKUTEN_WARMUP_ROUNDS`` appels suivants (20), puis chronomètre un
+dernier appel : ce que paiera le premier vendeur.
+
+- ``RAKUTEN_WARMUP=0`` : désactiver la chauffe (prêt immédiatement) ;
+- ``RAKUTEN_READY_PORT`` : sonde HTTP locale ``/ready`` (503 pendant la chauffe
+  ou en cas d'échec du modèle texte, 200 ensuite, rapport en JSON).
+
+Le serveur HTTP (``python -m rakuten_classifier serve``) expose aussi
+``GET /ready`` ; ``python -m rakuten_classifier app`` chauffe le processus
+Streamlit avant la première session.
+"""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .config import env_flag, env_int
+
+logger = logging.getLogger(__name__)
+
+ENABLED = env_flag("RAKUTEN_WARMUP", True)
+WARM_IMAGE = env_flag("RAKUTEN_WARMUP_IMAGE", True)
+ROUNDS = env_int("RAKUTEN_WARMUP_ROUNDS", 20)
+READY_PORT = env_int("RAKUTEN_READY_PORT", 0)
+
+_ready = threading.Event()
+_lock = threading.Lock()
+_started = False
+_report = {"state": "pending"}
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1e3
+
+
+def latency_gap(first_ms, steady_ms, after_ms):
+    """Écart entre le premier appel et le régime établi (durées en ms)"""
+    steady = np.asarray(steady_ms)
+    p50 = float(np.median(steady))
+    return {
+        "first_ms": first_ms,
+        "steady_p50_ms": p50,
+        "steady_p95_ms": float(np.percentile(steady, 95)),
+        "gap_ms": first_ms - p50,
+        "ratio": first_ms / p50 if p50 else None,
+        "after_warmup_ms": after_ms,
+    }
+
+
+def _warm_path(call, rounds):
+    """Premier appel, ``rounds`` appels de régime établi, puis un appel « premier vendeur »"""
+    first = _timed(lambda: call(0))
+    steady = [_timed(lambda i=i: call(i)) for i in range(1, rounds + 1)]
+    return latency_gap(first, steady, _timed(lambda: call(rounds + 1)))
+
+
+def _warm_text(rounds):
+    from .benchmark import synthetic_listings
+    from .core import classify_listing
+
+    listings = synthetic_listings(rounds + 2, seed=7)
+    # Référence unique par appel : jamais servi par le cache de prédictions
+    return _warm_path(lambda i: classify_listing(f"{listings[i][0]} réf. W{i}", listings[i][1]), rounds)
+
+
+def _warm_image(rounds):
+    from .benchmark import synthetic_image
+    from .core import classify_listing
+    from .imaging import prepare_image
+
+    images = [synthetic_image(640, 480, seed=i) for i in range(rounds + 2)]
+    # Sans texte : la cascade passe forcément par le modèle image
+    return _warm_path(lambda i: classify_listing("", "", prepare_image(images[i])), rounds)
+
+
+def run_warmup(rounds=ROUNDS, image=WARM_IMAGE):
+    """Charger les modèles, chauffer les chemins texte et image, puis déclarer le processus prêt"""
+    from .registry import get_registry
+
+    global _report
+    start = time.perf_counter()
+    result = {"state": "warming"}
+    _report = result
+    try:
+        load_start = time.perf_counter()
+        result["model_version"] = get_registry().get().version
+        result["load_seconds"] = time.perf_counter() - load_start
+        result["text"] = _warm_text(rounds)
+    except Exception as e:
+        logger.exception("Chauffe du modèle texte impossible")
+        _report = {**result, "state": "failed", "error": str(e), "seconds": time.perf_counter() - start}
+        return _report
+    if image:
+        try:
+            result["image"] = _warm_image(rounds)
+        except Exception as e:
+            # Le texte reste servi : l'image est signalée dans le rapport sans bloquer la disponibilité
+            logger.warning("Chauffe du modèle image impossible : %s", e)
+            result["image"] = {"error": str(e)}
+    result["seconds"] = time.perf_counter() - start
+    result["state"] = "ready"
+    _report = result
+    _ready.set()
+    for path in ("text", "image"):
+        gap = result.get(path)
+        if gap and "first_ms" in gap:
+            logger.info("Chauffe %s : premier appel %.1f ms, régime établi %.1f ms (p50), après chauffe %.1f ms",
+                        path, gap["first_ms"], gap["steady_p50_ms"], gap["after_warmup_ms"])
+    logger.info("Processus prêt après %.2f s de chauffe", result["seconds"])
+    return result
+
+
+def _run_quietly():
+    try:
+        run_warmup()
+    except Exception:
+        logger.exception("Chauffe interrompue")
+
+
+def start_in_background(port=READY_PORT):
+    """Lancer une fois par processus la chauffe (thread) et la sonde de disponibilité"""
+    global _started, _report
+    if _started:
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+        if port:
+            start_probe(port)
+        if ENABLED:
+            threading.Thread(target=_run_quietly, name="warmup", daemon=True).start()
+        else:
+            _report = {"state": "ready", "skipped": True}
+            _ready.set()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def wait_ready(timeout=None):
+    return _ready.wait(timeout)
+
+
+def report():
+    """État de la chauffe (``pending``, ``warming``, ``ready`` ou ``failed``) et écarts de latence"""
+    return dict(_report)
+
+
+def readiness():
+    """(code HTTP, corps JSON) de la sonde ``/ready``"""
+    return (200 if is_ready() else 503), {"ready": is_ready(), **report()}
+
+
+class _ProbeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/ready", "/readyz"):
+            self.send_error(404)
+            return
+        status, payload = readiness()
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def start_probe(port):
+    """Point d'entrée HTTP local ``/ready`` (sans effet si le port est déjà pris)"""
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _ProbeHandler)
+    except OSError:
+        logger.warning("Port de disponibilité %d indisponible", port)
+        return None
+    threading.Thread(target=server.serve_forever, name="ready-http", daemon=True).start()
+    return server
@@ -0,0 +1,99 @@
+"""Fixtures partagées : artefacts livrés à la racine du dépôt, annonces et photos factices"""
+import io
+import shutil
+
+import numpy as np
+import pytest
+
+from rakuten_classifier.config import MODEL_PATH, VECTORIZER_PATH
+from rakuten_classifier.registry import ModelRegistry
+
+PRODUCTS = ("Livre", "Roman", "Coffret DVD", "Jeu vidéo", "Console", "Coque", "Smartphone", "Clé USB", "Casque",
+            "Cafetière", "Aspirateur", "Chaise", "Lampe", "Tente", "Vélo", "Peluche", "Puzzle", "Figurine",
+            "Piscine", "Perceuse", "Croquettes", "Chocolat", "Parfum", "Robe", "Baskets")
+BRANDS = ("Samsung", "Apple", "Sony", "Nintendo", "Ikea", "Moulinex", "Lego", "Bosch", "Decathlon", "Gallimard")
+QUALIFIERS = ("neuf", "occasion", "très bon état", "édition collector", "lot de 3", "taille M", "noir", "enfant")
+SENTENCES = ("Livraison rapide et soignée.", "Article jamais utilisé, encore sous blister.",
+             "Quelques traces d'usure sur la boîte.", "Idéal pour offrir.", "Garantie constructeur un an.",
+             "Vendu sans notice.")
+
+
+def _photo(width, height, fmt="JPEG", seed=0):
+    """Photo synthétique encodée : dégradés, grain et quelques ellipses de couleur"""
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width, y / height, 0.5 + 0.5 * np.sin((x + y) / 97.0)], axis=-1) * 200.0
+    base += rng.normal(0.0, 12.0, size=base.shape)
+    image = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        box = (x0, y0, x0 + rng.integers(20, width // 3 + 21), y0 + rng.integers(20, height // 3 + 21))
+        draw.ellipse(box, fill=tuple(int(c) for c in rng.integers(0, 256, size=3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="session")
+def bundle():
+    """Bundle des artefacts livrés, chargé une fois pour toute la session de tests"""
+    return ModelRegistry(check_interval=3600).get()
+
+
+@pytest.fixture(scope="session")
+def engine(bundle, tmp_path_factory):
+    """Moteur texte des artefacts livrés (tableaux compilés dans un dossier temporaire)"""
+    from rakuten_classifier.engine import TextEngine
+
+    return TextEngine(bundle, cache_dir=tmp_path_factory.mktemp("model_cache"))
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    """Copie des deux pickles dans un dossier temporaire (vectoriseur, modèle)"""
+    paths = tmp_path / VECTORIZER_PATH.name, tmp_path / MODEL_PATH.name
+    shutil.copyfile(VECTORIZER_PATH, paths[0])
+    shutil.copyfile(MODEL_PATH, paths[1])
+    return paths
+
+
+@pytest.fixture(scope="session")
+def listings():
+    """40 annonces (désignation, description) tirées d'une graine fixe"""
+    rng = np.random.default_rng(3)
+    return [(" ".join([rng.choice(PRODUCTS), rng.choice(BRANDS), rng.choice(QUALIFIERS)]),
+             " ".join(rng.choice(SENTENCES, size=rng.integers(0, 3), replace=False))) for _ in range(40)]
+
+
+@pytest.fixture(scope="session")
+def texts(listings):
+    from rakuten_classifier.engine import build_text
+
+    return [build_text(designation, description) for designation, description in listings]
+
+
+@pytest.fixture(scope="session")
+def make_photo():
+    """``make_photo(largeur, hauteur, format="JPEG", seed=0)`` : octets d'une photo synthétique"""
+    return _photo
+
+
+class FakeClock:
+    """Horloge monotone avancée à la main"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,54 @@
+import tomllib
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from rakuten_classifier import warmup  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULT = {"category": 0, "category_name": "Livre", "confidence": 0.9, "used_image": False, "used_text": True,
+          "model_version": "test"}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # Ni chauffe ni préchargement de torch en arrière-plan pendant les tests
+    monkeypatch.setenv("RAKUTEN_PRELOAD_VISION", "0")
+    monkeypatch.setattr(warmup, "start_in_background", lambda: None)
+    return AppTest.from_file(str(ROOT / "app.py"), default_timeout=60)
+
+
+def test_page_runs_with_style_and_header_first(app):
+    app.run()
+    assert not app.exception
+    first = app.markdown[0].value
+    assert first.lstrip().startswith("<style>") and 'class="rakuten-header"' in first
+    assert sum("<style>" in element.value for element in app.markdown) == 1
+
+
+def test_style_element_is_identical_across_reruns(app):
+    first = app.run().markdown[0].value
+    assert app.run().markdown[0].value == first
+
+
+def test_style_is_large_enough_for_the_browser_cache(app):
+    config = tomllib.loads((ROOT / ".streamlit" / "config.toml").read_text(encoding="utf-8"))
+    threshold = config["global"]["minCachedMessageSize"]
+    assert len(app.run().markdown[0].value.encode("utf-8")) >= threshold
+
+
+def test_result_section_and_category_selector(app):
+    app.session_state["prediction_result"] = RESULT
+    app.run()
+    assert not app.exception
+    assert any("Livre" in element.value and "category-result" in element.value for element in app.markdown)
+
+    labels = [button.label for button in app.button]
+    app.button[labels.index("🔄 Modifier la catégorie")].click().run()
+    assert not app.exception
+    assert app.session_state["show_category_selector"]
+    assert len(app.button) > len(labels)
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from rakuten_classifier.batch import classify_file, classify_frame, detect_format, texts_of
+
+
+@pytest.fixture
+def frame(listings):
+    return pd.DataFrame(listings, columns=["designation", "description"]).assign(productid=range(len(listings)))
+
+
+def test_detect_format():
+    assert detect_format("annonces.CSV") == "csv"
+    assert detect_format("annonces.parquet") == "parquet"
+    with pytest.raises(ValueError):
+        detect_format("annonces.xlsx")
+
+
+def test_texts_of_accepts_a_single_column():
+    assert texts_of(pd.DataFrame({"description": ["poche", None]})) == ["poche", ""]
+
+
+def test_classify_frame_matches_single_predictions(engine, frame):
+    result = classify_frame(engine, frame, top_k=2)
+    assert list(result["productid"]) == list(frame["productid"])
+    for row in result.itertuples():
+        prediction = engine.predict(row.designation, row.description)
+        assert row.predicted_category == prediction.label
+        assert row.top1_confidence == pytest.approx(prediction.confidence)
+        assert row.top2_confidence <= row.top1_confidence
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_classify_file_by_chunks(engine, frame, tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    source, destination = tmp_path / f"in.{fmt}", tmp_path / f"out.{fmt}"
+    if fmt == "csv":
+        frame.to_csv(source, index=False)
+    else:
+        frame.to_parquet(source, index=False)
+    fractions = []
+
+    rows = classify_file(engine, source, destination, fmt, chunksize=7,
+                         progress=lambda fraction, done: fractions.append(fraction))
+
+    assert rows == len(frame)
+    assert fractions[-1] == pytest.approx(1.0)
+    output = pd.read_csv(destination) if fmt == "csv" else pd.read_parquet(destination)
+    expected = classify_frame(engine, frame)
+    assert list(output["predicted_category"]) == list(expected["predicted_category"])
+
+
+def test_missing_text_columns(engine, tmp_path):
+    source = tmp_path / "in.csv"
+    pd.DataFrame({"title": ["livre"]}).to_csv(source, index=False)
+    with pytest.raises(ValueError, match="designation"):
+        classify_file(engine, source, tmp_path / "out.csv", "csv")
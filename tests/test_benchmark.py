@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from rakuten_classifier import benchmark
+from rakuten_classifier.benchmark import (APP_ENVIRONMENT, compare, environment_differences, format_comparison,
+                                          measure, synthetic_image, synthetic_listings, text_benchmarks)
+
+
+def result(median):
+    return {"median_ms": median}
+
+
+def test_synthetic_inputs_are_reproducible():
+    assert synthetic_listings(5, seed=1) == synthetic_listings(5, seed=1)
+    assert synthetic_listings(5, seed=1) != synthetic_listings(5, seed=2)
+    assert synthetic_image(64, 48, seed=1) == synthetic_image(64, 48, seed=1)
+    assert synthetic_image(64, 48, "PNG").startswith(b"\x89PNG")
+
+
+def test_measure_counts_warmup_apart():
+    calls = []
+    timings = measure(lambda: calls.append(1), repeat=5, warmup=2)
+    assert len(calls) == 7
+    assert timings["runs"] == 5
+    assert 0.0 <= timings["min_ms"] <= timings["median_ms"] <= timings["p95_ms"]
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"results": {"a": result(10.0), "b": result(10.0), "c": result(10.0), "gone": result(1.0)}}
+    report = {"results": {"a": result(12.0), "b": result(13.0), "c": result(7.0), "new": result(1.0)}}
+    rows = {row["name"]: row for row in compare(report, baseline, tolerance=0.25)}
+    assert {name: row["status"] for name, row in rows.items()} == {
+        "a": "ok", "b": "regression", "c": "improvement", "gone": "missing", "new": "new"}
+    assert rows["b"]["ratio"] == pytest.approx(1.3)
+    assert "regression" in format_comparison(list(rows.values()))
+
+
+def test_environment_differences():
+    baseline = {"environment": {"machine": "x86_64", "cpu_count": 8, "python": "3.11.7"}}
+    report = {"environment": {"machine": "x86_64", "cpu_count": 4, "python": "3.11.7"}}
+    assert environment_differences(report, baseline) == {"cpu_count": {"baseline": 8, "current": 4}}
+
+
+def test_text_benchmarks_cover_each_stage():
+    results, version = text_benchmarks(repeat=2, batch_size=10)
+    assert version
+    assert set(results) == {"model_load", "tfidf_transform_row", "tfidf_transform_batch10", "featurize_row",
+                            "predict_proba_row", "predict_proba_batch10", "engine_predict_row"}
+
+
+def test_app_benchmarks_disable_warmup_and_restore_environment(monkeypatch):
+    monkeypatch.setenv("RAKUTEN_WARMUP", "1")
+    monkeypatch.delenv("RAKUTEN_PRELOAD_VISION", raising=False)
+    seen = {}
+    monkeypatch.setattr(benchmark, "_app_benchmarks",
+                        lambda repeat, timeout: seen.update({name: os.environ.get(name) for name in APP_ENVIRONMENT}))
+    benchmark.app_benchmarks(1)
+    assert seen == APP_ENVIRONMENT
+    assert os.environ["RAKUTEN_WARMUP"] == "1"
+    assert "RAKUTEN_PRELOAD_VISION" not in os.environ
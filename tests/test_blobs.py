@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+
+from rakuten_classifier.blobs import (BlobStore, _remove_directory, process_directory, release_upload,
+                                      restore_upload, store_upload)
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return BlobStore(memory_budget=100, disk_budget=100, directory=tmp_path / "blobs", clock=clock)
+
+
+def test_idle_session_entries_spill_first(store, clock):
+    store.put("a", b"a" * 40, owner="active")
+    clock.advance(1)
+    store.put("b", b"b" * 40, owner="idle")
+    clock.advance(1)
+    store.touch("active")
+    store.put("c", b"c" * 40, owner="active")
+
+    stats = store.stats()
+    assert (stats["memory_bytes"], stats["disk_bytes"], stats["spills"]) == (80, 40, 1)
+    assert (store.directory / "b").read_bytes() == b"b" * 40
+    assert store.get("a") == b"a" * 40 and store.stats()["disk_hits"] == 0
+
+
+def test_spilled_entry_comes_back_on_read(store, clock):
+    for key in "abc":
+        store.put(key, key.encode() * 40)
+        clock.advance(1)
+    assert store.get("a") == b"a" * 40
+    stats = store.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_bytes"] <= store.memory_budget
+
+
+def test_disk_budget_evicts_oldest_files(store, clock):
+    for key in "abcdef":
+        store.put(key, key.encode() * 40)
+        clock.advance(1)
+    stats = store.stats()
+    assert stats["disk_bytes"] <= store.disk_budget
+    assert stats["evictions"] == 2
+    assert store.get("a") is None and store.stats()["misses"] == 1
+    assert sorted(path.name for path in store.directory.iterdir()) == ["c", "d"]
+
+
+def test_without_directory_entries_are_dropped(clock):
+    store = BlobStore(memory_budget=50, disk_budget=100, directory=None, clock=clock)
+    store.put("a", b"a" * 40)
+    clock.advance(1)
+    store.put("b", b"b" * 40)
+    assert store.get("a") is None
+    assert store.stats()["evictions"] == 1
+
+
+def test_invalid_key_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.put("../etc/passwd", b"x")
+
+
+def test_release_forgets_the_session(store):
+    store.put("a", b"a", owner="session")
+    assert store.stats()["sessions"] == 1
+    store.release("a", "session")
+    assert store.stats()["sessions"] == 0
+
+
+def test_process_directory_is_per_pid(tmp_path):
+    directory = process_directory(tmp_path)
+    assert directory == tmp_path / str(os.getpid())
+    assert process_directory("") is None
+
+    directory.mkdir()
+    _remove_directory(directory, os.getpid() + 1)
+    assert directory.exists()
+    _remove_directory(directory, os.getpid())
+    assert not directory.exists()
+
+
+def test_upload_round_trip(tmp_path, make_photo):
+    store = BlobStore(directory=tmp_path / "blobs")
+    prepared = store_upload(make_photo(200, 150), owner="session", store=store)
+    restored = restore_upload(prepared.digest, owner="session", store=store)
+    np.testing.assert_array_equal(restored.array, prepared.array)
+    assert restored.phash == prepared.phash
+
+    release_upload(prepared.digest, "session", store=store)
+    assert store.stats()["sessions"] == 0
+    assert restore_upload("0" * 64, store=store) is None
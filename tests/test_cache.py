@@ -0,0 +1,65 @@
+import pytest
+
+from rakuten_classifier.cache import PredictionCache, get_prediction_cache, prediction_key
+
+
+def test_key_normalises_case_and_spaces():
+    assert prediction_key("text", "v1", designation="Harry  Potter ") == prediction_key("text", "v1",
+                                                                                        designation="harry potter")
+    assert prediction_key("text", "v1", designation="a", description="b") != prediction_key("text", "v1",
+                                                                                            designation="a b")
+
+
+def test_key_depends_on_kind_version_and_image():
+    key = prediction_key("image", "v1", image_digest="abc")
+    assert key != prediction_key("image", "v2", image_digest="abc")
+    assert key != prediction_key("image", "v1", image_digest="abd")
+    assert key != prediction_key("fusion", "v1", image_digest="abc")
+
+
+def test_lru_eviction(clock):
+    cache = PredictionCache(max_entries=2, ttl=60, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" devient la moins récemment utilisée
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(clock):
+    cache = PredictionCache(max_entries=10, ttl=60, clock=clock)
+    cache.put("a", 1)
+    clock.advance(59)
+    assert cache.get("a") == 1
+    clock.advance(2)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_get_or_compute_calls_once(clock):
+    cache = PredictionCache(clock=clock)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None  # None est une valeur légitime
+
+    assert cache.get_or_compute("k", compute) is None
+    assert cache.get_or_compute("k", compute) is None
+    assert len(calls) == 1
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        get_prediction_cache("audio")
+
+
+def test_resubmitted_listing_served_from_cache():
+    from rakuten_classifier.core import classify_text
+
+    first = classify_text("Console de jeux portable", "avec deux manettes  ")
+    assert classify_text("console de jeux PORTABLE", "avec deux manettes") is first
@@ -0,0 +1,108 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from rakuten_classifier import core
+from rakuten_classifier.cascade import (CascadePredictor, FusionParameters, LabelSpace, calibrate_threshold, fuse,
+                                        margin)
+from rakuten_classifier.categories import CATEGORIES
+from rakuten_classifier.imaging import PreparedImage
+from rakuten_classifier.vision import image_prediction
+
+
+def prepared():
+    return PreparedImage(digest=uuid.uuid4().hex, array=None, thumbnail=b"")
+
+
+@pytest.fixture
+def image_calls(monkeypatch):
+    """Modèle image factice : toujours « Livre » (catégorie 0), appels comptés"""
+    calls = []
+
+    def classify_image(image):
+        calls.append(image.digest)
+        proba = np.full(len(CATEGORIES), 0.01)
+        proba[0] = 1.0 - proba[1:].sum()
+        return image_prediction(proba, "factice")
+
+    monkeypatch.setattr(core, "classify_image", classify_image)
+    return calls
+
+
+def test_margin():
+    np.testing.assert_allclose(margin([[0.6, 0.3, 0.1], [0.4, 0.4, 0.2]]), [0.3, 0.0])
+
+
+def test_fuse_is_normalised_and_weighted():
+    text = np.array([[0.7, 0.3]])
+    image = np.array([[0.2, 0.8]])
+    assert fuse(text, image, 1.0, 0.0).argmax() == 0
+    assert fuse(text, image, 0.0, 1.0).argmax() == 1
+    np.testing.assert_allclose(fuse(text, image, 1.0, 0.5).sum(axis=-1), 1.0)
+
+
+def test_calibrate_threshold():
+    proba = np.array([[0.9, 0.1], [0.55, 0.45], [0.45, 0.55]])
+    targets = np.array([0, 1, 0])
+    # Seuls les textes à forte marge sont justes
+    assert calibrate_threshold(proba, targets, precision=1.0) == pytest.approx(0.15)
+
+
+def test_parameters_round_trip(tmp_path):
+    parameters = FusionParameters(threshold=0.35, text_weight=1.2, image_weight=0.7)
+    parameters.save(tmp_path / "fusion.json")
+    assert FusionParameters.load(tmp_path / "fusion.json") == parameters
+    assert FusionParameters.load(tmp_path / "absent.json") == FusionParameters()
+
+
+def test_label_space_keeps_text_only_classes(engine):
+    space = LabelSpace(engine.labels, engine.categories)
+    assert space.labels[:len(CATEGORIES)] == tuple(CATEGORIES.values())
+    proba = np.linspace(1, 2, len(engine.labels))
+    proba /= proba.sum()
+    assert space.from_text(proba).sum() == pytest.approx(1.0)
+    for label, p in zip(engine.labels, proba):
+        assert space.from_text(proba)[space.labels.index(label)] == pytest.approx(p)
+
+
+def test_confident_text_skips_image(image_calls):
+    cascade = CascadePredictor(FusionParameters(threshold=0.0))
+    result = cascade.predict("Harry Potter", "roman poche", prepared())
+    assert not result.used_image and image_calls == []
+    assert cascade.counts["text_confident"] == 1
+
+
+def test_ambiguous_text_is_fused(image_calls):
+    cascade = CascadePredictor(FusionParameters(threshold=1.01, text_weight=0.0, image_weight=1.0))
+    result = cascade.predict("Harry Potter", "roman poche", prepared())
+    assert result.used_image and len(image_calls) == 1
+    # Poids texte nul : la fusion suit le modèle image
+    assert result.prediction.category == 0
+    assert cascade.counts["fused"] == 1
+
+
+def test_image_only(image_calls):
+    cascade = CascadePredictor()
+    result = cascade.predict("", "  ", prepared())
+    assert result.used_image and result.text is None
+    assert cascade.counts["image_only"] == 1
+
+
+def test_image_failure_falls_back_to_text(monkeypatch):
+    def fail(image):
+        raise RuntimeError("modèle image indisponible")
+
+    monkeypatch.setattr(core, "classify_image", fail)
+    cascade = CascadePredictor(FusionParameters(threshold=1.01))
+    result = cascade.predict("Harry Potter", "roman poche", prepared())
+    assert not result.used_image
+    assert result.prediction.label == result.text.label
+    assert cascade.counts["image_failed"] == 1
+    with pytest.raises(RuntimeError):
+        cascade.predict("", "", prepared())
+
+
+def test_empty_listing():
+    with pytest.raises(ValueError):
+        CascadePredictor().predict("", "")
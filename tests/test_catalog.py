@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from rakuten_classifier.catalog import CatalogIndex, append_index, build_index, get_catalog, train_centroids
+
+INPUT_DIM = 64
+
+
+def clustered(n, seed=0, centers=12):
+    """Vecteurs regroupés autour de quelques centres, catégorie = centre"""
+    rng = np.random.default_rng(seed)
+    means = np.random.default_rng(42).standard_normal((centers, INPUT_DIM)).astype(np.float32)
+    categories = rng.integers(0, centers, size=n)
+    vectors = means[categories] + 0.3 * rng.standard_normal((n, INPUT_DIM), dtype=np.float32)
+    texts = [(f"annonce {seed}-{i}", f"centre {c}") for i, c in enumerate(categories)]
+    return vectors, texts, categories
+
+
+def batches(vectors, texts, categories, size=100):
+    for start in range(0, len(vectors), size):
+        yield vectors[start:start + size], texts[start:start + size], categories[start:start + size]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    vectors, texts, categories = clustered(600)
+    directory = build_index(tmp_path / "image", "image", batches(vectors, texts, categories), INPUT_DIM, dim=32,
+                            n_lists=16)
+    return CatalogIndex(directory), vectors, texts
+
+
+def exact_neighbours(index, vectors, query, k):
+    scores = index.embed(vectors) @ query
+    return np.argsort(-scores)[:k]
+
+
+def test_full_probe_matches_exact_search(catalog):
+    index, vectors, texts = catalog
+    assert len(index) == 600 and index.manifest["projected"]
+    for row in (0, 17, 301):
+        query = index.embed(vectors[row])
+        matches = index.search(query, k=5, nprobe=index.manifest["n_lists"])
+        expected = [texts[i][0] for i in exact_neighbours(index, vectors, query, 5)]
+        assert [match.designation for match in matches] == expected
+        assert matches[0].score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_partial_probe_finds_the_item_itself(catalog):
+    index, vectors, texts = catalog
+    for row in range(0, 600, 37):
+        match = index.search(index.embed(vectors[row]), k=1, nprobe=4)[0]
+        assert (match.designation, match.description) == texts[row]
+
+
+def test_category_filter(catalog):
+    index, vectors, _ = catalog
+    matches = index.search(index.embed(vectors[0]), k=10, nprobe=16, category=3)
+    assert matches and all(match.category == 3 for match in matches)
+    scores = [match.score for match in matches]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_sparse_row_embedding_matches_matrix(catalog):
+    index, _, _ = catalog
+    indices, data = np.array([1, 5, 40]), np.array([0.2, 0.5, 0.8])
+    row = sp.csr_matrix((data, indices, [0, 3]), shape=(1, INPUT_DIM))
+    np.testing.assert_allclose(index.embed_row(indices, data), index.embed(row)[0], rtol=1e-5, atol=1e-6)
+
+
+def test_append_then_merge_segments(catalog):
+    index, _, _ = catalog
+    directory = index.directory
+    for seed in (1, 2, 3):
+        vectors, texts, categories = clustered(50, seed=seed)
+        assert append_index(directory, batches(vectors, texts, categories), max_segments=3) == 50
+    merged = CatalogIndex(directory)
+    assert len(merged) == 750 and len(merged.segments) == 1
+    query = merged.embed(vectors[7])
+    assert merged.search(query, k=1, nprobe=16)[0].designation == texts[7][0]
+
+
+def test_train_centroids_are_normalized():
+    vectors, _, _ = clustered(200)
+    centroids = train_centroids(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), 8)
+    np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-5)
+
+
+def test_get_catalog_without_index(tmp_path):
+    assert get_catalog("image", root=tmp_path) is None
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from rakuten_classifier.compact import MANIFEST, export_compact, load_compact, sample_texts, verify_compact
+from rakuten_classifier.engine import TextFeaturizer, pad_features
+
+
+@pytest.fixture(scope="module")
+def compact_texts(bundle, texts):
+    return list(texts) + sample_texts(bundle.vectorizer, 60, seed=1)
+
+
+@pytest.fixture(scope="module")
+def linear_model(bundle, texts):
+    X = pad_features(bundle.vectorizer.transform(texts), bundle.model.n_features_in_)
+    return LogisticRegression(max_iter=200).fit(X, np.arange(len(texts)) % 4)
+
+
+def test_compact_featurizer_matches_vectorizer(bundle, compact_texts, tmp_path):
+    export_compact(bundle.vectorizer, bundle.model, tmp_path / "model.rkc", dtype="float64")
+    vectorizer, _ = load_compact(tmp_path / "model.rkc")
+    reference = TextFeaturizer(bundle.vectorizer)
+    featurizer = vectorizer.featurizer()
+    model_columns = np.asarray(vectorizer.model_columns)
+    for text in compact_texts:
+        indices, data = featurizer.row(text)
+        # Mêmes valeurs TF-IDF, restreintes aux colonnes lues par le modèle
+        expected_indices, expected_data = reference.row(text)
+        columns = model_columns[expected_indices]
+        np.testing.assert_array_equal(indices, columns[columns >= 0])
+        np.testing.assert_allclose(data, expected_data[columns >= 0], rtol=0, atol=1e-12)
+
+
+def test_float64_forest_is_exact(bundle, compact_texts, tmp_path):
+    directory = export_compact(bundle.vectorizer, bundle.model, tmp_path / "model.rkc", dtype="float64")
+    result = verify_compact(directory, bundle.vectorizer, bundle.model, compact_texts)
+    assert result["exact"]
+    assert result["argmax_agreement"] == 1.0
+
+
+def test_float64_linear_matches_pickle(bundle, linear_model, compact_texts, tmp_path):
+    directory = export_compact(bundle.vectorizer, linear_model, tmp_path / "linear.rkc", dtype="float64")
+    result = verify_compact(directory, bundle.vectorizer, linear_model, compact_texts, tolerance=1e-12)
+    assert result["within_tolerance"]
+    assert result["argmax_agreement"] == 1.0
+
+
+def test_float32_stays_within_tolerance(bundle, compact_texts, tmp_path):
+    directory = export_compact(bundle.vectorizer, bundle.model, tmp_path / "model.rkc", dtype="float32")
+    result = verify_compact(directory, bundle.vectorizer, bundle.model, compact_texts, tolerance=1e-6)
+    assert result["within_tolerance"]
+
+
+def test_manifest_and_unsupported_format(bundle, tmp_path):
+    directory = export_compact(bundle.vectorizer, bundle.model, tmp_path / "model.rkc")
+    manifest = json.loads((directory / MANIFEST).read_text(encoding="utf-8"))
+    assert manifest["kind"] == "forest"
+    assert manifest["classes"] == [str(label) for label in bundle.model.classes_]
+    assert not list(tmp_path.glob(".model.rkc.*"))
+
+    manifest["format"] = 99
+    (directory / MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_compact(directory)
+
+
+def test_unknown_dtype_is_rejected(bundle, tmp_path):
+    with pytest.raises(ValueError):
+        export_compact(bundle.vectorizer, bundle.model, tmp_path / "model.rkc", dtype="float8")
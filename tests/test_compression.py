@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from rakuten_classifier.compact import export_compact, load_compact, verify_compact
+from rakuten_classifier.compression import compression_report, operating_points
+from rakuten_classifier.config import MODEL_PATH, VECTORIZER_PATH
+from rakuten_classifier.engine import TextEngine, pad_features
+from rakuten_classifier.registry import ModelBundle
+
+
+@pytest.fixture(scope="module")
+def linear_model(bundle, texts):
+    X = pad_features(bundle.vectorizer.transform(texts), bundle.model.n_features_in_)
+    return LogisticRegression(max_iter=200).fit(X, np.arange(len(texts)) % 4)
+
+
+def test_int8_forest_within_quantization_step(bundle, texts, tmp_path):
+    directory = export_compact(bundle.vectorizer, bundle.model, tmp_path / "int8.rkc", dtype="int8")
+    # Probabilités des feuilles arrondies au 1/255 : l'écart moyen reste sous un demi-pas
+    result = verify_compact(directory, bundle.vectorizer, bundle.model, texts, tolerance=0.5 / 255)
+    assert result["within_tolerance"]
+    assert not result["exact"]
+
+
+def test_int8_linear_keeps_predictions(bundle, linear_model, texts, tmp_path):
+    directory = export_compact(bundle.vectorizer, linear_model, tmp_path / "int8.rkc", dtype="int8")
+    result = verify_compact(directory, bundle.vectorizer, linear_model, texts, tolerance=0.02)
+    assert result["within_tolerance"]
+    assert result["argmax_agreement"] >= 0.95
+
+
+def test_pruning_drops_small_coefficients(bundle, linear_model, tmp_path):
+    coef = np.abs(linear_model.coef_)
+    threshold = float(np.median(coef[coef > 0]))
+    full = export_compact(bundle.vectorizer, linear_model, tmp_path / "full.rkc", dtype="float64")
+    pruned = export_compact(bundle.vectorizer, linear_model, tmp_path / "pruned.rkc", dtype="float64",
+                            prune=threshold)
+    _, full_model = load_compact(full)
+    _, pruned_model = load_compact(pruned)
+    assert pruned_model.n_features_in_ < full_model.n_features_in_
+    assert "coef_data" in pruned_model.arrays
+    assert np.all(np.abs(pruned_model.arrays["coef_data"]) >= threshold)
+
+
+def test_max_trees_matches_truncated_forest(bundle, texts, tmp_path):
+    directory = export_compact(bundle.vectorizer, bundle.model, tmp_path / "trees.rkc", dtype="float64",
+                               max_trees=10)
+    vectorizer, model = load_compact(directory)
+    engine = TextEngine(ModelBundle(vectorizer, model, "compact", 0.0, 0.0), cache_dir=None)
+    X = pad_features(bundle.vectorizer.transform(texts), bundle.model.n_features_in_)
+    expected = np.mean([tree.predict_proba(X) for tree in bundle.model.estimators_[:10]], axis=0)
+    np.testing.assert_allclose(engine.predict_proba(texts), expected, rtol=0, atol=1e-12)
+
+
+def test_operating_points_follow_model_kind(bundle, linear_model):
+    assert operating_points(bundle.model, dtypes=("int8",), max_trees=(None, 10)) == [
+        {"dtype": "int8", "max_trees": None}, {"dtype": "int8", "max_trees": 10}]
+    assert operating_points(linear_model, dtypes=("float32",)) == [{"dtype": "float32", "prune": 0.0}]
+
+
+def test_compression_report_rows(tmp_path):
+    rows = compression_report(VECTORIZER_PATH, MODEL_PATH, points=[{"dtype": "float64"}, {"dtype": "int8"}],
+                              sample_rows=50, workdir=tmp_path)
+    assert [row["name"] for row in rows] == ["pickle", "dtype=float64", "dtype=int8"]
+    assert rows[0]["macro_f1"] == 1.0 and rows[0]["size_ratio"] == 1.0
+    assert rows[1]["agreement"] == 1.0 and rows[1]["macro_f1_change"] == 0.0
+    assert rows[2]["bytes"] < rows[1]["bytes"]
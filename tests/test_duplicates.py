@@ -0,0 +1,79 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from rakuten_classifier.duplicates import MAX_DISTANCE, NearDuplicateIndex, _unpacked_popcount, popcount
+from rakuten_classifier.imaging import hamming, prepare_image
+
+
+def reencoded(data, size=None, quality=70):
+    image = Image.open(io.BytesIO(data))
+    if size:
+        image = image.resize(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("size", [None, (320, 240), (1280, 960)])
+def test_phash_survives_reencoding_and_resizing(make_photo, size):
+    data = make_photo(640, 480, seed=5)
+    assert hamming(prepare_image(data).phash, prepare_image(reencoded(data, size)).phash) <= 2
+
+
+def test_phash_separates_different_images(make_photo):
+    hashes = [prepare_image(make_photo(640, 480, seed=seed)).phash for seed in range(4)]
+    distances = [hamming(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+    assert min(distances) > 2 * MAX_DISTANCE
+
+
+def test_popcount_fallback_matches_numpy():
+    values = np.random.default_rng(0).integers(0, 2 ** 63, size=100, dtype=np.uint64) * np.uint64(2)
+    values = np.append(values, np.array([0, 2 ** 64 - 1], dtype=np.uint64))
+    expected = [bin(int(value)).count("1") for value in values]
+    np.testing.assert_array_equal(_unpacked_popcount(values), expected)
+    np.testing.assert_array_equal(popcount(values), expected)
+
+
+def test_get_within_distance():
+    index = NearDuplicateIndex(max_entries=8, max_distance=4)
+    index.put(0b1111_0000, "v1", "a")
+    assert index.get(0b1111_0000, "v1") == "a"
+    assert index.get(0b1111_0111, "v1") == "a"
+    assert index.get(0b0000_1111, "v1") is None
+    stats = index.stats()
+    assert (stats["hits"], stats["exact_hits"], stats["misses"]) == (2, 1, 1)
+
+
+def test_version_change_empties_index():
+    index = NearDuplicateIndex(max_entries=8)
+    index.put(42, "v1", "a")
+    assert index.get(42, "v2") is None
+    assert len(index) == 0
+
+
+def test_least_recently_used_entry_is_replaced():
+    index = NearDuplicateIndex(max_entries=2, max_distance=0)
+    index.put(1, "v1", "a")
+    index.put(2, "v1", "b")
+    index.get(1, "v1")
+    index.put(4, "v1", "c")
+    assert index.get(2, "v1") is None
+    assert index.get(1, "v1") == "a" and index.get(4, "v1") == "c"
+    assert index.stats()["evictions"] == 1
+
+
+def test_get_or_compute_skips_near_duplicates(make_photo):
+    index = NearDuplicateIndex(max_entries=8, max_distance=4)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "prediction"
+
+    data = make_photo(640, 480, seed=9)
+    for upload in (data, reencoded(data), reencoded(data, (320, 240))):
+        assert index.get_or_compute(prepare_image(upload).phash, "v1", compute) == "prediction"
+    assert len(calls) == 1
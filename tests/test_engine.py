@@ -0,0 +1,52 @@
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from rakuten_classifier.engine import TextEngine, TextFeaturizer, build_text, pad_features
+from rakuten_classifier.registry import ModelBundle
+
+
+def reference_proba(bundle, texts):
+    X = bundle.vectorizer.transform(texts)
+    return bundle.model.predict_proba(pad_features(X, bundle.model.n_features_in_))
+
+
+def test_build_text():
+    assert build_text("  Harry Potter ", "") == "Harry Potter"
+    assert build_text("", " poche ") == "poche"
+    assert build_text(None, None) == ""
+
+
+def test_featurizer_row_matches_transform(bundle, texts):
+    featurizer = TextFeaturizer(bundle.vectorizer)
+    for text in texts:
+        indices, data = featurizer.row(text)
+        expected = bundle.vectorizer.transform([text])
+        expected.sort_indices()
+        np.testing.assert_array_equal(indices, expected.indices)
+        np.testing.assert_allclose(data, expected.data, rtol=0, atol=1e-12)
+
+
+def test_forest_parity_with_predict_proba(bundle, engine, texts):
+    expected = reference_proba(bundle, texts)
+    single = np.array([engine.predict_proba_one(text) for text in texts])
+    np.testing.assert_array_equal(single, expected)
+    np.testing.assert_array_equal(engine.predict_proba(texts), expected)
+
+
+def test_linear_parity_with_predict_proba(bundle, texts, tmp_path):
+    X = pad_features(bundle.vectorizer.transform(texts), bundle.model.n_features_in_)
+    y = np.arange(len(texts)) % 4
+    model = LogisticRegression(max_iter=200).fit(X, y)
+    linear = ModelBundle(bundle.vectorizer, model, "linear", 0.0, 0.0)
+    engine = TextEngine(linear, cache_dir=tmp_path)
+    expected = model.predict_proba(X)
+    single = np.array([engine.predict_proba_one(text) for text in texts])
+    np.testing.assert_allclose(single, expected, rtol=1e-12, atol=1e-15)
+
+
+def test_prediction_top_k(engine, listings):
+    prediction = engine.predict(*listings[0])
+    assert prediction.label == prediction.labels[int(np.argmax(prediction.probabilities))]
+    top = prediction.top_k(3)
+    assert top[0] == (prediction.label, prediction.confidence)
+    assert [p for _, p in top] == sorted((p for _, p in top), reverse=True)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rakuten_classifier.batch import map_chunks
+from rakuten_classifier.categories import CATEGORIES
+from rakuten_classifier.evaluation import OTHER, classification_metrics, evaluate_path, label_categories
+
+
+def square(value):
+    return value * value
+
+
+def test_label_categories_accepts_codes_and_labels():
+    values = ["2705", " 40 ", "Livre", "1234", "Rayon inconnu", 1280]
+    np.testing.assert_array_equal(label_categories(values), [0, 2, 0, -1, -1, 13])
+    np.testing.assert_array_equal(label_categories(["1234"], {1234: 5}), [5])
+
+
+def test_classification_metrics_on_known_confusion():
+    confusion = np.zeros((len(CATEGORIES), len(CATEGORIES) + 1), dtype=np.int64)
+    confusion[0, 0] = 8   # Livre : 8 justes, 2 classés Maison
+    confusion[0, 6] = 2
+    confusion[6, 6] = 4   # Maison : 4 justes, 1 hors catégories
+    confusion[6, OTHER] = 1
+    result = classification_metrics(confusion)
+
+    assert result["rows"] == 15
+    assert result["accuracy"] == pytest.approx(12 / 15)
+    livre, maison = result["per_class"][CATEGORIES[0]], result["per_class"][CATEGORIES[6]]
+    assert livre == pytest.approx({"precision": 1.0, "recall": 0.8, "f1": 16 / 18, "support": 10})
+    assert maison == pytest.approx({"precision": 4 / 6, "recall": 0.8, "f1": 16 / 22, "support": 5})
+    assert result["macro_f1"] == pytest.approx((16 / 18 + 16 / 22) / 2)
+    assert result["weighted_f1"] == pytest.approx((10 * 16 / 18 + 5 * 16 / 22) / 15)
+    assert set(result["per_class"]) == {CATEGORIES[0], CATEGORIES[6]}
+
+
+def test_classification_metrics_without_rows():
+    empty = classification_metrics(np.zeros((len(CATEGORIES), len(CATEGORIES) + 1), dtype=np.int64))
+    assert empty["rows"] == 0 and empty["accuracy"] is None and empty["macro_f1"] is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_map_chunks_keeps_task_order(workers):
+    assert list(map_chunks(square, iter(range(12)), workers)) == [i * i for i in range(12)]
+
+
+def test_map_chunks_leaves_caller_thread_limits_alone(monkeypatch):
+    threadpoolctl = pytest.importorskip("threadpoolctl")
+    before = threadpoolctl.threadpool_info()
+    limits = []
+    monkeypatch.setattr(threadpoolctl, "threadpool_limits", lambda *args, **kwargs: limits.append(args))
+    assert list(map_chunks(square, iter(range(3)), workers=1)) == [0, 1, 4]
+    assert limits == [] and threadpoolctl.threadpool_info() == before
+
+
+def test_evaluate_path_streams_chunks(engine, listings, texts, tmp_path):
+    proba = engine.predict_proba(texts)
+    labels = [engine.labels[i] for i in proba.argmax(axis=1)]
+    frame = pd.DataFrame(listings, columns=["designation", "description"]).assign(category=labels)
+    frame.loc[0, "category"] = "Rayon inconnu"
+    path = tmp_path / "valid.csv"
+    frame.to_csv(path, index=False)
+
+    result = evaluate_path(path, chunksize=7, limit=30)
+    assert result["unmapped_rows"] + result["rows"] == 30
+    mapped = [label for label in labels[1:30] if label != "Le coin des collectionneurs"]
+    assert result["rows"] == len(mapped)
+    assert result["accuracy"] == 1.0
+    assert np.asarray(result["confusion"]).sum() == result["rows"]
+
+
+def test_evaluate_path_requires_labels(tmp_path):
+    path = tmp_path / "test.csv"
+    pd.DataFrame({"designation": ["Livre de poche"]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        evaluate_path(path)
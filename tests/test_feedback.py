@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from rakuten_classifier.feedback import COLUMNS, Correction, FeedbackStore
+
+
+def correction(designation="Harry Potter", corrected=0, created_at=0.0):
+    return Correction(designation, "poche", "abc", 6, "Livre", corrected, "Livre", "v1", created_at)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeedbackStore(tmp_path / "feedback.sqlite3", flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_record_is_written_in_background(store):
+    for i in range(25):
+        store.record(correction(f"annonce {i}"))
+    assert store.flush(10)
+    assert store.count() == 25 == store.written
+    rows = store.read_after(0, limit=10)
+    assert [row["designation"] for row in rows] == [f"annonce {i}" for i in range(10)]
+    assert [row["designation"] for row in store.read_after(rows[-1]["id"], limit=2)] == ["annonce 10", "annonce 11"]
+
+
+def test_wal_mode(store):
+    import sqlite3
+
+    store.record(correction())
+    store.flush(10)
+    with sqlite3.connect(store.path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_compact_keeps_latest_per_listing(store):
+    store.record(correction(corrected=1))
+    store.record(correction(corrected=2))
+    store.record(correction("autre annonce"))
+    assert store.compact() == 1
+    rows = store.read_after()
+    assert sorted((row["designation"], row["corrected_index"]) for row in rows) == [("Harry Potter", 2),
+                                                                                  ("autre annonce", 0)]
+
+
+@pytest.mark.parametrize("suffix", ["csv", "parquet"])
+def test_export(store, tmp_path, suffix):
+    if suffix == "parquet":
+        pytest.importorskip("pyarrow")
+    store.record(correction("ancienne", created_at=100.0))
+    store.record(correction("récente", created_at=200.0))
+    destination = tmp_path / f"corrections.{suffix}"
+    assert store.export(destination, since=150.0) == 1
+    frame = pd.read_csv(destination) if suffix == "csv" else pd.read_parquet(destination)
+    assert list(frame.columns) == list(COLUMNS)
+    assert list(frame["designation"]) == ["récente"]
+
+
+def test_empty_export(store, tmp_path):
+    assert store.export(tmp_path / "vide.csv") == 0
+    assert list(pd.read_csv(tmp_path / "vide.csv").columns) == list(COLUMNS)
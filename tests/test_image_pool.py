@@ -0,0 +1,78 @@
+import os
+import signal
+import threading
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+torchvision = pytest.importorskip("torchvision")
+
+from rakuten_classifier import image_pool  # noqa: E402
+from rakuten_classifier.image_pool import ImageWorkerPool, PoolUnavailableError  # noqa: E402
+from rakuten_classifier.imaging import IMAGE_SIZE  # noqa: E402
+from rakuten_classifier.vision import ImageClassifier  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def weights(tmp_path_factory):
+    # Mêmes poids dans ce processus et dans le pool, sans téléchargement
+    path = tmp_path_factory.mktemp("weights") / "mobilenet.pth"
+    torch.save(torchvision.models.mobilenet_v3_large(weights=None).state_dict(), path)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def pool(weights):
+    pool = ImageWorkerPool(workers=1, num_threads=1, slots=4, weights=weights).start(timeout=120)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(scope="module")
+def arrays():
+    rng = np.random.default_rng(0)
+    return [rng.standard_normal((3, IMAGE_SIZE, IMAGE_SIZE)).astype(np.float32) for _ in range(6)]
+
+
+def test_matches_in_process_classifier(pool, weights, arrays):
+    classifier = ImageClassifier(weights=weights, num_threads=1)
+    # Plus d'images que d'emplacements : envoyées en plusieurs groupes
+    results = pool.analyze_many(arrays, timeout=60)
+    embeddings, proba = classifier.forward(np.stack(arrays))
+    assert len(results) == len(arrays)
+    for (prediction, embedding), expected_proba, expected_embedding in zip(results, proba, embeddings):
+        np.testing.assert_allclose(prediction.probabilities, expected_proba, rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(embedding, expected_embedding, rtol=1e-4, atol=1e-5)
+    assert pool.stats()["free_slots"] == 4
+
+
+def test_dead_worker_is_restarted(pool, arrays):
+    os.kill(pool._workers[0].process.pid, signal.SIGKILL)
+    prediction, _ = pool.analyze(arrays[0], timeout=120)
+    assert prediction.labels
+    assert pool.stats()["restarts"] == 1
+
+
+def test_start_failure_is_reported():
+    pool = ImageWorkerPool(workers=1, slots=1, backbone="pas_un_modele")
+    with pytest.raises(PoolUnavailableError):
+        pool.start(timeout=120)
+    pool.close()
+
+
+def test_background_start_runs_once_per_process(monkeypatch):
+    calls = []
+    done = threading.Event()
+    monkeypatch.setattr(image_pool, "POOL_WORKERS", 2)
+    monkeypatch.setattr(image_pool, "_pool", None)
+    monkeypatch.setattr(image_pool, "_started", False)
+    monkeypatch.setattr(image_pool, "_start_quietly", lambda: (calls.append(1), done.set()))
+    threads = [threading.Thread(target=image_pool.start_in_background) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert done.wait(10)
+    image_pool.start_in_background()
+    assert calls == [1]
@@ -0,0 +1,61 @@
+import hashlib
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from rakuten_classifier.imaging import (IMAGE_SIZE, RESIZE_SIZE, THUMBNAIL_SIZE, IMAGENET_MEAN, IMAGENET_STD,
+                                        decode, prepare_image, preprocess)
+
+
+@pytest.fixture(scope="module")
+def photo(make_photo):
+    return make_photo(4000, 3000, seed=1)
+
+
+def test_large_jpeg_decoded_at_reduced_scale(photo):
+    image, original_size = decode(photo)
+    assert original_size == (4000, 3000)
+    assert image.size[0] < 4000
+    assert min(image.size) >= max(RESIZE_SIZE, THUMBNAIL_SIZE)
+
+
+def test_exif_orientation_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotation de 90°
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), "red").save(buffer, "JPEG", exif=exif)
+    image, original_size = decode(buffer.getvalue())
+    assert original_size == (800, 600)
+    assert image.size == (600, 800)
+
+
+def test_prepare_image(photo):
+    prepared = prepare_image(photo)
+    assert prepared.digest == hashlib.sha256(photo).hexdigest()
+    assert prepared.array.shape == (3, IMAGE_SIZE, IMAGE_SIZE)
+    assert prepared.array.dtype == np.float32
+    assert prepared.array.flags.c_contiguous
+    thumbnail = Image.open(io.BytesIO(prepared.thumbnail))
+    assert thumbnail.format == "JPEG"
+    assert max(thumbnail.size) == THUMBNAIL_SIZE
+
+
+def test_reduced_decode_close_to_full_decode(photo):
+    reduced = prepare_image(photo).array
+    full = preprocess(Image.open(io.BytesIO(photo)).convert("RGB"))
+    # Écart moyen inférieur à 2 niveaux de gris sur 255
+    assert np.abs((reduced - full) * IMAGENET_STD[:, None, None]).mean() < 2 / 255
+
+
+def test_preprocess_normalisation():
+    array = preprocess(Image.new("RGB", (300, 500), (255, 0, 128)))
+    expected = (np.array([255, 0, 128]) / 255 - IMAGENET_MEAN) / IMAGENET_STD
+    np.testing.assert_allclose(array[:, 0, 0], expected, rtol=1e-5)
+
+
+def test_png_with_alpha():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (400, 400), (0, 0, 255, 128)).save(buffer, "PNG")
+    assert prepare_image(buffer.getvalue()).array.shape == (3, IMAGE_SIZE, IMAGE_SIZE)
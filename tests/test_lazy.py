@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from rakuten_classifier.lazy import import_times, lazy_import, preload_in_background
+
+
+def test_module_imported_on_first_attribute(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe.py").write_text("VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_probe", raising=False)
+
+    module = lazy_import("lazy_probe")
+    assert "lazy_probe" not in sys.modules
+    assert module.VALUE == 42
+    assert "lazy_probe" in sys.modules
+    assert "lazy_probe" in import_times()
+
+
+def test_preload_in_background(tmp_path, monkeypatch):
+    (tmp_path / "lazy_preload_probe.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_preload_probe", raising=False)
+
+    threads = preload_in_background("lazy_preload_probe")
+    for thread in threads:
+        thread.join(10)
+    assert "lazy_preload_probe" in sys.modules
+    assert preload_in_background("lazy_preload_probe") == []
+
+
+def test_text_path_does_not_import_torch():
+    code = ("import sys\n"
+            "from rakuten_classifier.core import classify_text\n"
+            "classify_text('Harry Potter', 'roman poche')\n"
+            "print('torch' in sys.modules, 'torchvision' in sys.modules)\n")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=Path(__file__).resolve().parent.parent)
+    assert out.stdout.split() == ["False", "False"]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import MultinomialNB
+
+from rakuten_classifier.categories import CATEGORIES
+from rakuten_classifier.feedback import Correction, FeedbackStore
+from rakuten_classifier.learner import IncrementalLearner, update_forest, update_linear, update_model
+from rakuten_classifier.registry import ModelRegistry
+
+
+@pytest.fixture(scope="module")
+def data():
+    X = sp.random(90, 30, density=0.3, format="csr", random_state=0)
+    y = np.arange(90) % 3
+    return X, y
+
+
+def test_update_forest_caps_added_trees(data):
+    X, y = data
+    original = RandomForestClassifier(n_estimators=4, random_state=0).fit(X, y)
+    model = original
+    for seed in range(4):
+        model = update_forest(model, X, y, n_trees=3, seed=seed, max_extra=5)
+    assert len(model.estimators_) == model.n_estimators == 4 + 5
+    # Arbres d'origine partagés, jamais remplacés ; le modèle de départ est intact
+    assert all(a is b for a, b in zip(model.estimators_[:4], original.estimators_))
+    assert len(original.estimators_) == 4
+    assert model.predict_proba(X).shape == (90, 3)
+
+
+def test_update_forest_replaces_oldest_added_trees(data):
+    X, y = data
+    first = update_forest(RandomForestClassifier(n_estimators=2, random_state=0).fit(X, y), X, y,
+                          n_trees=2, seed=0, max_extra=3)
+    second = update_forest(first, X, y, n_trees=2, seed=1, max_extra=3)
+    assert second.estimators_[2] is first.estimators_[3]
+
+
+def test_update_linear_moves_towards_corrections(data):
+    X, y = data
+    model = LogisticRegression(max_iter=500).fit(X, y)
+    target = np.zeros(len(y), dtype=int)
+    updated = update_linear(model, X, target, epochs=20)
+    assert updated.predict_proba(X)[:, 0].mean() > model.predict_proba(X)[:, 0].mean()
+    assert updated.coef_ is not model.coef_
+
+
+def test_unsupported_models_are_rejected(data):
+    X, y = data
+    binary = LogisticRegression().fit(X, y % 2)
+    with pytest.raises(ValueError):
+        update_linear(binary, X, y % 2)
+    with pytest.raises(TypeError):
+        update_model(MultinomialNB().fit(X, y), X, y)
+
+
+def test_learner_publishes_and_rolls_back(artifacts, tmp_path, texts):
+    registry = ModelRegistry(*artifacts)
+    original = registry.get()
+    store = FeedbackStore(tmp_path / "feedback.sqlite3", flush_interval=0.01)
+    label = CATEGORIES[0]
+    for text in texts[:20]:
+        store.record(Correction(text, "", "", None, None, 0, label, original.version))
+    store.flush(10)
+
+    learner = IncrementalLearner(registry, store, batch_size=8, tolerance=1.0)
+    report = learner.step()
+    store.close()
+
+    assert report.accepted
+    assert report.train_rows == 16 and report.validation_rows == 4
+    assert registry.get().version == f"{original.version}+u1"
+    assert learner.rollback() is original
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+from email.parser import BytesParser
+from email.policy import HTTP
+
+import pytest
+
+from rakuten_classifier import loadtest
+from rakuten_classifier.loadtest import ProcessSampler, _multipart, format_report, latency_summary
+
+linux = pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="/proc requis")
+
+
+def test_latency_summary():
+    assert latency_summary([]) == {"count": 0}
+    summary = latency_summary([0.001 * i for i in range(1, 101)])
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == pytest.approx(50.5)
+    assert summary["p99_ms"] == pytest.approx(99.01)
+    assert summary["max_ms"] == pytest.approx(100.0)
+
+
+def test_multipart_body_is_parseable():
+    body, content_type = _multipart("photo.jpg", b"\xff\xd8 octets \xff\xd9")
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    (part,) = message.iter_parts()
+    assert part.get_filename() == "photo.jpg"
+    assert part.get_content_type() == "image/jpeg"
+    assert part.get_payload(decode=True) == b"\xff\xd8 octets \xff\xd9"
+
+
+@linux
+def test_process_sampler_follows_children():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        with ProcessSampler(os.getpid(), interval=0.05) as sampler:
+            sum(i * i for i in range(2_000_000))
+        processes = {p["pid"]: p for p in sampler.report()}
+    finally:
+        child.kill()
+        child.wait()
+    assert processes[os.getpid()]["role"] == "server"
+    assert processes[child.pid]["role"] == "worker"
+    assert processes[os.getpid()]["peak_rss_mb"] >= processes[os.getpid()]["rss_mb"] > 0
+    assert processes[os.getpid()]["cpu_percent"] > 0
+
+
+def test_start_server_passes_random_weights(monkeypatch):
+    launched = {}
+    real_popen = subprocess.Popen
+
+    def popen(args, cwd, env):
+        launched.update(args=args, env=env)
+        return real_popen([sys.executable, "-c", "pass"])
+
+    monkeypatch.delenv("RAKUTEN_VISION_WEIGHTS", raising=False)
+    monkeypatch.setattr(loadtest.subprocess, "Popen", popen)
+    monkeypatch.setattr(loadtest, "_wait_for", lambda url, timeout: None)
+    loadtest.start_server(port=9001, ready_port=9000, random_weights=True).wait()
+    assert launched["env"]["RAKUTEN_VISION_WEIGHTS"] == "random"
+    assert launched["args"][-4:] == ["--port", "9001", "--ready-port", "9000"]
+    loadtest.start_server(random_weights=False).wait()
+    assert "RAKUTEN_VISION_WEIGHTS" not in launched["env"]
+
+
+def test_format_report():
+    level = {"sessions": 2, "listings_per_second": 1.5, "reruns_per_second": 12.0, "errors": 0,
+             "rerun": latency_summary([0.1, 0.2, 0.3]),
+             "processes": [{"cpu_percent": 150.0, "peak_rss_mb": 900.0}, {"cpu_percent": 50.0, "peak_rss_mb": 300.0}]}
+    lines = format_report({"levels": [level, {**level, "processes": []}]}).splitlines()
+    assert len(lines) == 3
+    assert lines[1].split()[-2:] == ["200", "1200"]
+    assert lines[2].split()[-2:] == ["-", "-"]
@@ -0,0 +1,73 @@
+import pytest
+
+from rakuten_classifier import metrics
+from rakuten_classifier.metrics import Histogram
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.get_metrics().reset()
+    yield metrics.get_metrics()
+    metrics.get_metrics().reset()
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+    for value in (0.0005, 0.005, 0.005, 0.05, 0.5):
+        histogram.observe(value)
+    counts, count, total, maximum = histogram.snapshot()
+    assert counts == [1, 2, 1, 1]
+    assert (count, maximum) == (5, 0.5)
+    assert total == pytest.approx(0.5605)
+    assert 0.001 <= histogram.quantile(0.5) <= 0.01
+    assert histogram.quantile(1.0) == 0.5
+    assert Histogram().quantile(0.5) is None
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    metrics.get_metrics().reset()
+    with metrics.stage("vectorize"):
+        pass
+    metrics.start("render").stop()
+    metrics.increment("model_calls", model="text")
+    assert metrics.get_metrics().histograms() == {} and metrics.get_metrics().counters() == {}
+
+
+def test_stages_and_counters(enabled):
+    with metrics.stage("vectorize"):
+        pass
+    metrics.start("vectorize").stop()
+    metrics.observe("render", 0.02)
+    metrics.increment("model_calls", model="text")
+    metrics.increment("model_calls", 2, model="text")
+
+    assert enabled.histogram("vectorize").count == 2
+    assert enabled.counters() == {("model_calls", (("model", "text"),)): 3}
+    rows = {row["étape"]: row for row in metrics.summary()}
+    assert rows["render"]["appels"] == 1 and rows["render"]["max_ms"] == pytest.approx(20.0)
+
+
+def test_render_prometheus(enabled):
+    metrics.observe("predict", 0.003)
+    metrics.observe("predict", 0.2)
+    metrics.increment("model_calls", model="text")
+    text = metrics.render_prometheus()
+    lines = text.splitlines()
+
+    assert 'rakuten_stage_seconds_bucket{stage="predict",le="0.0025"} 0' in lines
+    assert 'rakuten_stage_seconds_bucket{stage="predict",le="0.005"} 1' in lines
+    assert 'rakuten_stage_seconds_bucket{stage="predict",le="+Inf"} 2' in lines
+    assert 'rakuten_stage_seconds_count{stage="predict"} 2' in lines
+    assert 'rakuten_model_calls_total{model="text"} 1' in lines
+    assert any(line.startswith("rakuten_ready ") for line in lines)
+    assert text.endswith("\n")
+
+
+def test_write_textfile_is_atomic(enabled, tmp_path):
+    metrics.observe("predict", 0.01)
+    path = tmp_path / "rakuten.prom"
+    metrics.write_textfile(path)
+    assert 'rakuten_stage_seconds_count{stage="predict"} 1' in path.read_text(encoding="utf-8")
+    assert [p.name for p in tmp_path.iterdir()] == ["rakuten.prom"]
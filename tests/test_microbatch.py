@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from rakuten_classifier.microbatch import MicroBatcher
+
+
+def gated(process):
+    """Traitement bloqué jusqu'à ``gate.set()`` : les requêtes suivantes s'accumulent"""
+    started, gate = threading.Event(), threading.Event()
+    batches = []
+
+    def run(items):
+        started.set()
+        gate.wait(10)
+        batches.append(list(items))
+        return process(items)
+
+    return run, started, gate, batches
+
+
+def test_concurrent_requests_share_a_batch():
+    process, started, gate, batches = gated(lambda items: [item * 10 for item in items])
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait=0.05)
+    first = batcher.submit(0)
+    started.wait(10)
+    futures = [batcher.submit(i) for i in range(1, 6)]
+    gate.set()
+    assert first.result(10) == 0
+    assert [future.result(10) for future in futures] == [10, 20, 30, 40, 50]
+    assert batches[1:] == [[1, 2, 3, 4, 5]]
+    batcher.close()
+
+
+def test_batch_size_is_bounded():
+    process, _, gate, batches = gated(lambda items: items)
+    batcher = MicroBatcher(process, max_batch_size=3, max_wait=0.05)
+    futures = [batcher.submit(i) for i in range(10)]
+    gate.set()
+    assert [future.result(10) for future in futures] == list(range(10))
+    assert max(len(batch) for batch in batches) <= 3
+    assert batcher.stats()["items"] == 10
+    batcher.close()
+
+
+def test_errors_reach_every_caller():
+    def fail(items):
+        raise ValueError("modèle indisponible")
+
+    batcher = MicroBatcher(fail, max_wait=0.0)
+    with pytest.raises(ValueError):
+        batcher(1, timeout=10)
+    batcher.close()
+
+
+def test_result_count_mismatch():
+    batcher = MicroBatcher(lambda items: [], max_wait=0.0)
+    with pytest.raises(RuntimeError):
+        batcher(1, timeout=10)
+    batcher.close()
+
+
+def test_closed_batcher_refuses_requests():
+    batcher = MicroBatcher(lambda items: items)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
+
+
+def test_text_batches_match_single_predictions(texts):
+    from rakuten_classifier.engine import get_engine
+    from rakuten_classifier.microbatch import _predict_texts
+
+    engine = get_engine()
+    batch = _predict_texts(texts[:8])
+    for text, prediction in zip(texts[:8], batch):
+        assert prediction.label == engine.prediction(engine.predict_proba_one(text)).label
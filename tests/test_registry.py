@@ -0,0 +1,51 @@
+import os
+import shutil
+
+import numpy as np
+
+from rakuten_classifier.registry import ModelRegistry
+
+
+def test_get_loads_once(artifacts):
+    registry = ModelRegistry(*artifacts, check_interval=0)
+    first = registry.get()
+    assert registry.get() is first
+    assert registry.reload_count == 1
+
+
+def test_arrays_are_memory_mapped(artifacts):
+    bundle = ModelRegistry(*artifacts).get()
+    assert isinstance(bundle.vectorizer.idf_, np.memmap)
+
+
+def test_reload_after_atomic_replace(artifacts):
+    vectorizer_path, model_path = artifacts
+    registry = ModelRegistry(vectorizer_path, model_path, check_interval=0)
+    before = registry.get()
+
+    replacement = model_path.with_name("new.pkl")
+    shutil.copyfile(model_path, replacement)
+    os.replace(replacement, model_path)
+
+    after = registry.get()
+    assert after is not before
+    assert after.version != before.version
+    assert registry.reload_count == 2
+
+
+def test_missing_file_keeps_serving(artifacts):
+    registry = ModelRegistry(*artifacts, check_interval=0)
+    bundle = registry.get()
+    os.unlink(artifacts[1])
+    assert registry.get() is bundle
+
+
+def test_publish_and_rollback(artifacts):
+    registry = ModelRegistry(*artifacts)
+    original = registry.get()
+    published = registry.publish(original.model, "candidat")
+    assert registry.get() is published
+    assert published.vectorizer is original.vectorizer
+    assert registry.history == [original.version]
+    assert registry.rollback() is original
+    assert registry.rollback() is None
@@ -0,0 +1,73 @@
+import base64
+import http.client
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+from rakuten_classifier.cli import classify_path
+from rakuten_classifier.server import make_server
+
+
+@pytest.fixture(scope="module")
+def connection():
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Une seule connexion pour tout le module : keep-alive
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+    yield connection
+    connection.close()
+    server.shutdown()
+    server.server_close()
+
+
+def request(connection, method, path, payload=None):
+    body = None if payload is None else json.dumps(payload).encode()
+    connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_health(connection):
+    status, body = request(connection, "GET", "/health")
+    assert status == 200 and body["status"] == "ok"
+
+
+def test_predict_text(connection):
+    status, body = request(connection, "POST", "/predict", {"designation": "Harry Potter", "top_k": 2})
+    assert status == 200
+    assert len(body["top_k"]) == 2
+    assert body["category"] == body["top_k"][0]["category"]
+
+
+def test_predict_batch(connection):
+    items = [{"designation": "piscine gonflable"}, {"designation": "console", "description": "manette"}]
+    status, body = request(connection, "POST", "/predict", {"items": items})
+    assert status == 200 and len(body["results"]) == 2
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    [1, 2],
+    {"image": "pas du base64 !"},
+    {"image": base64.b64encode(b"pas une image").decode()},
+    {"designation": "livre", "image": base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"0" * 64).decode()},
+])
+def test_invalid_requests(connection, payload):
+    status, body = request(connection, "POST", "/predict", payload)
+    assert status == 400 and body["error"]
+
+
+def test_unknown_path(connection):
+    status, _ = request(connection, "POST", "/predire", {})
+    assert status == 404
+
+
+def test_cli_classify_jsonl(listings, tmp_path):
+    source, destination = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    pd.DataFrame(listings, columns=["designation", "description"]).to_json(source, orient="records", lines=True)
+    stats = classify_path(source, destination, workers=1, chunksize=9)
+    output = pd.read_json(destination, lines=True)
+    assert stats["rows"] == len(listings) == len(output)
+    assert list(output["designation"]) == [designation for designation, _ in listings]
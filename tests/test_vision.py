@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+torchvision = pytest.importorskip("torchvision")
+
+from rakuten_classifier.categories import CATEGORIES  # noqa: E402
+from rakuten_classifier.imaging import IMAGE_SIZE  # noqa: E402
+from rakuten_classifier.vision import (ImageClassifier, _weights_tag, imagenet_category_matrix,  # noqa: E402
+                                       load_backbone)
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    # Poids aléatoires : aucun téléchargement
+    return ImageClassifier(weights="random")
+
+
+def test_category_matrix_covers_known_labels():
+    labels = torchvision.models.MobileNet_V3_Large_Weights.DEFAULT.meta["categories"]
+    matrix = imagenet_category_matrix(labels)
+    assert matrix.shape == (1000, len(CATEGORIES))
+    assert matrix.sum(axis=1).max() == 1.0
+    assert (matrix.sum(axis=0) > 0).all()
+
+
+def test_forward_shapes_and_probabilities(classifier):
+    batch = np.random.default_rng(0).standard_normal((3, 3, IMAGE_SIZE, IMAGE_SIZE)).astype(np.float32)
+    embeddings, proba = classifier.forward(batch)
+    assert embeddings.shape == (3, 960)
+    assert proba.shape == (3, len(CATEGORIES))
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0, rtol=1e-5)
+
+
+def test_analyze_returns_prediction(classifier):
+    prediction, embedding = classifier.analyze(np.zeros((3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32))
+    assert prediction.labels == tuple(CATEGORIES.values())
+    assert prediction.label == CATEGORIES[prediction.category]
+    assert embedding.shape == (960,)
+
+
+def test_head_replaces_imagenet_mapping(tmp_path):
+    weight = np.zeros((len(CATEGORIES), 960), dtype=np.float32)
+    bias = np.zeros(len(CATEGORIES), dtype=np.float32)
+    bias[3] = 10.0
+    np.savez(tmp_path / "head.npz", weight=weight, bias=bias)
+    classifier = ImageClassifier(weights="random", quantize=False, head_path=tmp_path / "head.npz")
+    prediction, _ = classifier.analyze(np.zeros((3, IMAGE_SIZE, IMAGE_SIZE), dtype=np.float32))
+    assert prediction.category == 3
+
+
+def test_local_weights_file(tmp_path):
+    model = torchvision.models.mobilenet_v3_large(weights=None)
+    torch.save(model.state_dict(), tmp_path / "weights.pth")
+    loaded = load_backbone("mobilenet_v3_large", str(tmp_path / "weights.pth"))
+    for expected, actual in zip(model.state_dict().values(), loaded.state_dict().values()):
+        assert torch.equal(expected, actual)
+
+
+def test_offline_without_cached_weights(tmp_path, monkeypatch):
+    monkeypatch.setenv("TORCH_HOME", str(tmp_path))
+    with pytest.raises(FileNotFoundError, match="RAKUTEN_VISION_OFFLINE"):
+        load_backbone("mobilenet_v3_large", "DEFAULT", offline=True)
+
+
+def test_weights_tag_in_version():
+    assert _weights_tag("DEFAULT") == ""
+    assert _weights_tag("random") == "+random"
+    assert _weights_tag("/srv/models/mnv3.pth") == "+mnv3.pth"
@@ -0,0 +1,77 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from rakuten_classifier import registry, warmup
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    """État de chauffe neuf (module partagé par tout le processus de tests)"""
+    monkeypatch.setattr(warmup, "_ready", threading.Event())
+    monkeypatch.setattr(warmup, "_report", {"state": "pending"})
+    return warmup
+
+
+def test_latency_gap():
+    gap = warmup.latency_gap(50.0, [2.0, 4.0, 6.0], 3.0)
+    assert gap["steady_p50_ms"] == 4.0
+    assert gap["gap_ms"] == 46.0 and gap["ratio"] == 12.5
+    assert gap["after_warmup_ms"] == 3.0
+    assert warmup.latency_gap(1.0, [0.0], 0.0)["ratio"] is None
+
+
+def test_text_warmup_declares_ready(fresh):
+    assert fresh.readiness()[0] == 503
+    result = fresh.run_warmup(rounds=3, image=False)
+    assert result["state"] == "ready" and fresh.is_ready()
+    assert result["model_version"]
+    assert set(result["text"]) >= {"first_ms", "steady_p50_ms", "after_warmup_ms"}
+    status, body = fresh.readiness()
+    assert status == 200 and body["ready"] and body["state"] == "ready"
+
+
+def test_text_failure_keeps_process_unready(fresh, monkeypatch):
+    class Broken:
+        def get(self):
+            raise FileNotFoundError("model.pkl")
+
+    monkeypatch.setattr(registry, "get_registry", lambda: Broken())
+    result = fresh.run_warmup(rounds=1, image=False)
+    assert result["state"] == "failed" and "model.pkl" in result["error"]
+    assert not fresh.is_ready()
+    assert fresh.readiness()[0] == 503
+
+
+def test_image_failure_does_not_block_readiness(fresh, monkeypatch):
+    def broken(rounds):
+        raise RuntimeError("pas de poids")
+
+    monkeypatch.setattr(warmup, "_warm_image", broken)
+    result = fresh.run_warmup(rounds=1, image=True)
+    assert result["state"] == "ready" and fresh.is_ready()
+    assert result["image"] == {"error": "pas de poids"}
+
+
+def test_ready_probe(fresh):
+    server = fresh.start_probe(0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/ready", timeout=5)
+        assert error.value.code == 503
+
+        fresh._ready.set()
+        with urllib.request.urlopen(f"{url}/readyz", timeout=5) as response:
+            assert response.status == 200
+            assert json.loads(response.read())["ready"] is True
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/metrics", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()